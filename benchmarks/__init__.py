@@ -0,0 +1 @@
+"""Benchmarks for the software factory graph."""
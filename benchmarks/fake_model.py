@@ -0,0 +1,122 @@
+"""Deterministic scripted chat model used to benchmark the graph without a provider."""
+
+import asyncio
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Sequence, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+CODE_RESPONSE = "```python\n" + "\n".join(f"def handler_{i}(value):\n    return value + {i}\n" for i in range(20)) + "```"
+
+DEFAULT_SCRIPT: Tuple[Tuple[str, str], ...] = (
+    ("Design System Specialist", "Design summary: single column layout, primary color #0055FF."),
+    ("Product Manager", "Goal: greet the user.\nFunctional: print a greeting.\nAcceptance: runs.\nFILE_PATH: output/hello.py"),
+    ("QA Engineer", "APPROVED"),
+    ("Software Engineer", CODE_RESPONSE),
+)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Answers each prompt with the first scripted response whose marker occurs in it.
+
+    ``latency`` is the delay before the first token, ``token_latency`` the
+    delay between streamed tokens and ``qa_rejections`` makes the QA reviewer
+    reject that many drafts before each approval, to exercise revision loops.
+    """
+
+    script: Sequence[Tuple[str, str]] = DEFAULT_SCRIPT
+    latency: float = 0.0
+    token_latency: float = 0.0
+    qa_rejections: int = 0
+    model_name: str = "scripted"
+    temperature: float = 0.0
+    calls: int = 0
+    qa_calls: int = 0
+    simulated_seconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        self.calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        for marker, response in self.script:
+            if marker in prompt:
+                if marker == "QA Engineer":
+                    self.qa_calls += 1
+                    if self.qa_calls % (self.qa_rejections + 1):
+                        return "REVISION: add docstrings."
+                return response
+        return "OK"
+
+    def _tokens(self, text: str) -> List[str]:
+        return [t for t in re.split(r"(\s)", text) if t]
+
+    def _simulated(self, text: str) -> float:
+        return self.latency + self.token_latency * len(self._tokens(text))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._respond(messages)
+        delay = self._simulated(text)
+        self.simulated_seconds += delay
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text = self._respond(messages)
+        delay = self._simulated(text)
+        self.simulated_seconds += delay
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        text = self._respond(messages)
+        self.simulated_seconds += self._simulated(text)
+        time.sleep(self.latency)
+        for token in self._tokens(text):
+            time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        text = self._respond(messages)
+        self.simulated_seconds += self._simulated(text)
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(text):
+            await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
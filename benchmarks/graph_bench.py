@@ -0,0 +1,168 @@
+"""Benchmark the factory graph end to end against a scripted local model.
+
+Usage::
+
+    python -m benchmarks.graph_bench --sizes 1000,10000,100000 --concurrency 16
+
+For every synthetic project size the suite reports per-node wall time, the
+graph overhead (wall time not spent inside the fake model), runs per second
+with many graphs in flight and the peak traced memory.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, List
+
+# Keep the benchmark hermetic: no provider keys, caches or hedging involved.
+os.environ["LLM_CACHE"] = "false"
+os.environ["MODEL_MAX_IN_FLIGHT_FAKE"] = "0"
+os.environ.pop("HEDGE_PROVIDER", None)
+os.environ.pop("MCP_SERVERS", None)
+_CACHE_DIR = os.environ["AGENT_CACHE_DIR"] = tempfile.mkdtemp(prefix="factory-bench-cache-")
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from agent import factory_model  # noqa: E402
+from agent.graph import graph  # noqa: E402
+from benchmarks.fake_model import ScriptedChatModel  # noqa: E402
+
+
+def make_project(root: str, n_files: int, files_per_dir: int = 50, fanout: int = 10) -> None:
+    """Create a synthetic source tree with ``n_files`` files under ``root``."""
+    dirs = [root]
+    queue = [root]
+    while len(dirs) * files_per_dir < n_files:
+        parent = queue.pop(0)
+        for i in range(fanout):
+            child = os.path.join(parent, f"pkg_{i}")
+            os.makedirs(child, exist_ok=True)
+            dirs.append(child)
+            queue.append(child)
+    with open(os.path.join(root, "README.md"), "w", encoding="utf-8") as f:
+        f.write("# Synthetic project\n\nUse snake_case and type hints.\n")
+    created = 0
+    for d in dirs:
+        for i in range(files_per_dir):
+            if created >= n_files:
+                return
+            with open(os.path.join(d, f"module_{i}.py"), "w", encoding="utf-8") as f:
+                f.write(f"VALUE = {i}\n")
+            created += 1
+
+
+def _inputs(project_root: str) -> Dict[str, Any]:
+    return {
+        "messages": [HumanMessage(content="Write a hello world script")],
+        "iteration_count": 0,
+        "project_root": project_root,
+    }
+
+
+async def run_once(project_root: str, timings: Dict[str, List[float]]) -> float:
+    """Run one graph and add each node's wall time to ``timings``; return the total."""
+    start = last = time.perf_counter()
+    async for event in graph.astream(_inputs(project_root), stream_mode="updates"):
+        now = time.perf_counter()
+        for node in event:
+            timings[node].append(now - last)
+        last = now
+    return time.perf_counter() - start
+
+
+async def bench_size(model: ScriptedChatModel, n_files: int, runs: int, concurrency: int) -> Dict[str, Any]:
+    """Benchmark one synthetic project size."""
+    with tempfile.TemporaryDirectory(prefix="factory-bench-") as tmp:
+        project_root = os.path.join(tmp, "project")
+        os.makedirs(project_root)
+        make_project(project_root, n_files)
+
+        # Cold run: empty project index and guideline cache.
+        cold_timings: Dict[str, List[float]] = defaultdict(list)
+        await run_once(project_root, cold_timings)
+
+        timings: Dict[str, List[float]] = defaultdict(list)
+        model.simulated_seconds = 0.0
+        sequential = [await run_once(project_root, timings) for _ in range(runs)]
+        overhead = (sum(sequential) - model.simulated_seconds) / runs
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run_once(project_root, defaultdict(list)) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        # Peak memory gets its own pass: tracemalloc slows every allocation,
+        # so it must not overlap the throughput measurement above.
+        tracemalloc.start()
+        await asyncio.gather(*(run_once(project_root, defaultdict(list)) for _ in range(concurrency)))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "files": n_files,
+        "cold_analyzer_ms": 1000 * cold_timings["analyzer_node"][0],
+        "node_ms": {node: 1000 * sum(v) / len(v) for node, v in timings.items()},
+        "run_ms": 1000 * sum(sequential) / runs,
+        "graph_overhead_ms": 1000 * overhead,
+        "concurrency": concurrency,
+        "runs_per_second": concurrency / elapsed,
+        "peak_memory_mb": peak / (1024 * 1024),
+    }
+
+
+def _report(result: Dict[str, Any]) -> str:
+    lines = [
+        f"== {result['files']} files ==",
+        f"  analyzer (cold)     {result['cold_analyzer_ms']:9.1f} ms",
+    ]
+    lines += [f"  {node:<19} {ms:9.1f} ms" for node, ms in result["node_ms"].items()]
+    lines += [
+        f"  run total           {result['run_ms']:9.1f} ms",
+        f"  graph overhead      {result['graph_overhead_ms']:9.1f} ms",
+        f"  runs/s @{result['concurrency']:<4}       {result['runs_per_second']:9.1f}",
+        f"  peak memory         {result['peak_memory_mb']:9.1f} MB",
+    ]
+    return "\n".join(lines)
+
+
+async def main(argv: List[str] | None = None) -> List[Dict[str, Any]]:
+    """Parse arguments, run every size and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated project sizes in files")
+    parser.add_argument("--runs", type=int, default=5, help="sequential runs per size")
+    parser.add_argument("--concurrency", type=int, default=16, help="graphs in flight for the throughput run")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model delay before the first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="fake model delay per streamed token (s)")
+    parser.add_argument("--qa-rejections", type=int, default=0, help="QA rejections before each approval")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    model = ScriptedChatModel(
+        latency=args.latency, token_latency=args.token_latency, qa_rejections=args.qa_rejections
+    )
+    factory_model.model = model
+    factory_model.DEFAULT_MODEL = "fake"
+
+    results = []
+    try:
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            result = await bench_size(model, size, args.runs, args.concurrency)
+            sys.stdout.write(_report(result) + "\n")
+            results.append(result)
+    finally:
+        shutil.rmtree(_CACHE_DIR, ignore_errors=True)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
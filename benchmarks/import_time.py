@@ -0,0 +1,107 @@
+"""Measure the cold import cost of the agent package.
+
+Usage::
+
+    python -m benchmarks.import_time --module agent.graph --runs 5
+
+Every run imports the module in a fresh interpreter with ``-X importtime``
+and no provider API keys set. The report shows the median wall time, the
+cumulative import time, the slowest top-level packages and whether any
+provider SDK was loaded (it should not be until a model is first used).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+PROVIDER_MODULES = ("langchain_google_genai", "langchain_openai", "langchain_ollama")
+KEY_VARS = ("GOOGLE_API_KEY", "DASHSCOPE_API_KEY", "DEEPSEEK_API_KEY")
+
+
+def _probe_script(module: str) -> str:
+    return (
+        f"import sys, importlib; importlib.import_module({module!r}); "
+        f"print(sorted(m for m in sys.modules if m.split('.')[0] in {PROVIDER_MODULES!r}))"
+    )
+
+
+def import_once(module: str) -> Dict[str, Any]:
+    """Import ``module`` in a fresh interpreter and parse its ``-X importtime`` output."""
+    env = {k: v for k, v in os.environ.items() if k not in KEY_VARS}
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _probe_script(module)],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=False,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    by_package: Dict[str, int] = defaultdict(int)
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        by_package[name.split(".")[0]] += int(self_us)
+        total_us += int(self_us)
+    return {
+        "wall_ms": 1000 * wall,
+        "import_ms": total_us / 1000,
+        "packages_ms": {k: v / 1000 for k, v in by_package.items()},
+        "provider_modules": json.loads(proc.stdout.strip().replace("'", '"') or "[]"),
+    }
+
+
+def main(argv: List[str] | None = None) -> Dict[str, Any]:
+    """Parse arguments, run the imports and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="agent.graph", help="module to import")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to average over")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest packages to list")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    runs = [import_once(args.module) for _ in range(args.runs)]
+    packages: Dict[str, List[float]] = defaultdict(list)
+    for run in runs:
+        for name, ms in run["packages_ms"].items():
+            packages[name].append(ms)
+    result = {
+        "module": args.module,
+        "runs": args.runs,
+        "wall_ms": statistics.median(r["wall_ms"] for r in runs),
+        "import_ms": statistics.median(r["import_ms"] for r in runs),
+        "top_packages_ms": dict(
+            sorted(((k, statistics.median(v)) for k, v in packages.items()), key=lambda kv: -kv[1])[: args.top]
+        ),
+        "provider_modules": runs[0]["provider_modules"],
+    }
+
+    lines = [
+        f"== import {result['module']} ({result['runs']} runs, median) ==",
+        f"  interpreter + import  {result['wall_ms']:9.1f} ms",
+        f"  import time           {result['import_ms']:9.1f} ms",
+    ]
+    lines += [f"    {name:<20}{ms:9.1f} ms" for name, ms in result["top_packages_ms"].items()]
+    lines.append(f"  provider SDKs loaded  {', '.join(result['provider_modules']) or 'none'}")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
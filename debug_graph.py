@@ -3,17 +3,37 @@
 import asyncio
 import logging
 import os
+import sys
 
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage
 
 from agent.graph import graph
+from agent.instrumentation import metrics
+from agent.streaming import FenceStripper
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+
+def log_node_rate(node: str) -> None:
+    """Log time-to-first-token and token rate of the node's latest run."""
+    record = next((r for r in reversed(metrics.records) if r["node"] == node), None)
+    if record is None or not record["llm_calls"]:
+        return
+    rate = record["generated_tokens"] / (record["generation_ms"] / 1000) if record["generation_ms"] else 0.0
+    logger.info(
+        "%s: ttft=%.1fms rate=%.1f tok/s (%d completion tokens, %d calls)",
+        node,
+        record["ttft_ms"] or 0.0,
+        rate,
+        record["completion_tokens"],
+        record["llm_calls"],
+    )
+
+
 async def run_test():
-    """Run a simple test of the graph."""
+    """Run a simple test of the graph, printing model output as it streams."""
     # Use a real request
     inputs = {
         "messages": [HumanMessage(content="Write a simple python script to hello world")],
@@ -22,17 +42,52 @@ async def run_test():
     }
     
     logger.info("Invoking graph...")
+    streaming_node = None
+    stripper = FenceStripper()
     try:
-        async for event in graph.astream(inputs):
+        async for mode, event in graph.astream(inputs, stream_mode=["messages", "updates"]):
+            if mode == "messages":
+                chunk, metadata = event
+                node = metadata.get("langgraph_node")
+                if not isinstance(chunk.content, str) or not chunk.content:
+                    continue
+                if node != streaming_node:
+                    streaming_node, stripper = node, FenceStripper()
+                    sys.stdout.write(f"\n--- {node} (streaming) ---\n")
+                # Show the developer's code without its markdown fences.
+                text = stripper.feed(chunk.content) if node == "developer_node" else chunk.content
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                continue
             for node, state in event.items():
+                if node == streaming_node:
+                    sys.stdout.write(stripper.finish() if node == "developer_node" else "")
+                    sys.stdout.write("\n")
+                    streaming_node = None
                 logger.info("\n--- Node: %s ---", node)
-                if "status" in state:
+                if state and "status" in state:
                     logger.info("Status: %s", state["status"])
-                if "file_path" in state:
+                if state and "file_path" in state:
                     logger.info("File Path: %s", state["file_path"])
+                log_node_rate(node)
     except Exception:
         logger.exception("Error while running graph")
 
+    logger.info("\n--- Node metrics ---")
+    for node, summary in metrics.summary().items():
+        logger.info(
+            "%-15s wall=%8.1fms ttft=%8.1fms rate=%6.1f tok/s prompt_tokens=%6d completion_tokens=%6d",
+            node,
+            summary["avg_wall_ms"],
+            summary["avg_ttft_ms"],
+            summary["tokens_per_second"],
+            summary["prompt_tokens"],
+            summary["completion_tokens"],
+        )
+    for record in metrics.records:
+        if record["sections"]:
+            logger.info("%s prompt bytes: %s (state %d bytes)", record["node"], record["sections"], record["state_bytes"])
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     asyncio.run(run_test())
@@ -3,6 +3,16 @@
 This module defines a custom graph.
 """
 
-from agent.graph import graph
+from typing import Any
 
 __all__ = ["graph"]
+
+
+def __getattr__(name: str) -> Any:
+    # Build the graph on first access so importing a submodule (e.g.
+    # agent.model_config) does not pull in every node.
+    if name == "graph":
+        from agent.graph import graph
+
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
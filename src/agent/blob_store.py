@@ -0,0 +1,292 @@
+"""Content-addressed store for large state fields, referenced from FactoryState by hash."""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Set
+
+from agent.utils import get_cache_dir
+
+REF_PREFIX = "blob:sha256:"
+DEFAULT_MIN_BYTES = 1024
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+# Unreferenced blobs younger than this are kept by ``collect``: they may
+# belong to a run that has not written its next checkpoint yet.
+DEFAULT_GC_GRACE = 24 * 60 * 60
+
+_REF_PATTERN = re.compile(re.escape(REF_PREFIX) + "[0-9a-f]{64}")
+
+
+def is_blob_ref(value: Any) -> bool:
+    """Check whether ``value`` is a blob reference rather than inline text."""
+    return isinstance(value, str) and value.startswith(REF_PREFIX) and len(value) == len(REF_PREFIX) + 64
+
+
+def find_blob_refs(data: str | bytes) -> Set[str]:
+    """Return every blob reference that occurs in ``data``, e.g. a serialized checkpoint."""
+    if isinstance(data, bytes):
+        data = data.decode("latin-1")
+    return set(_REF_PATTERN.findall(data))
+
+
+class BlobNotFoundError(KeyError):
+    """A blob reference whose text is no longer in the store. / Blob 引用无法解析。."""
+
+    def __str__(self) -> str:
+        """Show the message as is instead of ``KeyError``'s quoted repr."""
+        return str(self.args[0]) if self.args else super().__str__()
+
+
+class BlobStore:
+    """Deduplicating text store keyed by SHA-256, kept in memory and optionally on disk. / 以 SHA-256 为键的去重文本存储。.
+
+    ``put`` returns a short ``blob:sha256:<hex>`` reference; storing the same
+    text again (in another run or iteration) only returns the existing
+    reference. Texts shorter than ``min_bytes`` are returned inline, since a
+    reference would not be smaller. The in-memory copy is an LRU bounded by
+    ``memory_bytes``; with a ``directory`` every blob is also written to disk
+    so references survive restarts and can be shared between workers.
+    Without one, blobs evicted from memory spill to a private temporary
+    directory (removed when the process exits), so references held by
+    running graphs stay resolvable. ``collect`` deletes blobs that nothing
+    references any more.
+    """
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        *,
+        min_bytes: int = DEFAULT_MIN_BYTES,
+        memory_bytes: int = DEFAULT_MEMORY_BYTES,
+    ) -> None:
+        """Create a store; ``directory=None`` keeps blobs in process memory (plus spill files) only."""
+        self.directory = directory
+        self.min_bytes = min_bytes
+        self.memory_bytes = memory_bytes
+        self.puts = 0
+        self.dedup_hits = 0
+        self.spilled = 0
+        self.collected = 0
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_used = 0
+        self._stored_at: Dict[str, float] = {}
+        self._spill: tempfile.TemporaryDirectory[str] | None = None
+        self._lock = threading.Lock()
+
+    def _roots(self) -> List[str]:
+        roots = [self.directory] if self.directory is not None else []
+        if self._spill is not None:
+            roots.append(self._spill.name)
+        return roots
+
+    def _path(self, digest: str, root: str | None = None) -> str:
+        root = root or self.directory
+        assert root is not None
+        return os.path.join(root, digest[:2], digest)
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _on_disk(self, digest: str) -> str | None:
+        for root in self._roots():
+            path = self._path(digest, root)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _remember(self, digest: str, text: str) -> None:
+        if digest in self._memory:
+            self._memory.move_to_end(digest)
+            return
+        self._memory[digest] = text
+        self._memory_used += len(text)
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            evicted_digest, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            if self.directory is None:
+                # Memory-only stores have no other copy: spill it instead of losing it.
+                if self._spill is None:
+                    self._spill = tempfile.TemporaryDirectory(prefix="agent-blobs-")
+                path = self._path(evicted_digest, self._spill.name)
+                if not os.path.exists(path):
+                    self._write(path, evicted.encode("utf-8"))
+                    self.spilled += 1
+
+    def _forget(self, digest: str) -> None:
+        text = self._memory.pop(digest, None)
+        if text is not None:
+            self._memory_used -= len(text)
+        self._stored_at.pop(digest, None)
+
+    def put(self, text: str) -> str:
+        """Store ``text`` and return its reference (or ``text`` itself when it is small)."""
+        data = text.encode("utf-8")
+        if len(data) < self.min_bytes or is_blob_ref(text):
+            return text
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self.puts += 1
+            self._stored_at[digest] = time.time()
+            path = None if digest in self._memory else self._on_disk(digest)
+            known = digest in self._memory or path is not None
+            if known:
+                self.dedup_hits += 1
+            if path is not None:
+                # Reused blobs count as fresh for ``collect``'s grace period.
+                os.utime(path)
+            self._remember(digest, text)
+        if not known and self.directory is not None:
+            self._write(self._path(digest), data)
+        return REF_PREFIX + digest
+
+    def get(self, value: str) -> str:
+        """Return the text behind a reference; inline text is returned unchanged.
+
+        Raises:
+            BlobNotFoundError: The blob is not in memory or on disk.
+        """
+        if not is_blob_ref(value):
+            return value
+        digest = value[len(REF_PREFIX):]
+        with self._lock:
+            text = self._memory.get(digest)
+            if text is not None:
+                self._memory.move_to_end(digest)
+                return text
+            path = self._on_disk(digest)
+        if path is None:
+            raise self._missing(value)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            raise self._missing(value) from None
+        with self._lock:
+            self._remember(digest, text)
+        return text
+
+    def _missing(self, value: str) -> BlobNotFoundError:
+        where = f"the blob store at {self.directory}" if self.directory else "this process's in-memory blob store"
+        return BlobNotFoundError(
+            f"Blob {value} is not in {where}. It was either garbage-collected after the checkpoints "
+            "referencing it were pruned, or written by another process with BLOB_STORE=memory; "
+            "use BLOB_STORE=disk to share blobs between processes and restarts."
+        )
+
+    def collect(self, live: Iterable[str], *, min_age: float = DEFAULT_GC_GRACE) -> int:
+        """Delete blobs not in ``live`` that were last stored more than ``min_age`` seconds ago.
+
+        Args:
+            live: References that must be kept, e.g. those found in checkpoints.
+            min_age: Grace period protecting blobs of runs still in progress.
+
+        Returns:
+            The number of blobs deleted.
+        """
+        keep = {ref[len(REF_PREFIX):] for ref in live if is_blob_ref(ref)}
+        cutoff = time.time() - min_age
+        removed: Set[str] = set()
+        with self._lock:
+            for digest in list(self._memory):
+                if digest not in keep and self._stored_at.get(digest, 0.0) <= cutoff:
+                    self._forget(digest)
+                    removed.add(digest)
+            roots = self._roots()
+        for root in roots:
+            for shard in _scandir(root):
+                if not shard.is_dir():
+                    continue
+                for entry in _scandir(shard.path):
+                    name = entry.name
+                    if name in keep:
+                        continue
+                    try:
+                        if entry.stat().st_mtime > cutoff:
+                            continue
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        continue
+                    if not name.startswith(".tmp-"):
+                        removed.add(name)
+        with self._lock:
+            for digest in removed:
+                self._forget(digest)
+            self.collected += len(removed)
+        return len(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return put/dedup/GC counters and memory usage."""
+        with self._lock:
+            return {
+                "puts": self.puts,
+                "dedup_hits": self.dedup_hits,
+                "spilled": self.spilled,
+                "collected": self.collected,
+                "memory_blobs": len(self._memory),
+                "memory_bytes": self._memory_used,
+            }
+
+
+def _scandir(path: str) -> List[os.DirEntry[str]]:
+    try:
+        with os.scandir(path) as entries:
+            return list(entries)
+    except FileNotFoundError:
+        return []
+
+
+_blob_store: BlobStore | None = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore | None:
+    """Return the shared store configured by ``BLOB_STORE`` (memory, disk or off). / 返回共享的 Blob 存储。.
+
+    ``memory`` (the default) keeps blobs for the life of the process, which
+    is all the plain graph needs. ``disk`` keeps them under the agent cache
+    directory so persistent runs (agent.checkpointing) can resume after a
+    restart; pruning those runs' checkpoints is what deletes their blobs.
+    """
+    global _blob_store
+    mode = os.getenv("BLOB_STORE", "memory").lower()
+    if mode in ("off", "false", "0", "none"):
+        return None
+    with _blob_store_lock:
+        if _blob_store is None:
+            _blob_store = BlobStore(
+                get_cache_dir("blobs") if mode == "disk" else None,
+                min_bytes=int(os.getenv("BLOB_MIN_BYTES", str(DEFAULT_MIN_BYTES))),
+                memory_bytes=int(os.getenv("BLOB_MEMORY_BYTES", str(DEFAULT_MEMORY_BYTES))),
+            )
+        return _blob_store
+
+
+def store_blob(value: Any) -> Any:
+    """Swap a large string for a reference; anything else is returned unchanged."""
+    store = get_blob_store()
+    if store is None or not isinstance(value, str):
+        return value
+    return store.put(value)
+
+
+def resolve_blob(value: Any) -> Any:
+    """Return the text behind a reference; anything else is returned unchanged.
+
+    Context fields such as ``project_map`` and ``design_data`` hold
+    references; the ``code`` and ``requirements`` outputs are plain text.
+
+    Raises:
+        BlobNotFoundError: The reference no longer resolves.
+    """
+    if not is_blob_ref(value):
+        return value
+    store = get_blob_store() or BlobStore(get_cache_dir("blobs"))
+    return store.get(value)
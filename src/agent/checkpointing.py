@@ -0,0 +1,168 @@
+"""Persistent SQLite checkpointing, resume and pruning for factory runs."""
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Set, cast
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from agent.blob_store import DEFAULT_GC_GRACE, find_blob_refs, get_blob_store
+from agent.graph import build_graph
+from agent.state import FactoryState
+from agent.utils import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEEP_LAST = 5
+DEFAULT_KEEP_THREADS = 200
+
+
+def get_checkpoint_path() -> str:
+    """Return ``CHECKPOINT_DB`` or the default database under the agent cache directory."""
+    return os.getenv("CHECKPOINT_DB") or os.path.join(get_cache_dir("checkpoints"), "factory.sqlite3")
+
+
+def _config(thread_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+class FactoryRunner:
+    """Runs the factory graph with SQLite checkpoints keyed by thread id. / 基于 SQLite 检查点按线程运行工厂图。.
+
+    Every completed node is checkpointed, so after a crash or provider error
+    ``resume`` continues from the last completed node instead of paying for
+    the analyzer, MCP and PM steps again. Large context fields are blob
+    references (see agent.blob_store), which keeps checkpoints small; set
+    ``BLOB_STORE=disk`` so they still resolve after a restart.
+    """
+
+    def __init__(
+        self,
+        saver: AsyncSqliteSaver,
+        *,
+        keep_last: int | None = None,
+        keep_threads: int | None = None,
+    ) -> None:
+        """Wrap an open saver; pruning limits default to ``CHECKPOINT_KEEP_LAST`` / ``CHECKPOINT_KEEP_THREADS``."""
+        self.saver = saver
+        store = get_blob_store()
+        if store is not None and store.directory is None:
+            logger.warning("BLOB_STORE is not 'disk': checkpoints of this runner cannot be resumed after a restart")
+        self.graph = build_graph(saver)
+        self.keep_last = keep_last if keep_last is not None else int(os.getenv("CHECKPOINT_KEEP_LAST", str(DEFAULT_KEEP_LAST)))
+        self.keep_threads = (
+            keep_threads if keep_threads is not None else int(os.getenv("CHECKPOINT_KEEP_THREADS", str(DEFAULT_KEEP_THREADS)))
+        )
+
+    async def run(self, inputs: Dict[str, Any], thread_id: str) -> Dict[str, Any]:
+        """Start a new run on ``thread_id`` and return the final state.
+
+        ``inputs`` is the initial state; fields the nodes fill in may be left out.
+        """
+        try:
+            result: Dict[str, Any] = await self.graph.ainvoke(cast(FactoryState, inputs), _config(thread_id))
+            return result
+        finally:
+            await self.prune()
+
+    async def resume(self, thread_id: str) -> Dict[str, Any]:
+        """Continue an interrupted run from its last completed node. / 从最后完成的节点继续中断的运行。.
+
+        Returns the final state right away if the run already finished; raises
+        KeyError if the thread has no checkpoint.
+        """
+        snapshot = await self.graph.aget_state(_config(thread_id))
+        if not snapshot.values:
+            raise KeyError(f"No checkpoint for thread {thread_id!r}")
+        if not snapshot.next:
+            return dict(snapshot.values)
+        logger.info("Resuming thread %s at %s", thread_id, ", ".join(snapshot.next))
+        try:
+            return await self.graph.ainvoke(None, _config(thread_id))
+        finally:
+            await self.prune()
+
+    async def status(self, thread_id: str) -> Dict[str, Any]:
+        """Return the pending nodes and last status of a thread."""
+        snapshot = await self.graph.aget_state(_config(thread_id))
+        return {
+            "next": list(snapshot.next),
+            "status": snapshot.values.get("status") if snapshot.values else None,
+            "iteration_count": snapshot.values.get("iteration_count") if snapshot.values else None,
+        }
+
+    async def prune(self) -> int:
+        """Drop all but the newest ``keep_last`` checkpoints per thread and all but the newest ``keep_threads`` threads.
+
+        Checkpoint ids are time-ordered, so "newest" is simply the largest id.
+        Only the latest checkpoint is needed to resume. Blobs that only the
+        dropped checkpoints referenced are then collected (see
+        ``collect_blobs``). Returns the number of checkpoints deleted.
+        """
+        conn = self.saver.conn
+        async with self.saver.lock:
+            cursor = await conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id IN ("
+                " SELECT thread_id FROM checkpoints GROUP BY thread_id"
+                " ORDER BY MAX(checkpoint_id) DESC LIMIT -1 OFFSET ?)",
+                (self.keep_threads,),
+            )
+            deleted = cursor.rowcount
+            cursor = await conn.execute(
+                "DELETE FROM checkpoints WHERE (thread_id, checkpoint_ns, checkpoint_id) IN ("
+                " SELECT thread_id, checkpoint_ns, checkpoint_id FROM ("
+                "  SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER ("
+                "   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rank"
+                "  FROM checkpoints) WHERE rank > ?)",
+                (self.keep_last,),
+            )
+            deleted += cursor.rowcount
+            await conn.execute(
+                "DELETE FROM writes WHERE NOT EXISTS ("
+                " SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id"
+                " AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id)"
+            )
+            await conn.commit()
+        if deleted:
+            logger.info("Pruned %d old checkpoints", deleted)
+        await self.collect_blobs()
+        return deleted
+
+    async def collect_blobs(self) -> int:
+        """Delete stored blobs that no remaining checkpoint references. / 清理不再被检查点引用的 Blob。.
+
+        Disabled with ``BLOB_GC=false``. Blobs stored within the last
+        ``BLOB_GC_GRACE`` seconds (a day by default) are kept, since runs that
+        share the blob store but not this database may still use them.
+        Returns the number of blobs deleted.
+        """
+        store = get_blob_store()
+        if store is None or os.getenv("BLOB_GC", "true").lower() in ("false", "0", "no", "off"):
+            return 0
+        live: Set[str] = set()
+        conn = self.saver.conn
+        async with self.saver.lock:
+            for query in ("SELECT checkpoint, metadata FROM checkpoints", "SELECT value FROM writes"):
+                async with conn.execute(query) as cursor:
+                    async for row in cursor:
+                        for column in row:
+                            if column:
+                                live |= find_blob_refs(column)
+        grace = float(os.getenv("BLOB_GC_GRACE", str(DEFAULT_GC_GRACE)))
+        removed = await asyncio.to_thread(store.collect, live, min_age=grace)
+        if removed:
+            logger.info("Collected %d unreferenced blobs", removed)
+        return removed
+
+
+@asynccontextmanager
+async def factory_runner(path: str | None = None, **kwargs: Any) -> AsyncIterator[FactoryRunner]:
+    """Open the SQLite checkpoint database and yield a FactoryRunner bound to it. / 打开检查点数据库并返回 FactoryRunner。."""
+    path = path or get_checkpoint_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        await saver.setup()
+        yield FactoryRunner(saver, **kwargs)
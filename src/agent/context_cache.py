@@ -0,0 +1,125 @@
+"""Explicit provider-side caching of the shared prompt prefix (Gemini cached content)."""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from agent.prompting import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600
+DEFAULT_MIN_TOKENS = 4096
+# After a failed create, wait this long before trying the same prefix again.
+FAILURE_BACKOFF = 300
+# Providers whose cached content can be referenced by handle. DeepSeek and
+# Ollama reuse identical prefixes automatically and need no handle.
+EXPLICIT_CACHE_PROVIDERS = ("gemini",)
+
+
+def prefix_key(provider: str, model_name: str, text: str) -> str:
+    """Return the registry key of a prompt prefix for one provider model."""
+    return hashlib.sha256(f"{provider}\0{model_name}\0{text}".encode()).hexdigest()
+
+
+class CachedContentRegistry:
+    """Maps prompt-prefix keys to provider cache handles until they expire. / 将提示词前缀映射到提供方缓存句柄。."""
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._handles: Dict[str, Tuple[str | None, float]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+
+    def lookup(self, key: str) -> Tuple[bool, str | None]:
+        """Return ``(known, handle)``; a known key with no handle is a recent failure."""
+        with self._lock:
+            entry = self._handles.get(key)
+            if entry is None or entry[1] <= time.time():
+                self._handles.pop(key, None)
+                return False, None
+            if entry[0] is not None:
+                self.hits += 1
+            return True, entry[0]
+
+    def register(self, key: str, handle: str | None, ttl: float) -> None:
+        """Remember ``handle`` for ``key`` for ``ttl`` seconds (``None`` records a failure)."""
+        with self._lock:
+            self._handles[key] = (handle, time.time() + ttl)
+            self.created += int(handle is not None)
+
+    def clear(self) -> None:
+        """Forget every handle."""
+        with self._lock:
+            self._handles.clear()
+
+
+registry = CachedContentRegistry()
+_create_locks: Dict[str, asyncio.Lock] = {}
+
+
+def context_cache_enabled() -> bool:
+    """Check ``CONTEXT_CACHE`` (on by default)."""
+    return os.getenv("CONTEXT_CACHE", "true").lower() not in ("false", "0", "no", "off")
+
+
+def register_cached_content(provider: str, model_name: str, text: str, handle: str, ttl: float = DEFAULT_TTL) -> None:
+    """Register an existing provider cache handle for a prompt prefix, e.g. one created out of band."""
+    registry.register(prefix_key(provider, model_name, text), handle, ttl)
+
+
+def _create_gemini_cache(model_name: str, text: str, ttl: int) -> str:
+    from google import genai
+    from google.genai import types
+
+    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    cache = client.caches.create(
+        model=model_name,
+        config=types.CreateCachedContentConfig(
+            system_instruction=text, ttl=f"{ttl}s", display_name="software-factory-prefix"
+        ),
+    )
+    if not cache.name:
+        raise RuntimeError("Gemini returned a cached content without a name")
+    return cache.name
+
+
+async def get_cached_content(provider: str, model_name: str | None, text: str) -> str | None:
+    """Return a cache handle for the system prefix ``text``, creating it on first use. / 返回系统前缀的缓存句柄，首次使用时创建。.
+
+    Only providers with explicit caches get a handle, and only for prefixes
+    of at least ``CONTEXT_CACHE_MIN_TOKENS``. Concurrent callers with the
+    same prefix share one create request. Failures are remembered for a few
+    minutes and the call simply goes out uncached.
+    """
+    if provider not in EXPLICIT_CACHE_PROVIDERS or not model_name or not context_cache_enabled():
+        return None
+    if estimate_tokens(text, provider) < int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", str(DEFAULT_MIN_TOKENS))):
+        return None
+    key = prefix_key(provider, model_name, text)
+    known, handle = registry.lookup(key)
+    if known:
+        return handle
+    lock = _create_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        known, handle = registry.lookup(key)
+        if known:
+            return handle
+        ttl = int(os.getenv("CONTEXT_CACHE_TTL", str(DEFAULT_TTL)))
+        try:
+            handle = await asyncio.to_thread(_create_gemini_cache, model_name, text, ttl)
+        except Exception:
+            logger.warning("Could not create a %s context cache; sending the prefix uncached", provider, exc_info=True)
+            registry.register(key, None, FAILURE_BACKOFF)
+            return None
+        finally:
+            _create_locks.pop(key, None)
+        # Stop using the handle shortly before the provider expires it.
+        registry.register(key, handle, max(1, ttl - 60))
+        logger.info("Created %s context cache %s", provider, handle)
+        return handle
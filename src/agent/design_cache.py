@@ -0,0 +1,146 @@
+"""Disk cache for MCP design fetches and design summaries, keyed by URL, node id and file version."""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+from agent.disk_cache import DiskCache
+from agent.utils import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+_FIGMA_PATH = re.compile(r"^/(?:file|design|proto|board)/([A-Za-z0-9]+)")
+# Query parameters that do not change what a design URL points at.
+_VOLATILE_PARAMS = {"t", "mode", "scaling", "page-id", "starting-point-node-id", "fuid", "share"}
+
+
+class DesignRef(NamedTuple):
+    """A design URL reduced to what identifies its content."""
+
+    url: str
+    file_key: str | None
+    node_id: str | None
+
+
+def normalize_design_url(url: str) -> DesignRef:
+    """Normalize a design URL; Figma links are reduced to file key and node id. / 规范化设计链接。."""
+    if not re.match(r"^[a-z]+://", url, re.I):
+        url = f"https://{url}"
+    parts = urlsplit(url.rstrip(".,;)"))
+    host = parts.netloc.lower().removeprefix("www.")
+    query = dict(parse_qsl(parts.query))
+    match = _FIGMA_PATH.match(parts.path) if host.endswith("figma.com") else None
+    if match:
+        file_key = match.group(1)
+        node_id = query.get("node-id")
+        # Figma URLs use "1-2" while the API uses "1:2" for the same node.
+        node_id = node_id.replace("-", ":") if node_id else None
+        normalized = f"figma.com/{file_key}" + (f"?node-id={node_id}" if node_id else "")
+        return DesignRef(normalized, file_key, node_id)
+    kept = sorted((k, v) for k, v in query.items() if k not in _VOLATILE_PARAMS)
+    normalized = f"{host}{parts.path.rstrip('/')}" + (f"?{urlencode(kept)}" if kept else "")
+    return DesignRef(normalized, None, query.get("node-id"))
+
+
+def _figma_token() -> str | None:
+    return os.getenv("FIGMA_API_KEY") or os.getenv("FIGMA_ACCESS_TOKEN") or None
+
+
+async def fetch_figma_version(file_key: str) -> str | None:
+    """Return the file's version (or last-modified) stamp from the Figma API, or None if unavailable."""
+    token = _figma_token()
+    if not token:
+        return None
+    try:
+        async with httpx.AsyncClient(timeout=float(os.getenv("FIGMA_VERSION_TIMEOUT", "5"))) as client:
+            response = await client.get(
+                f"https://api.figma.com/v1/files/{file_key}",
+                params={"depth": 1},
+                headers={"X-Figma-Token": token},
+            )
+            response.raise_for_status()
+            data = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Could not fetch Figma version for %s: %s", file_key, e)
+        return None
+    stamp = data.get("version") or data.get("lastModified")
+    return str(stamp) if stamp else None
+
+
+class DesignCache:
+    """Caches raw MCP tool results and design summaries in a DiskCache. / 缓存 MCP 工具原始结果和设计摘要。.
+
+    Keys combine the normalized URLs, node ids and, when a Figma token is
+    available, each file's version stamp; a new version therefore misses the
+    cache. Without a version the entry simply lives until its TTL expires.
+    """
+
+    def __init__(self, store: DiskCache) -> None:
+        """Wrap a DiskCache instance."""
+        self.store = store
+        self.version_ttl = float(os.getenv("FIGMA_VERSION_TTL", "60"))
+        self._versions: Dict[str, Tuple[str | None, float]] = {}
+
+    async def _version(self, file_key: str) -> str | None:
+        # Remember stamps briefly so one run does not re-check the same file.
+        now = time.monotonic()
+        cached = self._versions.get(file_key)
+        if cached is None or now - cached[1] > self.version_ttl:
+            cached = self._versions[file_key] = (await fetch_figma_version(file_key), now)
+        return cached[0]
+
+    async def design_key(self, urls: Iterable[str]) -> str:
+        """Build the cache key for the designs referenced by ``urls``."""
+        refs = sorted({normalize_design_url(url) for url in urls})
+        parts: List[Dict[str, Any]] = []
+        for ref in refs:
+            version = await self._version(ref.file_key) if ref.file_key else None
+            parts.append({"url": ref.url, "node_id": ref.node_id, "version": version})
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+    async def aget_summary(self, design_key: str) -> str | None:
+        """Return the cached design summary."""
+        return await self.store.aget(f"summary:{design_key}")
+
+    async def aput_summary(self, design_key: str, summary: str) -> None:
+        """Cache a design summary."""
+        await self.store.aset(f"summary:{design_key}", summary)
+
+    @staticmethod
+    def _tool_key(design_key: str, tool: str, args: Dict[str, Any]) -> str:
+        payload = json.dumps({"tool": tool, "args": args}, sort_keys=True, default=str)
+        return f"tool:{design_key}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    async def aget_tool_result(self, design_key: str, tool: str, args: Dict[str, Any]) -> str | None:
+        """Return the cached result of calling ``tool`` with ``args``."""
+        return await self.store.aget(self._tool_key(design_key, tool, args))
+
+    async def aput_tool_result(self, design_key: str, tool: str, args: Dict[str, Any], result: str) -> None:
+        """Cache the result of a successful tool call."""
+        await self.store.aset(self._tool_key(design_key, tool, args), result)
+
+_design_cache: DesignCache | None = None
+
+
+def get_design_cache() -> DesignCache | None:
+    """Return the shared design cache, or None when ``DESIGN_CACHE`` is disabled. / 返回共享的设计缓存。."""
+    global _design_cache
+    if os.getenv("DESIGN_CACHE", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _design_cache is None:
+        ttl = float(os.getenv("DESIGN_CACHE_TTL", "3600"))
+        store = DiskCache(
+            os.path.join(get_cache_dir("design"), "designs.sqlite3"),
+            ttl=ttl if ttl > 0 else None,
+            max_bytes=int(os.getenv("DESIGN_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+            memory_entries=int(os.getenv("DESIGN_CACHE_MEMORY_ENTRIES", "64")),
+        )
+        _design_cache = DesignCache(store)
+    return _design_cache
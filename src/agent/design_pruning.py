@@ -0,0 +1,194 @@
+"""Prune oversized Figma/MCP JSON tool results down to what a developer needs."""
+
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from agent.prompting import estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TOKENS = 8000
+
+# Keys kept on design nodes: identity, layout, style, text and components.
+NODE_KEYS = {
+    "id", "name", "type", "children", "characters", "style", "styles", "fills", "strokes",
+    "strokeWeight", "strokeAlign", "cornerRadius", "rectangleCornerRadii", "effects", "opacity",
+    "blendMode", "absoluteBoundingBox", "size", "constraints", "layoutMode", "layoutWrap",
+    "layoutAlign", "layoutGrow", "layoutPositioning", "layoutSizingHorizontal",
+    "layoutSizingVertical", "primaryAxisAlignItems", "counterAxisAlignItems",
+    "primaryAxisSizingMode", "counterAxisSizingMode", "itemSpacing", "counterAxisSpacing",
+    "paddingLeft", "paddingRight", "paddingTop", "paddingBottom", "clipsContent",
+    "backgroundColor", "componentId", "componentProperties", "componentPropertyDefinitions",
+    "textStyle", "layout", "text", "boundVariables",
+}
+# Keys that never help a developer and dominate the payload size.
+DROP_KEYS = {
+    "fillGeometry", "strokeGeometry", "vectorPaths", "vectorNetwork", "relativeTransform",
+    "exportSettings", "interactions", "reactions", "transitionNodeID", "transitionDuration",
+    "transitionEasing", "prototypeStartNodeID", "flowStartingPoints", "prototypeDevice",
+    "pluginData", "sharedPluginData", "scrollBehavior", "absoluteRenderBounds", "thumbnailUrl",
+    "characterStyleOverrides", "styleOverrideTable", "lineTypes", "lineIndentations",
+}
+# Node types whose children are drawing primitives, kept only as a sized box.
+GEOMETRY_TYPES = {"VECTOR", "BOOLEAN_OPERATION", "STAR", "LINE", "ELLIPSE", "REGULAR_POLYGON"}
+
+
+class PruneReport(NamedTuple):
+    """Sizes of one tool result before and after pruning."""
+
+    before_bytes: int
+    after_bytes: int
+    before_tokens: int
+    after_tokens: int
+    parsed: bool
+
+
+def _is_node(value: Dict[str, Any]) -> bool:
+    return "type" in value and ("id" in value or "children" in value)
+
+
+def find_node(data: Any, node_id: str) -> Any | None:
+    """Return the first dict whose ``id`` is ``node_id`` (Figma "1-2" and "1:2" forms both match)."""
+    wanted = {node_id, node_id.replace("-", ":"), node_id.replace(":", "-")}
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            if value.get("id") in wanted:
+                return value
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+    return None
+
+
+def _hidden(value: Any) -> bool:
+    return isinstance(value, dict) and _is_node(value) and value.get("visible") is False
+
+
+def prune_design(data: Any) -> Any:
+    """Keep layout/style/text/component fields, drop geometry, hidden layers and noise.
+
+    The walk uses an explicit stack rather than recursion so deeply nested
+    documents cannot hit the interpreter's recursion limit.
+    """
+    root: List[Any] = [None]
+    # (source value, container to write into, key or index in that container)
+    stack: List[Tuple[Any, Any, Any]] = [(data, root, 0)]
+    while stack:
+        value, parent, slot = stack.pop()
+        if isinstance(value, dict):
+            node = _is_node(value)
+            out: Dict[str, Any] = {}
+            for key, child in value.items():
+                if key in DROP_KEYS or (node and key not in NODE_KEYS):
+                    continue
+                if key == "children" and value.get("type") in GEOMETRY_TYPES:
+                    continue
+                out[key] = None
+                stack.append((child, out, key))
+            parent[slot] = out
+        elif isinstance(value, list):
+            kept = [child for child in value if not _hidden(child)]
+            items: List[Any] = [None] * len(kept)
+            parent[slot] = items
+            stack.extend((child, items, i) for i, child in enumerate(kept))
+        elif isinstance(value, float):
+            parent[slot] = round(value, 2)
+        else:
+            parent[slot] = value
+    return root[0]
+
+
+def _limit_depth(data: Any, max_depth: int) -> Any:
+    """Replace ``children`` below ``max_depth`` node levels by a count of what was omitted."""
+    root: List[Any] = [None]
+    stack: List[Tuple[Any, Any, Any, int]] = [(data, root, 0, 0)]
+    while stack:
+        value, parent, slot, depth = stack.pop()
+        if isinstance(value, dict):
+            out: Dict[str, Any] = {}
+            for key, child in value.items():
+                if key == "children" and isinstance(child, list):
+                    if depth >= max_depth:
+                        out["omitted_children"] = len(child)
+                        continue
+                    out[key] = None
+                    stack.append((child, out, key, depth + 1))
+                else:
+                    out[key] = None
+                    stack.append((child, out, key, depth))
+            parent[slot] = out
+        elif isinstance(value, list):
+            items: List[Any] = [None] * len(value)
+            parent[slot] = items
+            stack.extend((child, items, i, depth) for i, child in enumerate(value))
+        else:
+            parent[slot] = value
+    return root[0]
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def fit_to_budget(data: Any, max_tokens: int) -> str:
+    """Serialize ``data``, trimming the node tree from the bottom up until it fits ``max_tokens``."""
+    text = _dumps(data)
+    depth = 32
+    while estimate_tokens(text) > max_tokens and depth > 0:
+        depth = depth // 2 if depth > 8 else depth - 1
+        text = _dumps(_limit_depth(data, depth))
+    if estimate_tokens(text) > max_tokens:
+        text = truncate_to_tokens(text, max_tokens) + " ...[truncated]"
+    return text
+
+
+def _parse(text: str) -> Any | None:
+    stripped = text.lstrip()
+    if not stripped.startswith(("{", "[")):
+        return None
+    try:
+        return json.loads(stripped)
+    except ValueError:
+        return None
+
+
+def prune_tool_result(
+    text: str,
+    node_ids: Iterable[str] = (),
+    max_tokens: int | None = None,
+) -> Tuple[str, PruneReport]:
+    """Prune one MCP tool result for the model and report its size before and after. / 裁剪 MCP 工具结果并报告裁剪前后的大小。.
+
+    JSON results are reduced to the first requested node found (if any),
+    stripped of geometry and hidden layers, then cut to ``max_tokens``
+    (``DESIGN_MAX_TOKENS``, default 8000). Other text is only truncated.
+    """
+    if max_tokens is None:
+        max_tokens = int(os.getenv("DESIGN_MAX_TOKENS", str(DEFAULT_MAX_TOKENS)))
+    data = _parse(text)
+    if data is None:
+        pruned = text if estimate_tokens(text) <= max_tokens else truncate_to_tokens(text, max_tokens) + " ...[truncated]"
+    else:
+        for node_id in node_ids:
+            focused = find_node(data, node_id)
+            if focused is not None:
+                data = focused
+                break
+        pruned = fit_to_budget(prune_design(data), max_tokens)
+    report = PruneReport(
+        before_bytes=len(text.encode("utf-8")),
+        after_bytes=len(pruned.encode("utf-8")),
+        before_tokens=estimate_tokens(text),
+        after_tokens=estimate_tokens(pruned),
+        parsed=data is not None,
+    )
+    if report.after_bytes < report.before_bytes:
+        logger.info(
+            "Pruned tool result from %d to %d bytes (~%d -> ~%d tokens)",
+            report.before_bytes, report.after_bytes, report.before_tokens, report.after_tokens,
+        )
+    return pruned, report
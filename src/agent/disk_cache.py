@@ -0,0 +1,190 @@
+"""Two-level string cache: an in-memory LRU in front of a SQLite file."""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """In-memory LRU backed by SQLite, with TTL and size-based eviction. / 以 SQLite 为后端、支持 TTL 和容量淘汰的内存 LRU 缓存。.
+
+    Memory hits never touch the database; their access times are batched
+    and written with the next database operation, so size-based eviction
+    still sees hot entries as recently used. Entries older than ``ttl``
+    seconds are treated as missing, and once the stored values exceed
+    ``max_bytes`` the least recently used rows are deleted. ``peek`` serves
+    memory hits only, so async callers can answer those inline and run
+    ``get``/``set`` (which may block on SQLite) in a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        ttl: float | None = None,
+        max_bytes: int = 256 * 1024 * 1024,
+        memory_entries: int = 256,
+    ) -> None:
+        """Open (or create) the cache database at ``path``."""
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        # Keys served from memory since the last flush, with their access time.
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, "
+            "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        self._total_bytes = int(row[0])
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_hit_locked(self, key: str, now: float) -> str | None:
+        cached = self._memory.get(key)
+        if cached is None or self._expired(cached[1], now):
+            return None
+        self._memory.move_to_end(key)
+        self._touched[key] = now
+        self.hits += 1
+        return cached[0]
+
+    def _flush_touched_locked(self) -> None:
+        if self._touched:
+            touched, self._touched = self._touched, {}
+            self._conn.executemany(
+                "UPDATE entries SET accessed = MAX(accessed, ?) WHERE key = ?",
+                [(accessed, key) for key, accessed in touched.items()],
+            )
+
+    def peek(self, key: str) -> str | None:
+        """Return the value for ``key`` if it is in memory, without touching the database."""
+        with self._lock:
+            return self._memory_hit_locked(key, time.time())
+
+    def get(self, key: str) -> str | None:
+        """Return the cached value for ``key`` or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            value = self._memory_hit_locked(key, now)
+            if value is not None:
+                return value
+            try:
+                self._flush_touched_locked()
+                row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and self._expired(row[1], now):
+                    self._delete_locked(key)
+                    row = None
+                if row is None:
+                    self._memory.pop(key, None)
+                    self.misses += 1
+                    return None
+                self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            except sqlite3.Error:
+                logger.warning("Cache read failed for %s", self.path, exc_info=True)
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return str(row[0])
+
+    async def aget(self, key: str) -> str | None:
+        """Async ``get``: memory hits are served inline, database reads run in a worker thread."""
+        value = self.peek(key)
+        if value is None:
+            value = await asyncio.to_thread(self.get, key)
+        return value
+
+    async def aset(self, key: str, value: str) -> None:
+        """Async ``set``: the database write runs in a worker thread."""
+        await asyncio.to_thread(self.set, key, value)
+
+    def set(self, key: str, value: str) -> None:
+        """Store ``value`` under ``key`` and evict old entries if needed."""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, value, now)
+            try:
+                self._flush_touched_locked()
+                old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, now, now, size),
+                )
+                self._total_bytes += size - (old[0] if old else 0)
+                self._evict_locked(now)
+            except sqlite3.Error:
+                logger.warning("Cache write failed for %s", self.path, exc_info=True)
+
+    def _delete_locked(self, key: str) -> None:
+        row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total_bytes -= row[0]
+        self._memory.pop(key, None)
+        self._touched.pop(key, None)
+
+    def _evict_locked(self, now: float) -> None:
+        if self.ttl is not None:
+            expired = self._conn.execute(
+                "SELECT key FROM entries WHERE created < ?", (now - self.ttl,)
+            ).fetchall()
+            for (key,) in expired:
+                self._delete_locked(key)
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key FROM entries ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for (key,) in rows:
+                self._delete_locked(key)
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def delete(self, key: str) -> None:
+        """Remove a single entry."""
+        with self._lock:
+            self._delete_locked(key)
+
+    def clear(self) -> None:
+        """Remove every entry from memory and disk."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._conn.execute("DELETE FROM entries")
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current sizes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._total_bytes,
+            }
@@ -1,9 +1,169 @@
-"""Global model instance initialization."""
+"""Shared model access: the default model is created on first use, not at import time."""
 
+import contextlib
+import contextvars
 import os
+import time
+from typing import Any, Dict, Iterator, NamedTuple, Sequence, cast
 
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    SystemMessage,
+    message_chunk_to_message,
+)
+from langchain_core.tools import BaseTool
+
+from agent.context_cache import get_cached_content
+from agent.hedging import run_hedged
+from agent.instrumentation import record_llm_call
+from agent.llm_cache import (
+    cache_allowed,
+    describe_model,
+    get_response_cache,
+    make_cache_key,
+)
 from agent.model_config import get_model
+from agent.rate_limit import get_limiter
 
 # Configuration / 配置
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gemini")
-model = get_model(DEFAULT_MODEL)
+# Set on first use by get_default_model(); assign a model here to override it.
+model: BaseChatModel | None = None
+
+
+class ModelVariant(NamedTuple):
+    """Provider and sampling temperature used instead of the default model."""
+
+    provider: str
+    temperature: float = 0.0
+
+
+_variant: contextvars.ContextVar[ModelVariant | None] = contextvars.ContextVar("factory_model_variant", default=None)
+
+
+@contextlib.contextmanager
+def use_model_variant(variant: ModelVariant | None) -> Iterator[None]:
+    """Send the model calls made inside the block (and tasks started from it) to ``variant``. / 在代码块内改用指定的模型变体。."""
+    token = _variant.set(variant)
+    try:
+        yield
+    finally:
+        _variant.reset(token)
+
+
+def current_variant() -> ModelVariant:
+    """Return the variant model calls made here go to: the active ``use_model_variant`` one, else the default model."""
+    return _variant.get() or ModelVariant(DEFAULT_MODEL)
+
+
+def _get_llm(provider: str, temperature: float) -> BaseChatModel:
+    if provider == DEFAULT_MODEL and temperature == 0:
+        return get_default_model()
+    return get_model(provider, temperature)  # type: ignore[arg-type]
+
+
+def streaming_enabled() -> bool:
+    """Check ``LLM_STREAMING`` (on by default): stream model responses token by token."""
+    return os.getenv("LLM_STREAMING", "true").lower() not in ("false", "0", "no", "off")
+
+
+def get_default_model() -> BaseChatModel:
+    """Return the default model, constructing it on first use. / 返回默认模型，首次使用时创建。."""
+    global model
+    if model is None:
+        model = get_model(DEFAULT_MODEL)  # type: ignore[arg-type]
+    return model
+
+
+async def _call_provider(
+    provider: str,
+    messages: Sequence[BaseMessage],
+    tools: Sequence[BaseTool] | None,
+    temperature: float = 0.0,
+    stream: bool = True,
+) -> AIMessage:
+    """Call one provider through its limiter and record latency and token usage.
+
+    With ``stream`` False the response is neither streamed nor forwarded
+    token by token to ``graph.astream(stream_mode="messages")``.
+    """
+    llm = _get_llm(provider, temperature)
+    if not stream:
+        # Attached stream handlers would otherwise switch the model to streaming.
+        llm = llm.model_copy(update={"disable_streaming": True})
+    runnable = llm.bind_tools(tools) if tools else llm
+    kwargs: Dict[str, Any] = {}
+    if not tools and messages and isinstance(messages[0], SystemMessage) and isinstance(messages[0].content, str):
+        # Serve the shared system prefix from an explicit provider cache when one is available.
+        handle = await get_cached_content(provider, getattr(llm, "model", None), messages[0].content)
+        if handle is not None:
+            messages, kwargs["cached_content"] = messages[1:], handle
+    async with get_limiter(provider):
+        started = time.perf_counter()
+        first_token: float | None = None
+        if stream and streaming_enabled():
+            # Chunks also reach graph.astream(stream_mode="messages") through the inherited callbacks.
+            full: Any = None
+            async for chunk in runnable.astream(list(messages), **kwargs):
+                if first_token is None and (chunk.content or getattr(chunk, "tool_call_chunks", None)):
+                    first_token = time.perf_counter()
+                full = chunk if full is None else full + chunk
+            if full is None:
+                raise ValueError(f"{provider} returned an empty response stream")
+            response = cast(AIMessage, message_chunk_to_message(full))
+        else:
+            response = await runnable.ainvoke(list(messages), **kwargs)
+    latency = time.perf_counter() - started
+    # Without streaming the first token arrives with the whole response.
+    ttft = latency if first_token is None else first_token - started
+    record_llm_call(response, latency=latency, ttft=ttft)
+    return response
+
+
+async def ainvoke_model(
+    messages: Sequence[BaseMessage],
+    *,
+    node: str,
+    tools: Sequence[BaseTool] | None = None,
+    use_cache: bool = True,
+) -> AIMessage:
+    """Invoke the shared model, serving identical prompts from the response cache. / 调用共享模型，相同提示词直接命中响应缓存。.
+
+    The cache (off unless ``LLM_CACHE`` is set) is skipped when ``use_cache``
+    is False, the node is listed in ``LLM_CACHE_BYPASS_NODES`` (by default
+    the developer) or the call samples at a temperature above 0. Calls that reach the provider go through its
+    limiter, so bursts queue up instead of tripping rate limits, and run under
+    the node's deadline with an optional hedge to ``HEDGE_PROVIDER``. Their
+    responses are streamed (see ``LLM_STREAMING``), so callers of
+    ``graph.astream(stream_mode="messages")`` see tokens as they arrive. Only
+    the primary provider streams: a hedge answer arrives as one message, so
+    two providers' tokens never interleave in that stream.
+    Inside ``use_model_variant`` the call goes to that provider and
+    temperature instead of the default model.
+    """
+    variant = current_variant()
+    llm = _get_llm(*variant)
+    temperature = variant.temperature or describe_model(llm)["temperature"]
+    cache = get_response_cache() if use_cache and cache_allowed(node, temperature) else None
+    key = make_cache_key(variant.provider, llm, messages, tools, temperature=temperature) if cache else ""
+    if cache is not None:
+        started = time.perf_counter()
+        cached = await cache.aget(key)
+        if cached is not None:
+            elapsed = time.perf_counter() - started
+            record_llm_call(cached, latency=elapsed, ttft=elapsed, cached=True)
+            return cached
+
+    response, winner = await run_hedged(
+        node,
+        lambda provider: _call_provider(
+            provider, messages, tools, variant.temperature, stream=provider == variant.provider
+        ),
+        variant.provider,
+    )
+    # Only cache answers from the provider the key describes.
+    if cache is not None and winner == variant.provider:
+        await cache.aput(key, response)
+    return response
@@ -2,19 +2,24 @@
 
 from __future__ import annotations
 
-from typing import Literal
+from typing import Any, Literal
 
 from dotenv import load_dotenv
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, StateGraph
+from langgraph.graph.state import CompiledStateGraph
 
+from agent.instrumentation import instrument_node
 from agent.nodes import (
     analyzer_node,
     developer_node,
+    fanout_node,
     mcp_node,
     pm_node,
     qa_node,
     writer_node,
 )
+from agent.nodes.fanout import get_fanout_width
 from agent.state import FactoryState
 
 load_dotenv()
@@ -36,37 +41,63 @@ def should_continue(state: FactoryState) -> Literal["developer_node", "writer_no
     # Otherwise, keep retrying / 否则继续重试
     return "developer_node"
 
-# Define the graph / 定义图
-graph_builder = StateGraph(FactoryState)
-
-# Add nodes / 添加节点
-graph_builder.add_node("analyzer_node", analyzer_node)
-graph_builder.add_node("mcp_node", mcp_node)
-graph_builder.add_node("pm_node", pm_node)
-graph_builder.add_node("developer_node", developer_node)
-graph_builder.add_node("qa_node", qa_node)
-graph_builder.add_node("writer_node", writer_node)
-
-# Add edges / 添加边缘
-graph_builder.add_edge("__start__", "analyzer_node")
-graph_builder.add_edge("analyzer_node", "mcp_node")
-graph_builder.add_edge("mcp_node", "pm_node")
-graph_builder.add_edge("pm_node", "developer_node")
-graph_builder.add_edge("developer_node", "qa_node")
-graph_builder.add_edge("writer_node", END)
-
-# Conditional edge from QA / 来自 QA 的条件边缘
-graph_builder.add_conditional_edges(
-    "qa_node",
-    should_continue,
-    {
-        "developer_node": "developer_node",
-        "writer_node": "writer_node",
-        "__end__": END
-    }
-)
+def create_graph_builder(fanout_width: int | None = None) -> StateGraph[FactoryState]:
+    """Wire the factory graph; with a fan-out width above 1 the developer → QA loop runs as parallel candidates. / 构建工厂图（可选并行候选模式）。."""
+    width = get_fanout_width() if fanout_width is None else fanout_width
+    # The node that produces reviewed code: sequential QA after the developer, or the fan-out of both
+    review_node = "fanout_node" if width > 1 else "qa_node"
+    builder = StateGraph(FactoryState)
+
+    # Add nodes, each wrapped with latency/token instrumentation / 添加节点（带耗时与 token 统计）
+    builder.add_node("analyzer_node", instrument_node("analyzer_node", analyzer_node))
+    builder.add_node("mcp_node", instrument_node("mcp_node", mcp_node))
+    builder.add_node("pm_node", instrument_node("pm_node", pm_node))
+    if width > 1:
+        builder.add_node("fanout_node", instrument_node("fanout_node", fanout_node))
+    else:
+        builder.add_node("developer_node", instrument_node("developer_node", developer_node))
+        builder.add_node("qa_node", instrument_node("qa_node", qa_node))
+    builder.add_node("writer_node", instrument_node("writer_node", writer_node))
+
+    # Add edges / 添加边缘
+    builder.add_edge("__start__", "analyzer_node")
+    builder.add_edge("analyzer_node", "mcp_node")
+    builder.add_edge("mcp_node", "pm_node")
+    if width > 1:
+        builder.add_edge("pm_node", "fanout_node")
+    else:
+        builder.add_edge("pm_node", "developer_node")
+        builder.add_edge("developer_node", "qa_node")
+    builder.add_edge("writer_node", END)
+
+    # Conditional edge from QA / 来自 QA 的条件边缘; a revision goes back to whichever node writes code
+    builder.add_conditional_edges(
+        review_node,
+        should_continue,
+        {
+            "developer_node": "fanout_node" if width > 1 else "developer_node",
+            "writer_node": "writer_node",
+            "__end__": END
+        }
+    )
+    return builder
+
+
+# Define the graph / 定义图 (wiring chosen from FANOUT_WIDTH at import time)
+graph_builder = create_graph_builder()
+
+
+def build_graph(
+    checkpointer: BaseCheckpointSaver[Any] | None = None, fanout_width: int | None = None
+) -> CompiledStateGraph[FactoryState]:
+    """Compile the factory graph, optionally with a checkpointer and a fan-out width (default: ``FANOUT_WIDTH``). / 编译工厂图（可选检查点）。."""
+    builder = graph_builder if fanout_width is None else create_graph_builder(fanout_width)
+    return builder.compile(checkpointer=checkpointer)
+
 
-graph = graph_builder.compile()
+# No checkpointer here: `langgraph dev` / the platform supply their own
+# persistence. See agent.checkpointing for local persistent runs.
+graph = build_graph()
 
 # Explicitly export graph for LangGraph / 为 LangGraph 显式导出 graph
-__all__ = ["graph"]
+__all__ = ["graph", "build_graph", "create_graph_builder"]
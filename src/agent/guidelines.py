@@ -0,0 +1,198 @@
+"""Content-hashed digest cache for project guideline documents."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, NamedTuple, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agent.utils import NO_GUIDELINES, find_guideline_files, get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+_SECTION_START = re.compile(r"^(--- CONTENT OF .* ---|#{1,6}\s.*)$")
+
+
+class GuidelineDigest(NamedTuple):
+    """Raw, compacted and (optionally) summarized guidelines for one content hash."""
+
+    key: str
+    raw: str
+    compact: str
+    summary: str | None
+
+
+def _normalize_section(lines: List[str]) -> List[str]:
+    """Strip trailing spaces, squeeze inner spaces and blank runs outside code fences."""
+    out: List[str] = []
+    in_fence = False
+    for line in lines:
+        line = line.rstrip()
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        elif not in_fence:
+            line = re.sub(r"(?<=\S)[ \t]{2,}", " ", line)
+            if not line and (not out or not out[-1]):
+                continue
+        out.append(line)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+def compact_guidelines(raw: str) -> str:
+    """Normalize whitespace and drop sections whose text already appeared earlier. / 规范化空白并去除重复章节。."""
+    sections: List[List[str]] = [[]]
+    in_fence = False
+    for line in raw.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not in_fence and _SECTION_START.match(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+
+    seen = set()
+    kept: List[str] = []
+    for section in sections:
+        lines = _normalize_section(section)
+        if not lines:
+            continue
+        if not lines[0].startswith("--- CONTENT OF "):
+            fingerprint = hashlib.sha1(" ".join(" ".join(lines).lower().split()).encode("utf-8")).hexdigest()
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+        kept.append("\n".join(lines))
+    return "\n\n".join(kept)
+
+
+class GuidelineCache:
+    """Guideline digests cached on disk by the content hash of every source file. / 以每个源文件内容哈希为键的规范摘要缓存。."""
+
+    def __init__(self, cache_dir: str | None = None) -> None:
+        """Create a cache storing digests under ``cache_dir``."""
+        self.cache_dir = cache_dir or get_cache_dir("guidelines")
+        self.hits = 0
+        self.misses = 0
+        # (mtime_ns, size) -> sha256 per path, so unchanged files are not re-read.
+        self._file_hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._digests: Dict[str, GuidelineDigest] = {}
+        self._lock = threading.Lock()
+
+    def _hash_file(self, path: str) -> str:
+        st = os.stat(path)
+        cached = self._file_hashes.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._file_hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _store(self, digest: GuidelineDigest) -> None:
+        self._digests[digest.key] = digest
+        tmp_path = f"{self._path(digest.key)}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(digest._asdict(), f)
+            os.replace(tmp_path, self._path(digest.key))
+        except OSError:
+            logger.warning("Could not write guideline digest %s", digest.key, exc_info=True)
+
+    def get(self, root_dir: str) -> GuidelineDigest:
+        """Return the digest for the current guideline files, building it only when their content changed."""
+        root_dir = os.path.abspath(root_dir)
+        try:
+            paths = find_guideline_files(root_dir)
+        except OSError as e:
+            raw = f"Error scanning project root: {str(e)}"
+            return GuidelineDigest("", raw, raw, None)
+
+        with self._lock:
+            hashed = []
+            for path in paths:
+                try:
+                    hashed.append(f"{os.path.relpath(path, root_dir)}:{self._hash_file(path)}")
+                except OSError:
+                    hashed.append(f"{os.path.relpath(path, root_dir)}:unreadable")
+            key = hashlib.sha256("\n".join(hashed).encode("utf-8")).hexdigest()
+
+            digest = self._digests.get(key)
+            if digest is None:
+                try:
+                    with open(self._path(key), encoding="utf-8") as f:
+                        digest = GuidelineDigest(**json.load(f))
+                    self._digests[key] = digest
+                except (OSError, ValueError, TypeError):
+                    digest = None
+            if digest is not None:
+                self.hits += 1
+                return digest
+
+            self.misses += 1
+            context = []
+            for path in paths:
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        context.append(f"--- CONTENT OF {os.path.relpath(path, root_dir)} ---\n{f.read()}")
+                except Exception as e:
+                    context.append(f"Error reading {path}: {str(e)}")
+            raw = "\n\n".join(context) if context else NO_GUIDELINES
+            digest = GuidelineDigest(key, raw, compact_guidelines(raw), None)
+            self._store(digest)
+            return digest
+
+    def set_summary(self, digest: GuidelineDigest, summary: str) -> GuidelineDigest:
+        """Attach an LLM summary to a digest and persist it."""
+        updated = digest._replace(summary=summary)
+        with self._lock:
+            self._store(updated)
+        return updated
+
+
+guideline_cache = GuidelineCache()
+
+
+async def _summarize(compact: str) -> str:
+    from agent.factory_model import ainvoke_model
+
+    response = await ainvoke_model([
+        SystemMessage(content=(
+            "You condense project documentation for coding agents. "
+            "Keep every rule, convention, naming scheme, command and AI skill instruction; "
+            "drop marketing text, badges, duplicated explanations and examples that add no rule."
+        )),
+        HumanMessage(content=f"Project guidelines:\n{compact}\n\nReturn the condensed guidelines as Markdown."),
+    ], node="analyzer_node")
+    return str(response.content)
+
+
+async def load_project_guidelines(root_dir: str) -> str:
+    """Return the guideline text prompts should use: cached summary, else the compact digest. / 返回提示词应使用的规范文本。.
+
+    The one-time LLM summary is only produced when ``GUIDELINES_SUMMARY`` is
+    enabled and the compact form is longer than ``GUIDELINES_SUMMARY_MIN_CHARS``.
+    """
+    digest = await asyncio.to_thread(guideline_cache.get, root_dir)
+    if digest.summary:
+        return digest.summary
+
+    summarize = os.getenv("GUIDELINES_SUMMARY", "false").lower() in ("1", "true", "yes")
+    min_chars = int(os.getenv("GUIDELINES_SUMMARY_MIN_CHARS", "4000"))
+    if summarize and digest.key and len(digest.compact) > min_chars:
+        try:
+            summary = await _summarize(digest.compact)
+            await asyncio.to_thread(guideline_cache.set_summary, digest, summary)
+            return summary
+        except Exception:
+            logger.exception("Guideline summarization failed, using compact digest")
+    return digest.compact
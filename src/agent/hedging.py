@@ -0,0 +1,160 @@
+"""Per-node deadlines and hedged model requests across providers."""
+
+import asyncio
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Set, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class NodePolicy(NamedTuple):
+    """Latency settings for one node's model calls."""
+
+    deadline: float | None
+    hedge_after: float | None
+    hedge_provider: str | None
+
+
+def _env_float(node: str, name: str) -> float | None:
+    value = os.getenv(f"{name}_{node.upper()}") or os.getenv(name) or ""
+    return float(value) if value.strip() and float(value) > 0 else None
+
+
+def get_node_policy(node: str) -> NodePolicy:
+    """Read ``NODE_DEADLINE_SECONDS``, ``HEDGE_AFTER_SECONDS`` and ``HEDGE_PROVIDER`` (optionally suffixed with ``_<NODE>``). / 读取节点的截止时间与对冲配置。."""
+    provider = os.getenv(f"HEDGE_PROVIDER_{node.upper()}") or os.getenv("HEDGE_PROVIDER") or None
+    return NodePolicy(
+        deadline=_env_float(node, "NODE_DEADLINE_SECONDS"),
+        hedge_after=_env_float(node, "HEDGE_AFTER_SECONDS"),
+        hedge_provider=provider.strip() if provider else None,
+    )
+
+
+class HedgeStats:
+    """Counts calls, hedges, deadline misses and winning providers per node. / 按节点统计调用、对冲、超时和获胜提供者。."""
+
+    def __init__(self) -> None:
+        """Create empty counters."""
+        self._lock = threading.Lock()
+        self._calls: Counter[str] = Counter()
+        self._hedged: Counter[str] = Counter()
+        self._deadline_exceeded: Counter[str] = Counter()
+        self._failed: Counter[str] = Counter()
+        self._wins: Dict[str, Counter[str]] = {}
+
+    def record(self, node: str, *, hedged: bool, winner: str | None, timed_out: bool = False) -> None:
+        """Record the outcome of one call; ``winner`` is None when every request failed or timed out."""
+        with self._lock:
+            self._calls[node] += 1
+            if hedged:
+                self._hedged[node] += 1
+            if winner is not None:
+                self._wins.setdefault(node, Counter())[winner] += 1
+            elif timed_out:
+                self._deadline_exceeded[node] += 1
+            else:
+                self._failed[node] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-node counters including the hedge rate."""
+        with self._lock:
+            return {
+                node: {
+                    "calls": calls,
+                    "hedged": self._hedged[node],
+                    "hedge_rate": self._hedged[node] / calls,
+                    "deadline_exceeded": self._deadline_exceeded[node],
+                    "failed": self._failed[node],
+                    "wins": dict(self._wins.get(node, {})),
+                }
+                for node, calls in self._calls.items()
+            }
+
+    def reset(self) -> None:
+        """Clear all counters."""
+        with self._lock:
+            self._calls.clear()
+            self._hedged.clear()
+            self._deadline_exceeded.clear()
+            self._failed.clear()
+            self._wins.clear()
+
+
+hedge_stats = HedgeStats()
+
+
+async def run_hedged(
+    node: str,
+    call: Callable[[str], Awaitable[T]],
+    primary: str,
+    policy: NodePolicy | None = None,
+) -> Tuple[T, str]:
+    """Run ``call(primary)`` under the node's deadline, hedging to a second provider when it is slow. / 在节点截止时间内调用主提供者，过慢时向备用提供者发出对冲请求。.
+
+    If the primary has not answered after ``hedge_after`` seconds (or fails
+    before that), ``call(hedge_provider)`` is started as well. The first
+    successful response wins and the other request is cancelled. Returns the
+    result and the name of the winning provider; raises TimeoutError when the
+    deadline passes without a successful response.
+    """
+    policy = policy or get_node_policy(node)
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + policy.deadline if policy.deadline else None
+    hedge_provider = policy.hedge_provider if policy.hedge_provider != primary else None
+
+    def remaining() -> float | None:
+        return None if deadline_at is None else max(0.0, deadline_at - loop.time())
+
+    tasks: Dict[asyncio.Task[T], str] = {asyncio.ensure_future(call(primary)): primary}
+    hedged = False
+
+    def start_hedge() -> None:
+        nonlocal hedged
+        assert hedge_provider is not None
+        hedged = True
+        logger.info("Hedging %s request to %s", node, hedge_provider)
+        tasks[asyncio.ensure_future(call(hedge_provider))] = hedge_provider
+
+    try:
+        pending: Set[asyncio.Task[T]] = set(tasks)
+        if hedge_provider and policy.hedge_after is not None:
+            left = remaining()
+            timeout = policy.hedge_after if left is None else min(policy.hedge_after, left)
+            done, pending = await asyncio.wait(pending, timeout=timeout)
+            if not done and remaining() != 0.0:
+                start_hedge()
+                pending = {t for t in tasks if not t.done()}
+            pending |= done
+
+        last_error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                error = task.exception()
+                if error is None:
+                    winner = tasks[task]
+                    hedge_stats.record(node, hedged=hedged, winner=winner)
+                    return task.result(), winner
+                last_error = error
+                logger.warning("%s request to %s failed: %s", node, tasks[task], error)
+            if not pending and hedge_provider and not hedged and remaining() != 0.0:
+                # Primary failed fast: fail over instead of waiting for the threshold.
+                start_hedge()
+                pending = {t for t in tasks if not t.done()}
+
+        if not pending and last_error is not None:
+            hedge_stats.record(node, hedged=hedged, winner=None)
+            raise last_error
+        hedge_stats.record(node, hedged=hedged, winner=None, timed_out=True)
+        raise TimeoutError(f"{node} model call exceeded its {policy.deadline}s deadline")
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
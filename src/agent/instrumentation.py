@@ -0,0 +1,290 @@
+"""Per-node latency, token and payload-size instrumentation with Prometheus/JSONL export."""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Set, TypeVar, cast
+
+from langchain_core.messages import AIMessage
+
+from agent.utils import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Dict[str, Any]]])
+
+_current_run: contextvars.ContextVar[Dict[str, Any] | None] = contextvars.ContextVar("factory_node_run", default=None)
+
+
+def _nbytes(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+class MetricsRegistry:
+    """Collects node run records and aggregates them for export. / 收集节点运行记录并聚合导出。."""
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+        self._sums: Dict[str, Dict[tuple[str, ...], float]] = defaultdict(lambda: defaultdict(float))
+        self.max_records = 1000
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Store one finished node record and update the aggregates."""
+        node = record["node"]
+        with self._lock:
+            self.records.append(record)
+            del self.records[: -self.max_records]
+            sums = self._sums
+            sums["node_runs"][(node,)] += 1
+            sums["node_seconds"][(node,)] += record["wall_ms"] / 1000
+            sums["llm_calls"][(node,)] += record["llm_calls"]
+            sums["llm_cached_calls"][(node,)] += record["cached_calls"]
+            sums["llm_seconds"][(node,)] += record["llm_ms"] / 1000
+            if record["ttft_ms"] is not None:
+                sums["ttft_seconds"][(node,)] += record["ttft_ms"] / 1000
+                sums["ttft_count"][(node,)] += 1
+            sums["generation_seconds"][(node,)] += record["generation_ms"] / 1000
+            sums["generated_tokens"][(node,)] += record["generated_tokens"]
+            sums["tokens"][(node, "prompt")] += record["prompt_tokens"]
+            sums["tokens"][(node, "completion")] += record["completion_tokens"]
+            sums["tokens"][(node, "cache_read")] += record["cache_read_tokens"]
+            for section, size in record["sections"].items():
+                sums["section_bytes"][(node, section)] += size
+            for section, tokens in record["section_tokens"].items():
+                sums["section_tokens"][(node, section)] += tokens
+            for section, tokens in record["trimmed_tokens"].items():
+                sums["trimmed_tokens"][(node, section)] += tokens
+            for tool, stats in record["tools"].items():
+                sums["tool_calls"][(node, tool)] += stats["calls"]
+                sums["tool_seconds"][(node, tool)] += stats["ms"] / 1000
+                sums["tool_errors"][(node, tool)] += stats["errors"]
+            if record["state_bytes"] is not None:
+                sums["state_bytes"][(node,)] = record["state_bytes"]
+
+    def render_prometheus(self) -> str:
+        """Render the aggregates in the Prometheus text exposition format."""
+        metrics = [
+            ("factory_node_runs_total", "counter", "Completed node runs.", "node_runs", ("node",)),
+            ("factory_node_duration_seconds_total", "counter", "Wall time spent in nodes.", "node_seconds", ("node",)),
+            ("factory_llm_calls_total", "counter", "Model calls made by nodes.", "llm_calls", ("node",)),
+            ("factory_llm_cached_calls_total", "counter", "Model calls served from the response cache.", "llm_cached_calls", ("node",)),
+            ("factory_llm_duration_seconds_total", "counter", "Time spent waiting for model responses.", "llm_seconds", ("node",)),
+            ("factory_llm_ttft_seconds_total", "counter", "Sum of time-to-first-token.", "ttft_seconds", ("node",)),
+            ("factory_llm_ttft_count", "counter", "Model calls with a time-to-first-token sample.", "ttft_count", ("node",)),
+            ("factory_llm_generation_seconds_total", "counter", "Time from first to last streamed token.", "generation_seconds", ("node",)),
+            ("factory_llm_generated_tokens_total", "counter", "Completion tokens of streamed model calls.", "generated_tokens", ("node",)),
+            ("factory_llm_tokens_total", "counter", "Prompt, completion and provider-cache-read tokens.", "tokens", ("node", "kind")),
+            ("factory_prompt_section_bytes_total", "counter", "Prompt bytes per section.", "section_bytes", ("node", "section")),
+            ("factory_prompt_section_tokens_total", "counter", "Estimated prompt tokens per section.", "section_tokens", ("node", "section")),
+            ("factory_prompt_trimmed_tokens_total", "counter", "Estimated tokens trimmed to fit the prompt budget.", "trimmed_tokens", ("node", "section")),
+            ("factory_tool_calls_total", "counter", "Tool calls made by nodes.", "tool_calls", ("node", "tool")),
+            ("factory_tool_duration_seconds_total", "counter", "Time spent executing tools.", "tool_seconds", ("node", "tool")),
+            ("factory_tool_errors_total", "counter", "Tool calls that failed or timed out.", "tool_errors", ("node", "tool")),
+            ("factory_state_bytes", "gauge", "Serialized state size at the last node run.", "state_bytes", ("node",)),
+        ]
+        lines: List[str] = []
+        with self._lock:
+            for name, kind, help_text, key, labels in metrics:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for values, total in sorted(self._sums[key].items()):
+                    label_str = ",".join(f'{label}="{value}"' for label, value in zip(labels, values))
+                    lines.append(f"{name}{{{label_str}}} {total:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return per-node averages, handy for logs and debugging."""
+        with self._lock:
+            out: Dict[str, Dict[str, float]] = {}
+            for (node,), runs in self._sums["node_runs"].items():
+                ttft_count = self._sums["ttft_count"][(node,)]
+                generation = self._sums["generation_seconds"][(node,)]
+                out[node] = {
+                    "runs": runs,
+                    "avg_wall_ms": 1000 * self._sums["node_seconds"][(node,)] / runs,
+                    "avg_ttft_ms": 1000 * self._sums["ttft_seconds"][(node,)] / ttft_count if ttft_count else 0.0,
+                    "tokens_per_second": self._sums["generated_tokens"][(node,)] / generation if generation else 0.0,
+                    "prompt_tokens": self._sums["tokens"][(node, "prompt")],
+                    "completion_tokens": self._sums["tokens"][(node, "completion")],
+                    "cache_read_tokens": self._sums["tokens"][(node, "cache_read")],
+                }
+            return out
+
+    def reset(self) -> None:
+        """Drop all records and aggregates."""
+        with self._lock:
+            self.records.clear()
+            self._sums.clear()
+
+
+metrics = MetricsRegistry()
+
+
+# One writer thread keeps export file I/O off the event loop and in record order.
+_export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics-export")
+
+
+def _exporters() -> Set[str]:
+    return {e.strip() for e in os.getenv("METRICS_EXPORT", "").split(",") if e.strip()}
+
+
+def flush_exports(timeout: float | None = None) -> None:
+    """Wait until every queued metrics export has been written."""
+    _export_executor.submit(lambda: None).result(timeout)
+
+
+def _export(record: Dict[str, Any], exporters: Set[str]) -> None:
+    """Write the record to ``exporters`` (jsonl, prometheus); runs on the export thread."""
+    directory = os.getenv("METRICS_DIR") or get_cache_dir("metrics")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if "jsonl" in exporters:
+            with open(os.path.join(directory, "node_metrics.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        if "prometheus" in exporters:
+            # Textfile-collector style: replace the whole file atomically.
+            path = os.path.join(directory, "factory.prom")
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(metrics.render_prometheus())
+            os.replace(f"{path}.tmp", path)
+    except OSError:
+        logger.warning("Could not export node metrics to %s", directory, exc_info=True)
+
+
+def record_prompt_sections(**sections: Any) -> None:
+    """Add the byte size of each prompt section to the current node's record. / 记录当前节点各提示词片段的字节数。."""
+    run = _current_run.get()
+    if run is None:
+        return
+    for name, value in sections.items():
+        run["sections"][name] = run["sections"].get(name, 0) + _nbytes(value)
+
+
+def record_prompt_tokens(tokens: Dict[str, int], trimmed: Dict[str, int]) -> None:
+    """Add the estimated tokens sent and trimmed per prompt section to the current node's record."""
+    run = _current_run.get()
+    if run is None:
+        return
+    for name, count in tokens.items():
+        run["section_tokens"][name] = run["section_tokens"].get(name, 0) + count
+    for name, count in trimmed.items():
+        run["trimmed_tokens"][name] = run["trimmed_tokens"].get(name, 0) + count
+
+
+def record_llm_call(response: AIMessage, *, latency: float, ttft: float | None, cached: bool = False) -> None:
+    """Add one model call (latency, time-to-first-token, token rate, token usage and provider cache reads) to the current node's record.
+
+    For streamed calls the time after the first token is the generation time;
+    the completion tokens over that time give the call's token rate.
+    """
+    run = _current_run.get()
+    if run is None:
+        return
+    usage: Dict[str, Any] = dict(response.usage_metadata or {})
+    completion = usage.get("output_tokens", 0)
+    generation = latency - ttft if ttft is not None and not cached else 0.0
+    run["llm_calls"] += 1
+    run["cached_calls"] += int(cached)
+    run["llm_ms"] += 1000 * latency
+    cache_read = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    run["prompt_tokens"] += usage.get("input_tokens", 0)
+    run["completion_tokens"] += completion
+    run["cache_read_tokens"] += cache_read
+    if generation > 0:
+        run["generation_ms"] += 1000 * generation
+        run["generated_tokens"] += completion
+    run["calls"].append({
+        "ms": round(1000 * latency, 1),
+        "ttft_ms": None if ttft is None else round(1000 * ttft, 1),
+        "tokens_per_s": round(completion / generation, 1) if generation > 0 else None,
+        "cached": cached,
+        "prompt_tokens": usage.get("input_tokens", 0),
+        "cache_read_tokens": cache_read,
+        "completion_tokens": completion,
+    })
+    if ttft is not None and run["ttft_ms"] is None:
+        run["ttft_ms"] = 1000 * ttft
+
+
+def current_run_tokens() -> int:
+    """Return the prompt and completion tokens recorded so far in the current node run (0 outside a node)."""
+    run = _current_run.get()
+    return 0 if run is None else run["prompt_tokens"] + run["completion_tokens"]
+
+
+def record_tool_call(tool: str, *, latency: float, ok: bool) -> None:
+    """Add one tool execution to the current node's record."""
+    run = _current_run.get()
+    if run is None:
+        return
+    stats = run["tools"].setdefault(tool, {"calls": 0, "ms": 0.0, "errors": 0})
+    stats["calls"] += 1
+    stats["ms"] += 1000 * latency
+    stats["errors"] += int(not ok)
+
+
+def instrument_node(name: str, fn: F) -> F:
+    """Wrap a graph node so each run records wall time, model usage and state size. / 包装图节点以记录耗时、模型用量和状态大小。.
+
+    The state and update sizes need a full serialization, so they are only
+    measured when ``METRICS_EXPORT`` is set; records are then written by a
+    background thread.
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(state: Any) -> Dict[str, Any]:
+        exporters = _exporters()
+        run: Dict[str, Any] = {
+            "ts": time.time(),
+            "node": name,
+            "wall_ms": 0.0,
+            "ttft_ms": None,
+            "llm_calls": 0,
+            "cached_calls": 0,
+            "llm_ms": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cache_read_tokens": 0,
+            "generation_ms": 0.0,
+            "generated_tokens": 0,
+            "calls": [],
+            "sections": {},
+            "section_tokens": {},
+            "trimmed_tokens": {},
+            "tools": {},
+            "state_bytes": _nbytes(state) if exporters else None,
+            "update_bytes": None,
+            "status": None,
+        }
+        token = _current_run.set(run)
+        start = time.perf_counter()
+        try:
+            update = await fn(state)
+        except BaseException:
+            run["status"] = "exception"
+            raise
+        else:
+            run["status"] = update.get("status")
+            if exporters:
+                run["update_bytes"] = _nbytes(update)
+            return update
+        finally:
+            run["wall_ms"] = 1000 * (time.perf_counter() - start)
+            _current_run.reset(token)
+            metrics.add(run)
+            if exporters:
+                _export_executor.submit(_export, run, exporters)
+
+    return cast(F, wrapper)
@@ -0,0 +1,116 @@
+"""Response cache for chat model calls keyed by provider, model, temperature and prompt."""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+    messages_to_dict,
+)
+from langchain_core.tools import BaseTool
+
+from agent.disk_cache import DiskCache
+from agent.utils import get_cache_dir
+
+# Nodes that generate code call the model directly unless LLM_CACHE_BYPASS_NODES
+# says otherwise: replaying a cached draft would make re-runs return the same code.
+DEFAULT_BYPASS_NODES = "developer_node"
+
+
+def describe_model(model: BaseChatModel) -> Dict[str, Any]:
+    """Return the model name and temperature of a chat model instance."""
+    name = getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+    return {"model": str(name), "temperature": getattr(model, "temperature", None)}
+
+
+def make_cache_key(
+    provider: str,
+    model: BaseChatModel,
+    messages: Sequence[BaseMessage],
+    tools: Sequence[BaseTool] | None = None,
+    temperature: float | None = None,
+) -> str:
+    """Hash the provider, model name, temperature, bound tools and message list into a cache key.
+
+    ``temperature`` is the sampling temperature the call is made with (e.g. a
+    fan-out variant's); it defaults to the one configured on ``model``.
+    """
+    described = describe_model(model)
+    if temperature is not None:
+        described["temperature"] = temperature
+    payload = {
+        "provider": provider,
+        **described,
+        "tools": sorted(t.name for t in tools or ()),
+        "messages": messages_to_dict(list(messages)),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Stores model responses as serialized messages in a DiskCache. / 将模型响应序列化存储到 DiskCache。."""
+
+    def __init__(self, store: DiskCache) -> None:
+        """Wrap a DiskCache instance."""
+        self.store = store
+
+    def get(self, key: str) -> AIMessage | None:
+        """Return the cached response for ``key``, if any."""
+        return self._decode(self.store.get(key))
+
+    @staticmethod
+    def _decode(raw: str | None) -> AIMessage | None:
+        if raw is None:
+            return None
+        message = messages_from_dict([json.loads(raw)])[0]
+        return message if isinstance(message, AIMessage) else None
+
+    def put(self, key: str, message: BaseMessage) -> None:
+        """Cache a response message."""
+        self.store.set(key, json.dumps(message_to_dict(message)))
+
+    async def aget(self, key: str) -> AIMessage | None:
+        """Like ``get``, but reads SQLite in a worker thread so the event loop is not blocked."""
+        return self._decode(await self.store.aget(key))
+
+    async def aput(self, key: str, message: BaseMessage) -> None:
+        """Like ``put``, but writes SQLite in a worker thread."""
+        await asyncio.to_thread(self.put, key, message)
+
+
+_response_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Return the shared response cache, or None unless ``LLM_CACHE`` is enabled (it is off by default). / 返回共享的响应缓存（默认关闭）。."""
+    global _response_cache
+    if os.getenv("LLM_CACHE", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if _response_cache is None:
+        ttl = float(os.getenv("LLM_CACHE_TTL", "86400"))
+        store = DiskCache(
+            os.path.join(get_cache_dir("llm"), "responses.sqlite3"),
+            ttl=ttl if ttl > 0 else None,
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+            memory_entries=int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256")),
+        )
+        _response_cache = ResponseCache(store)
+    return _response_cache
+
+
+def cache_bypassed(node: str) -> bool:
+    """Check whether ``node`` is listed in ``LLM_CACHE_BYPASS_NODES`` (default: ``developer_node``)."""
+    bypass = os.getenv("LLM_CACHE_BYPASS_NODES", DEFAULT_BYPASS_NODES)
+    return node in {n.strip() for n in bypass.split(",") if n.strip()}
+
+
+def cache_allowed(node: str, temperature: float | None) -> bool:
+    """Check whether a call may be served from the cache: not a bypassed node, and not sampled at temperature > 0."""
+    return not cache_bypassed(node) and not (temperature or 0) > 0
@@ -0,0 +1,188 @@
+"""Relevance-ranked, token-budgeted view of the project map."""
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+from agent.prompting import estimate_tokens, truncate_to_tokens
+
+DEFAULT_MAP_MAX_TOKENS = 2000
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Collapsed subdirectories listed by name per directory; the rest share one summary line.
+MAX_COLLAPSED_DIRS = 8
+
+
+def path_tokens(text: str) -> List[str]:
+    """Split paths or prose into lowercase word tokens (camelCase, snake_case and kebab-case aware)."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if len(t) > 1]
+
+
+class _Dir:
+    __slots__ = ("name", "path", "dirs", "files", "notes", "total_files")
+
+    def __init__(self, name: str, path: str) -> None:
+        self.name = name
+        self.path = path
+        self.dirs: List[_Dir] = []
+        self.files: List[str] = []
+        self.notes: List[str] = []
+        self.total_files = 0
+
+
+def parse_tree(project_map: str) -> Tuple[List[str], _Dir | None]:
+    """Parse the indented tree produced by ``get_project_structure`` into header lines and a root directory."""
+    header: List[str] = []
+    root: _Dir | None = None
+    stack: List[_Dir] = []
+    for line in project_map.splitlines():
+        stripped = line.lstrip(" ")
+        if not stripped:
+            continue
+        if root is None:
+            if stripped.endswith("/") and not stripped.startswith("..."):
+                root = _Dir(stripped[:-1], "")
+                stack = [root]
+            else:
+                header.append(line)
+            continue
+        level = (len(line) - len(stripped)) // 2
+        depth = max(0, min(level - 1, len(stack) - 1))
+        parent = stack[depth]
+        if stripped.startswith("..."):
+            parent.notes.append(stripped)
+        elif stripped.endswith("/"):
+            name = stripped[:-1]
+            child = _Dir(name, f"{parent.path}{name}/")
+            parent.dirs.append(child)
+            del stack[depth + 1:]
+            stack.append(child)
+        else:
+            parent.files.append(f"{parent.path}{stripped}")
+    if root is not None:
+        _count(root)
+    return header, root
+
+
+def _count(root: _Dir) -> None:
+    order: List[_Dir] = []
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        order.append(d)
+        stack.extend(d.dirs)
+    for d in reversed(order):
+        d.total_files = len(d.files) + sum(c.total_files for c in d.dirs)
+
+
+def _walk(root: _Dir) -> Iterable[_Dir]:
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        yield d
+        stack.extend(reversed(d.dirs))
+
+
+def bm25_rank(documents: Dict[str, List[str]], query: Iterable[str]) -> List[Tuple[str, float]]:
+    """Score documents (id -> tokens) against the query terms with Okapi BM25; return positive scores, best first."""
+    terms = set(query)
+    if not documents or not terms:
+        return []
+    df: Counter[str] = Counter()
+    for tokens in documents.values():
+        df.update(set(tokens) & terms)
+    n = len(documents)
+    avgdl = sum(len(t) for t in documents.values()) / n or 1.0
+    idf = {t: math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5)) for t in df}
+    scores = []
+    for doc_id, tokens in documents.items():
+        tf = Counter(t for t in tokens if t in idf)
+        if not tf:
+            continue
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avgdl)
+        score = sum(idf[t] * f * (BM25_K1 + 1) / (f + norm) for t, f in tf.items())
+        scores.append((doc_id, score))
+    scores.sort(key=lambda item: (-item[1], item[0]))
+    return scores
+
+
+def _render(root: _Dir, selected: Set[str]) -> List[str]:
+    """Render the tree showing selected files and expanded selected directories; collapse everything else."""
+    open_dirs = {""}
+    for path in selected:
+        # Open every ancestor directory (and the directory itself when one is selected).
+        parts = path.split("/")[:-1]
+        open_dirs.update("/".join(parts[:i]) + "/" for i in range(1, len(parts) + 1))
+
+    lines: List[str] = []
+    stack: List[Tuple[_Dir, int]] = [(root, 0)]
+    while stack:
+        d, level = stack.pop()
+        indent = "  " * (level + 1)
+        lines.append(f"{'  ' * level}{d.name}/")
+        full = d.path in selected or (d.path == "" and not selected)
+        shown = d.files if full else [f for f in d.files if f in selected]
+        lines.extend(f"{indent}{f[len(d.path):]}" for f in shown)
+        if len(shown) < len(d.files):
+            lines.append(f"{indent}... {len(d.files) - len(shown)} other files")
+        if full:
+            lines.extend(f"{indent}{note}" for note in d.notes)
+        children = [(child, level + 1) for child in d.dirs if child.path in open_dirs]
+        collapsed = [child for child in d.dirs if child.path not in open_dirs]
+        lines.extend(f"{indent}{child.name}/ ({child.total_files} files)" for child in collapsed[:MAX_COLLAPSED_DIRS])
+        if len(collapsed) > MAX_COLLAPSED_DIRS:
+            rest = collapsed[MAX_COLLAPSED_DIRS:]
+            lines.append(f"{indent}... {len(rest)} more directories ({sum(c.total_files for c in rest)} files)")
+        stack.extend(reversed(children))
+    return lines
+
+
+def rank_project_map(project_map: str, query: str, max_tokens: int | None = None) -> str:
+    """Return the project map pruned to the paths most relevant to ``query``. / 返回按相关性裁剪的项目结构。.
+
+    Files and directories are ranked with BM25 over their path tokens. The
+    best-ranked files are listed with their ancestor directories, top-ranked
+    directories are expanded one level, and every other subtree is collapsed
+    into a ``name/ (N files)`` line. The number of ranked paths shown is the
+    largest that keeps the map within ``max_tokens`` (``PROJECT_MAP_MAX_TOKENS``),
+    so the prompt size stays about the same as the repository grows. Maps
+    that already fit are returned unchanged.
+    """
+    if max_tokens is None:
+        max_tokens = int(os.getenv("PROJECT_MAP_MAX_TOKENS", str(DEFAULT_MAP_MAX_TOKENS)))
+    if max_tokens <= 0 or estimate_tokens(project_map) <= max_tokens:
+        return project_map
+    header, parsed = parse_tree(project_map)
+    if parsed is None:
+        return truncate_to_tokens(project_map, max_tokens)
+    root = parsed
+
+    documents: Dict[str, List[str]] = {}
+    for d in _walk(root):
+        if d.path:
+            documents[d.path] = path_tokens(d.path)
+        for f in d.files:
+            documents[f] = path_tokens(f)
+    ranked = [path for path, _ in bm25_rank(documents, path_tokens(query))]
+
+    def build(k: int) -> str:
+        lines = _render(root, set(ranked[:k]))
+        shown = sum(1 for p in ranked[:k] if not p.endswith("/"))
+        note = f"(showing paths most relevant to the request; {shown} of {root.total_files} files listed, other directories collapsed)"
+        return "\n".join([*header, note, *lines])
+
+    # Rendered size grows with k, so binary-search the largest k that fits.
+    lo, hi = 0, len(ranked)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(build(mid)) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    text = build(lo)
+    if estimate_tokens(text) > max_tokens:
+        text = truncate_to_tokens(text, max_tokens).rsplit("\n", 1)[0] + "\n... project map truncated"
+    return text
@@ -0,0 +1,119 @@
+"""Compacting reducer for ``FactoryState.messages``."""
+
+import hashlib
+import os
+from typing import Any, List, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, SystemMessage
+
+DRAFT_NAME = "developer"
+DEFAULT_MAX_MESSAGES = 20
+DEFAULT_MAX_BYTES = 256 * 1024
+
+
+def _content(message: Any) -> str:
+    if isinstance(message, dict):
+        content = message.get("content", "")
+    else:
+        content = getattr(message, "content", message)
+    return content if isinstance(content, str) else str(content)
+
+
+def _size(message: Any) -> int:
+    return len(_content(message).encode("utf-8"))
+
+
+def _is_human(message: Any) -> bool:
+    if isinstance(message, dict):
+        return message.get("role") in ("user", "human") or message.get("type") == "human"
+    return getattr(message, "type", None) == "human"
+
+
+def _compacted(message: Any) -> bool:
+    return not isinstance(message, dict) and "compacted" in getattr(message, "additional_kwargs", {})
+
+
+def _draft_reference(message: AIMessage) -> AIMessage:
+    code = _content(message)
+    digest = hashlib.sha1(code.encode("utf-8")).hexdigest()[:10]
+    return AIMessage(
+        content=f"[superseded code draft: {len(code.encode('utf-8'))} bytes, sha1 {digest}]",
+        name=DRAFT_NAME,
+        id=message.id,
+        additional_kwargs={"compacted": "draft"},
+    )
+
+
+def _truncate(message: Any, limit: int) -> Any:
+    content = _content(message)
+    if isinstance(message, dict) or len(content) <= limit or _compacted(message):
+        return message
+    kept = content[:limit]
+    dropped = len(content.encode("utf-8")) - len(kept.encode("utf-8"))
+    return message.model_copy(
+        update={
+            "content": f"{kept}\n[... {dropped} bytes compacted]",
+            "additional_kwargs": {**message.additional_kwargs, "compacted": "truncated"},
+        }
+    )
+
+
+def compact_messages(left: Sequence[AnyMessage], right: Sequence[AnyMessage]) -> List[AnyMessage]:
+    """Append ``right`` to ``left`` and keep the history bounded. / 追加消息并保持历史有界。.
+
+    - Every developer code draft except the latest is replaced by a short
+      reference (size and hash), since ``state["code"]`` holds the current one.
+    - The first human message (the original request) is always kept; of the
+      rest only the newest ``STATE_MAX_MESSAGES`` survive, and a marker
+      records how many were dropped.
+    - While the total content exceeds ``STATE_MAX_MESSAGE_BYTES``, older
+      messages are truncated and then dropped. The newest message is never
+      changed, because nodes read the latest message as their input.
+    """
+    messages: List[Any] = list(left)
+    # LangGraph also accepts a single message (or dict) as an update.
+    messages += right if isinstance(right, (list, tuple)) else [right]
+    max_messages = max(1, int(os.getenv("STATE_MAX_MESSAGES") or DEFAULT_MAX_MESSAGES))
+    max_bytes = int(os.getenv("STATE_MAX_MESSAGE_BYTES") or DEFAULT_MAX_BYTES)
+
+    drafts = [
+        i for i, m in enumerate(messages)
+        if isinstance(m, AIMessage) and m.name == DRAFT_NAME and not _compacted(m)
+    ]
+    for i in drafts[:-1]:
+        messages[i] = _draft_reference(messages[i])
+
+    pinned = messages[0] if messages and _is_human(messages[0]) else None
+    rest = messages[1:] if pinned is not None else messages
+    dropped = 0
+    if rest and _compacted(rest[0]) and rest[0].additional_kwargs["compacted"] == "window":
+        dropped = rest[0].additional_kwargs["dropped"]
+        rest = rest[1:]
+
+    excess = len(rest) - max_messages
+    if excess > 0:
+        dropped += excess
+        rest = rest[excess:]
+
+    head_bytes = _size(pinned) if pinned is not None else 0
+    total = head_bytes + sum(_size(m) for m in rest)
+    # Truncate older messages first, then drop them, oldest first.
+    for i in range(len(rest) - 1):
+        if total <= max_bytes:
+            break
+        before = _size(rest[i])
+        rest[i] = _truncate(rest[i], 200)
+        total -= before - _size(rest[i])
+    while total > max_bytes and len(rest) > 1:
+        total -= _size(rest.pop(0))
+        dropped += 1
+
+    out: List[Any] = [pinned] if pinned is not None else []
+    if dropped:
+        out.append(
+            SystemMessage(
+                content=f"[{dropped} earlier messages compacted]",
+                additional_kwargs={"compacted": "window", "dropped": dropped},
+            )
+        )
+    return out + rest
@@ -8,13 +8,11 @@ Supports:
 """
 
 import os
-from typing import Literal
+import threading
+from typing import Dict, Literal, Tuple
 
 from dotenv import load_dotenv
 from langchain_core.language_models import BaseChatModel
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
 
 # Load environment variables early
 load_dotenv()
@@ -22,9 +20,34 @@ load_dotenv()
 # Define supported model types
 ModelProvider = Literal["gemini", "qwen", "deepseek", "ollama"]
 
+# Registry of constructed clients, so every caller shares one client (and its
+# HTTP connection pool) per provider and temperature.
+_registry: Dict[Tuple[str, float], BaseChatModel] = {}
+_registry_lock = threading.Lock()
+
 def get_model(provider: ModelProvider = "gemini", temperature: float = 0) -> BaseChatModel:
-    """Get a chat model instance based on the provider."""
+    """Get the shared chat model instance for a provider, creating it on first use. / 获取提供者的共享模型实例，首次使用时创建。."""
+    key = (provider, float(temperature))
+    with _registry_lock:
+        model = _registry.get(key)
+        if model is None:
+            model = _registry[key] = _create_model(provider, temperature)
+        return model
+
+def clear_model_registry() -> None:
+    """Drop all cached clients, e.g. after changing API keys. / 清除已缓存的模型客户端。."""
+    with _registry_lock:
+        _registry.clear()
+
+def _create_model(provider: ModelProvider, temperature: float) -> BaseChatModel:
+    """Construct a new chat model client for the provider.
+
+    Provider packages are imported here rather than at module level, so only
+    the provider actually in use is loaded.
+    """
     if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment variables.")
@@ -44,12 +67,16 @@ def get_model(provider: ModelProvider = "gemini", temperature: float = 0) -> Bas
         api_key = os.getenv("DASHSCOPE_API_KEY")
         if not api_key:
             raise ValueError("DASHSCOPE_API_KEY not found. Please set it for Alibaba Qwen.")
-            
+
+        from langchain_openai import ChatOpenAI
+
         return ChatOpenAI(
             model="qwen-turbo", # or qwen-max
             temperature=temperature,
             api_key=api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+            # Report token usage on streamed responses too.
+            stream_usage=True
         )
         
     elif provider == "deepseek":
@@ -57,16 +84,21 @@ def get_model(provider: ModelProvider = "gemini", temperature: float = 0) -> Bas
         api_key = os.getenv("DEEPSEEK_API_KEY")
         if not api_key:
             raise ValueError("DEEPSEEK_API_KEY not found. Please set it for DeepSeek.")
-            
+
+        from langchain_openai import ChatOpenAI
+
         return ChatOpenAI(
             model="deepseek-chat", 
             temperature=temperature,
             api_key=api_key,
-            base_url="https://api.deepseek.com"
+            base_url="https://api.deepseek.com",
+            stream_usage=True
         )
         
     elif provider == "ollama":
         # Local Ollama
+        from langchain_ollama import ChatOllama
+
         model_name = os.getenv("OLLAMA_MODEL", "llama3")
         base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         
@@ -2,9 +2,10 @@
 
 from agent.nodes.analyzer import analyzer_node
 from agent.nodes.developer import developer_node
+from agent.nodes.fanout import fanout_node
 from agent.nodes.mcp_node import mcp_node
 from agent.nodes.pm import pm_node
 from agent.nodes.qa import qa_node
 from agent.nodes.writer import writer_node
 
-__all__ = ["analyzer_node", "pm_node", "mcp_node", "developer_node", "qa_node", "writer_node"]
+__all__ = ["analyzer_node", "pm_node", "mcp_node", "developer_node", "qa_node", "fanout_node", "writer_node"]
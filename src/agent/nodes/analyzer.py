@@ -4,22 +4,27 @@ import asyncio
 import os
 from typing import Any, Dict
 
+from agent.blob_store import store_blob
+from agent.guidelines import load_project_guidelines
+from agent.snippet_index import refresh_snippet_index
 from agent.state import FactoryState
-from agent.utils import get_project_structure, read_project_guidelines
+from agent.utils import get_project_structure
 
 
 async def analyzer_node(state: FactoryState) -> Dict[str, Any]:
     """Analyzer Agent: Scans project structure AND reads AI guidelines. / 分析器 Agent：扫描项目结构并读取 AI 指导规范。."""
     root_dir = state.get("project_root") or os.getenv("PROJECT_ROOT", ".")
     
-    project_map, project_context = await asyncio.gather(
+    project_map, project_context, _ = await asyncio.gather(
         asyncio.to_thread(get_project_structure, root_dir),
-        asyncio.to_thread(read_project_guidelines, root_dir)
+        load_project_guidelines(root_dir),
+        # Keep the code snippet index current for the PM and developer prompts.
+        asyncio.to_thread(refresh_snippet_index, root_dir),
     )
     
     return {
-        "project_map": project_map,
-        "project_context": project_context,
+        "project_map": store_blob(project_map),
+        "project_context": store_blob(project_context),
         "project_root": root_dir,
         "status": "project_analyzed"
     }
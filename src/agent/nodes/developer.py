@@ -1,48 +1,111 @@
 """Developer node for code generation based on requirements."""
 
+import asyncio
+import logging
+import os
 from typing import Any, Dict
 
-from langchain_core.messages import HumanMessage, SystemMessage
-
-from agent.factory_model import model
+from agent.blob_store import resolve_blob
+from agent.factory_model import ainvoke_model
+from agent.map_ranking import rank_project_map
+from agent.message_reducer import DRAFT_NAME
+from agent.patching import (
+    EDIT_FORMAT,
+    PatchError,
+    apply_edits,
+    parse_edits,
+    validate_revision,
+)
+from agent.prompting import (
+    PRIORITY_SNIPPETS,
+    PRIORITY_TASK,
+    Section,
+    build_messages,
+    project_context,
+)
+from agent.snippet_index import retrieve_snippets
 from agent.state import FactoryState
+from agent.utils import get_first_message_content
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EDIT_MIN_BYTES = 1000
+
+
+def _use_edits(previous_code: Any, feedback: Any) -> bool:
+    """Revise with search/replace edits when there is QA feedback on a large enough previous draft."""
+    if os.getenv("DEVELOPER_REVISION_MODE", "edits").lower() != "edits":
+        return False
+    min_bytes = int(os.getenv("DEVELOPER_EDIT_MIN_BYTES", str(DEFAULT_EDIT_MIN_BYTES)))
+    return bool(feedback) and isinstance(previous_code, str) and len(previous_code.encode("utf-8")) >= min_bytes
 
 
 async def developer_node(state: FactoryState) -> Dict[str, Any]:
     """Developer Agent: Writes code based on requirements and project context. / 开发人员 Agent：根据需求和项目上下文编写代码。."""
-    requirements = state.get("requirements")
+    requirements = resolve_blob(state.get("requirements"))
     feedback = state.get("feedback")
-    project_map = state.get("project_map", "")
-    project_guidelines = state.get("project_context", "")
-    design_data = state.get("design_data", "")
+    previous_code = resolve_blob(state.get("code"))
+    # Same ranking as the PM node, so the shared prompt prefix is identical. / 与 PM 节点相同的排序，保持共享前缀一致。
+    project_map = rank_project_map(
+        resolve_blob(state.get("project_map")) or "", get_first_message_content(state.get("messages", []))
+    )
+    project_guidelines = resolve_blob(state.get("project_context"))
+    design_data = resolve_blob(state.get("design_data"))
+    snippets = await asyncio.to_thread(retrieve_snippets, state.get("project_root"), requirements or "")
     
-    system_prompt = (
+    role = (
         "You are a Senior Software Engineer. "
         "Write clean, efficient code that follows the existing project's conventions, language, and AI guidelines. "
         "You MUST strictly follow any AI-related rules or specialized 'skills' documented in the project context. "
         "If design data (e.g., from Figma) is available, ensure the code implementation matches the design exactly."
     )
     
-    user_prompt = (
-        f"Project Context Structure:\n{project_map}\n\n"
-        f"Project Guidelines/Rules:\n{project_guidelines}\n\n"
-        f"Design Context (from MCP/Figma):\n{design_data}\n\n"
-        f"Requirements:\n{requirements}\n\n"
-    )
-    
+    context = project_context(guidelines=project_guidelines, design_data=design_data, project_map=project_map)
+    inputs = [
+        Section("snippets", snippets, PRIORITY_SNIPPETS, "Relevant Existing Code (match its conventions):"),
+        Section("requirements", requirements, PRIORITY_TASK, "Requirements:"),
+    ]
+
+    if _use_edits(previous_code, feedback):
+        # Revision mode: ask only for the changed hunks and apply them locally. / 修订模式：只请求修改片段并在本地应用。
+        edit_messages = build_messages(role, context, [
+            *inputs,
+            Section("code", previous_code, PRIORITY_TASK, "Current code:"),
+            Section("feedback", feedback, PRIORITY_TASK, "QA Feedback from previous attempt:"),
+            Section("instructions", (
+                "Fix the issues mentioned by editing the current code. Return ONLY search/replace blocks in this format, "
+                "one per change, with SEARCH text copied exactly from the current code and unique within it:\n"
+                + EDIT_FORMAT
+            )),
+        ])
+        response = await ainvoke_model(edit_messages, node="developer_node")
+        try:
+            if not isinstance(response.content, str):
+                raise PatchError("non-text response")
+            code = apply_edits(previous_code, parse_edits(response.content))
+            validate_revision(previous_code, code, state.get("file_path"))
+        except PatchError as e:
+            logger.info("Edits did not apply (%s); regenerating the full file", e)
+        else:
+            response.name = DRAFT_NAME
+            return {
+                "code": code,
+                "messages": [response],
+                "iteration_count": state.get("iteration_count", 0) + 1,
+                "status": "code_written"
+            }
+
     if feedback:
-        user_prompt += (
-            f"QA Feedback from previous attempt:\n{feedback}\n\n"
-            "Please rewrite the code to fix the issues mentioned. Return ONLY the code content."
-        )
+        task = [
+            Section("feedback", feedback, PRIORITY_TASK, "QA Feedback from previous attempt:"),
+            Section("instructions", "Please rewrite the code to fix the issues mentioned. Return ONLY the code content."),
+        ]
     else:
-        user_prompt += "Please write the code to satisfy these requirements. Return ONLY the code content."
-        
-    response = await model.ainvoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=user_prompt)
-    ])
-    
+        task = [Section("instructions", "Please write the code to satisfy these requirements. Return ONLY the code content.")]
+    response = await ainvoke_model(build_messages(role, context, inputs + task), node="developer_node")
+    # Tag the draft so the message reducer can compact it once superseded.
+    response.name = DRAFT_NAME
+
     return {
         "code": response.content,
         "messages": [response],
@@ -0,0 +1,101 @@
+"""Fan-out node: speculative developer candidates reviewed by QA in parallel."""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, cast
+
+from agent import factory_model
+from agent.factory_model import ModelVariant, use_model_variant
+from agent.instrumentation import current_run_tokens
+from agent.nodes.developer import developer_node
+from agent.nodes.qa import qa_node
+from agent.state import FactoryState
+
+logger = logging.getLogger(__name__)
+
+# Temperature added per candidate when FANOUT_VARIANTS is not set.
+TEMPERATURE_STEP = 0.3
+
+
+def get_fanout_width() -> int:
+    """Read ``FANOUT_WIDTH``; 1 (the default) keeps the sequential developer → QA loop. / 读取并行候选数量。."""
+    return max(1, int(os.getenv("FANOUT_WIDTH") or 1))
+
+
+def get_fanout_variants(width: int | None = None) -> List[ModelVariant]:
+    """Return one model variant per candidate, at most ``width`` of them.
+
+    ``FANOUT_VARIANTS`` lists them as ``provider:temperature`` pairs, e.g.
+    ``gemini:0,gemini:0.6,deepseek:0.3``. Without it the default provider is
+    used at increasing temperatures.
+    """
+    width = width or get_fanout_width()
+    variants = []
+    for item in os.getenv("FANOUT_VARIANTS", "").split(","):
+        provider, _, temperature = item.strip().partition(":")
+        if provider:
+            variants.append(ModelVariant(provider.strip(), float(temperature or 0)))
+    if not variants:
+        provider = factory_model.DEFAULT_MODEL
+        variants = [ModelVariant(provider, round(min(1.0, TEMPERATURE_STEP * i), 2)) for i in range(width)]
+    return variants[:width]
+
+
+async def _candidate(state: FactoryState, variant: ModelVariant) -> Dict[str, Any]:
+    """Write one candidate with ``variant`` and have QA review it with the default model."""
+    with use_model_variant(variant):
+        draft = await developer_node(state)
+    reviewed = cast(FactoryState, {**state, **{k: v for k, v in draft.items() if k != "messages"}})
+    review = await qa_node(reviewed)
+    return {**draft, **review, "messages": [*draft["messages"], *review["messages"]]}
+
+
+async def fanout_node(state: FactoryState) -> Dict[str, Any]:
+    """Speculative Developer + QA: writes several candidates at once and keeps the first one QA approves. / 并行生成多个候选代码，采用第一个通过 QA 的版本。.
+
+    Each candidate runs the developer with its own model variant (see
+    ``get_fanout_variants``) and is reviewed as soon as it is written. The
+    first approved candidate wins and the others are cancelled. When none is
+    approved, the first reviewed candidate and its feedback go to the next
+    round. ``FANOUT_MAX_TOKENS`` caps the prompt and completion tokens of a
+    round: it is checked whenever a candidate finishes, and once it is spent
+    unfinished candidates are cancelled as well. Cancelled candidates are
+    awaited before the node returns.
+
+    Raises:
+        RuntimeError: The token cap was spent before any candidate was reviewed.
+    """
+    variants = get_fanout_variants()
+    max_tokens = int(os.getenv("FANOUT_MAX_TOKENS") or 0)
+    spent_before = current_run_tokens()
+    tasks = {asyncio.ensure_future(_candidate(state, variant)): variant for variant in variants}
+    pending = set(tasks)
+    rejected: List[Dict[str, Any]] = []
+    last_error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                variant = tasks[task]
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    logger.warning("Candidate %s failed: %s", variant, last_error)
+                    continue
+                result = task.result()
+                if result["status"] == "approved":
+                    logger.info("Candidate %s approved; cancelling %d others", variant, len(pending))
+                    return result
+                rejected.append(result)
+            if pending and max_tokens and current_run_tokens() - spent_before >= max_tokens:
+                logger.info("Fan-out token cap of %d reached; cancelling %d candidates", max_tokens, len(pending))
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    if rejected:
+        return rejected[0]
+    if last_error is not None:
+        raise last_error
+    raise RuntimeError(f"Fan-out token cap of {max_tokens} reached before any candidate was reviewed")
@@ -1,13 +1,19 @@
 """MCP node for fetching external design data (e.g. Figma)."""
 
+import os
 import re
-from typing import Any, Dict
+import time
+from typing import Any, Dict, List
 
-from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import HumanMessage, SystemMessage, ToolCall, ToolMessage
 
-from agent.factory_model import model
-from agent.mcp_manager import mcp_manager
+from agent.blob_store import store_blob
+from agent.design_cache import get_design_cache, normalize_design_url
+from agent.design_pruning import prune_tool_result
+from agent.factory_model import ainvoke_model
+from agent.instrumentation import record_prompt_sections
 from agent.state import FactoryState
+from agent.tool_executor import execute_tool_calls
 from agent.utils import get_last_message_content
 
 
@@ -20,16 +26,23 @@ async def mcp_node(state: FactoryState) -> Dict[str, Any]:
     if not urls:
         return {"status": "mcp_skipped"}
 
-    # Initialize MCP tools if not already done
-    await mcp_manager.initialize_tools()
-    tools = mcp_manager.get_tools()
+    # Unchanged designs skip the MCP round-trips and the summarization call
+    design_cache = get_design_cache()
+    design_key = await design_cache.design_key(urls) if design_cache else ""
+    if design_cache is not None:
+        cached_summary = await design_cache.aget_summary(design_key)
+        if cached_summary is not None:
+            return _design_update(cached_summary)
+
+    # Start (lazily, concurrently) only the MCP servers these URLs need. The
+    # MCP client stack is imported here so runs without URLs never load it.
+    from agent.mcp_manager import mcp_manager
+
+    tools = await mcp_manager.get_tools_for(urls)
     
     if not tools:
         return {"status": "mcp_no_tools"}
 
-    # Bind tools to the model
-    model_with_tools = model.bind_tools(tools)
-    
     system_prompt = (
         "You are a Design System Specialist. Your task is to extract design information from external sources like Figma. "
         "Use the provided MCP tools to fetch data from any URLs mentioned in the user request. "
@@ -42,35 +55,55 @@ async def mcp_node(state: FactoryState) -> Dict[str, Any]:
         HumanMessage(content=f"User request: {user_request}\nPlease use the tools to analyze any design URLs and provide a detailed summary.")
     ]
     
-    response = await model_with_tools.ainvoke(messages)
-    messages.append(response)
-    
-    # Check if there are tool calls
-    if response.tool_calls:
-        # For simplicity in this node, we'll execute the tool calls and get one more response
-        # In a full LangGraph, this would be a cycle, but here we keep it direct
-        for tool_call in response.tool_calls:
-            # Find the tool
-            tool_name = tool_call["name"]
-            tool_to_use = next((t for t in tools if t.name == tool_name), None)
-            
-            if tool_to_use:
-                try:
-                    tool_result = await tool_to_use.ainvoke(tool_call["args"])
-                    messages.append(ToolMessage(content=str(tool_result), tool_call_id=tool_call["id"]))
-                except Exception as e:
-                    messages.append(ToolMessage(content=f"Error executing tool: {str(e)}", tool_call_id=tool_call["id"]))
-            else:
-                messages.append(ToolMessage(content=f"Tool {tool_name} not found.", tool_call_id=tool_call["id"]))
-        
-        # Get the final summary from the LLM
-        final_response = await model_with_tools.ainvoke(messages)
-        design_summary = final_response.content
-    else:
-        design_summary = response.content
+    url_node_ids = [ref.node_id for ref in map(normalize_design_url, urls) if ref.node_id]
+    max_turns = int(os.getenv("MCP_MAX_TOOL_TURNS", "5"))
+    time_budget = float(os.getenv("MCP_TOOL_TIME_BUDGET", "120"))
+    deadline = time.monotonic() + time_budget
+
+    # Keep executing tool calls until the model stops asking for them (e.g.
+    # multi-page Figma fetches) or the turn/time budget runs out.
+    response = await ainvoke_model(messages, node="mcp_node", tools=tools)
+    turns = 0
+    while response.tool_calls:
+        messages.append(response)
+        remaining = deadline - time.monotonic()
+        if turns >= max_turns or remaining <= 0:
+            messages.extend(
+                ToolMessage(content="Tool budget exhausted; answer with the data gathered so far.", tool_call_id=tool_call["id"])
+                for tool_call in response.tool_calls
+            )
+            response = await ainvoke_model(messages, node="mcp_node", tools=tools)
+            break
+        messages.extend(await execute_tool_calls(
+            response.tool_calls,
+            tools,
+            timeout=remaining,
+            cache=design_cache,
+            design_key=design_key,
+            postprocess=lambda text, tool_call: _prune(text, tool_call, url_node_ids),
+        ))
+        turns += 1
+        response = await ainvoke_model(messages, node="mcp_node", tools=tools)
+
+    design_summary = response.content
+    if design_cache is not None and isinstance(design_summary, str) and design_summary and not response.tool_calls:
+        await design_cache.aput_summary(design_key, design_summary)
+
+    return _design_update(design_summary)
+
+
+def _prune(text: str, tool_call: ToolCall, url_node_ids: List[str]) -> str:
+    """Shrink a raw tool result to the requested node and the token budget."""
+    args = tool_call["args"]
+    requested = [str(args[k]) for k in ("nodeId", "node_id", "node-id") if args.get(k)]
+    pruned, _ = prune_tool_result(text, requested + url_node_ids)
+    record_prompt_sections(tool_result_raw=text, tool_result_pruned=pruned)
+    return pruned
+
 
+def _design_update(design_summary: Any) -> Dict[str, Any]:
     return {
-        "design_data": design_summary,
+        "design_data": store_blob(design_summary),
         "status": "design_analyzed",
         "messages": [HumanMessage(content=f"[Design Analysis Summary]: {design_summary}")]
     }
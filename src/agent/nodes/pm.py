@@ -1,46 +1,58 @@
 """PM node for requirement analysis and file path suggestion."""
 
+import asyncio
 import re
 from typing import Any, Dict
 
-from langchain_core.messages import HumanMessage, SystemMessage
-
-from agent.factory_model import model
+from agent.blob_store import resolve_blob
+from agent.factory_model import ainvoke_model
+from agent.map_ranking import rank_project_map
+from agent.prompting import (
+    PRIORITY_SNIPPETS,
+    PRIORITY_TASK,
+    Section,
+    build_messages,
+    project_context,
+)
+from agent.snippet_index import retrieve_snippets
 from agent.state import FactoryState
-from agent.utils import get_last_message_content
+from agent.utils import get_first_message_content, get_last_message_content
 
 
 async def pm_node(state: FactoryState) -> Dict[str, Any]:
     """Product Manager Agent: Converts user requests into detailed requirements using project context. / 产品经理 Agent：利用项目上下文将用户请求转换为详细的需求文档。."""
     user_request = get_last_message_content(state.get("messages", []))
-    project_map = state.get("project_map", "Unknown structure")
-    project_guidelines = state.get("project_context", "")
-    design_data = state.get("design_data", "No design data available.")
+    # Rank the map by the original request so every node sends the same map. / 按原始请求排序，使各节点发送相同的结构。
+    project_map = rank_project_map(
+        resolve_blob(state.get("project_map")) or "", get_first_message_content(state.get("messages", []))
+    )
+    project_guidelines = resolve_blob(state.get("project_context"))
+    design_data = resolve_blob(state.get("design_data"))
+    snippets = await asyncio.to_thread(retrieve_snippets, state.get("project_root"), user_request)
     
-    system_prompt = (
+    role = (
         "You are an experienced Product Manager. "
         "Your goal is to convert user requests into a detailed Requirements Document. "
         "You MUST carefully read and adhere to all AI-specific rules, guidelines, and skills documentation found in the project context. "
         "If design data (e.g., from Figma) is provided, you MUST incorporate it into the requirements."
     )
     
-    prompt = (
-        f"Project Structure:\n{project_map}\n\n"
-        f"Project Guidelines/Rules:\n{project_guidelines}\n\n"
-        f"Design Context (from MCP/Figma):\n{design_data}\n\n"
-        f"User Request: {user_request}\n\n"
-        "1. Analyze the request and create a detailed Requirements Document (Goal, Functional, Acceptance).\n"
-        "2. Based on the Project Guidelines and Structure, determine the most appropriate programming language and framework.\n"
-        "3. Identify the best 'file_path' to save this new code within the existing structure. "
-        "The path MUST be relative to the project root (e.g., 'app/pages/NewPage.tsx'). "
-        "Do NOT include the project root directory name in the path itself. "
-        "Format your response to include a clearly labeled 'FILE_PATH: path/to/file.extension' line."
-    )
-    
-    response = await model.ainvoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=prompt)
+    messages = build_messages(role, project_context(
+        guidelines=project_guidelines, design_data=design_data, project_map=project_map
+    ), [
+        Section("snippets", snippets, PRIORITY_SNIPPETS, "Relevant Existing Code:"),
+        Section("request", user_request, PRIORITY_TASK, "User Request:"),
+        Section("instructions", (
+            "1. Analyze the request and create a detailed Requirements Document (Goal, Functional, Acceptance).\n"
+            "2. Based on the Project Guidelines and Structure, determine the most appropriate programming language and framework.\n"
+            "3. Identify the best 'file_path' to save this new code within the existing structure. "
+            "The path MUST be relative to the project root (e.g., 'app/pages/NewPage.tsx'). "
+            "Do NOT include the project root directory name in the path itself. "
+            "Format your response to include a clearly labeled 'FILE_PATH: path/to/file.extension' line."
+        )),
     ])
+
+    response = await ainvoke_model(messages, node="pm_node")
     
     content = response.content
     suggested_path = None
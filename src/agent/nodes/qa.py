@@ -1,42 +1,77 @@
 """QA node for code review and approval."""
 
-from typing import Any, Dict
+import os
+from typing import Any, Dict, List
 
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import HumanMessage
 
-from agent.factory_model import model
+from agent.blob_store import resolve_blob
+from agent.factory_model import ainvoke_model
+from agent.patching import code_diff
+from agent.prompting import PRIORITY_TASK, Section, build_messages, project_context
 from agent.state import FactoryState
 
+DEFAULT_DELTA_MAX_RATIO = 0.3
+
+
+def _delta_sections(state: FactoryState, code: Any) -> List[Section] | None:
+    """Build re-review sections from the diff and the earlier feedback, or None when a full review is needed."""
+    if os.getenv("QA_DELTA_REVIEW", "true").lower() in ("false", "0", "no", "off"):
+        return None
+    previous_feedback = state.get("feedback")
+    reviewed = resolve_blob(state.get("last_reviewed_code"))
+    if not previous_feedback or not isinstance(reviewed, str) or not isinstance(code, str):
+        return None
+    if previous_feedback == "Approved." or previous_feedback.startswith("QA evaluation error"):
+        return None
+    diff, ratio = code_diff(reviewed, code)
+    if ratio > float(os.getenv("QA_DELTA_MAX_RATIO", str(DEFAULT_DELTA_MAX_RATIO))):
+        return None
+    return [
+        Section("feedback", previous_feedback, PRIORITY_TASK, "Your previous review of this code requested these changes:"),
+        Section("diff", diff or "(no changes)", PRIORITY_TASK, "Diff since that review:"),
+        Section("instructions", (
+            "The rest of the code is unchanged and was already reviewed. "
+            "Check only whether the requested issues are fixed and the diff introduces no new problems. "
+            "If they are fixed, you must clearly state 'APPROVED' in your response; "
+            "otherwise list what is still wrong."
+        )),
+    ]
+
 
 async def qa_node(state: FactoryState) -> Dict[str, Any]:
     """QA Agent: Reviews code against requirements and project guidelines. / QA Agent：根据需求和项目规范评审代码。."""
-    requirements = state.get("requirements")
-    code = state.get("code")
-    project_guidelines = state.get("project_context", "")
+    requirements = resolve_blob(state.get("requirements"))
+    code = resolve_blob(state.get("code"))
+    project_guidelines = resolve_blob(state.get("project_context"))
     
-    system_prompt = (
+    role = (
         "You are a Senior QA Engineer. "
         "Review the provided code stringently against the requirements, high-quality coding standards, "
         "and the project's AI-specific guidelines/rules. "
         "You MUST ensure the code adheres to any AI Rules or Skills documentation found in the project context."
     )
     
-    user_prompt = (
-        f"Project Guidelines/Rules (including AI Rules and Skills):\n{project_guidelines}\n\n"
-        f"Requirements:\n{requirements}\n\n"
-        f"Code:\n{code}\n\n"
-        "Evaluate if the code meets all requirements, adheres to the guidelines, and is of high quality. "
-        "If you approve it, you must clearly state 'APPROVED' in your response."
-    )
-    
+    # On revisions with a small change, review only the delta. / 修订改动较小时只评审差异。
+    delta = _delta_sections(state, code)
+    if delta is not None:
+        messages = build_messages(role, [], delta)
+    else:
+        # The guidelines open the shared prompt prefix, so QA shares it with PM and developer.
+        messages = build_messages(role, project_context(guidelines=project_guidelines), [
+            Section("requirements", requirements, PRIORITY_TASK, "Requirements:"),
+            Section("code", code, PRIORITY_TASK, "Code:"),
+            Section("instructions", (
+                "Evaluate if the code meets all requirements, adheres to the guidelines, and is of high quality. "
+                "If you approve it, you must clearly state 'APPROVED' in your response."
+            )),
+        ])
+
     is_approved = False
     feedback = ""
     
     try:
-        response = await model.ainvoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ])
+        response = await ainvoke_model(messages, node="qa_node")
         
         content = response.content if hasattr(response, "content") else str(response)
         
@@ -58,5 +93,6 @@ async def qa_node(state: FactoryState) -> Dict[str, Any]:
     return {
         "feedback": feedback,
         "messages": [response_msg],
+        "last_reviewed_code": state.get("code"),
         "status": status
     }
@@ -2,18 +2,19 @@
 
 import asyncio
 import os
-import re
 from typing import Any, Dict
 
 from langchain_core.messages import SystemMessage
 
+from agent.blob_store import resolve_blob
 from agent.state import FactoryState
-from agent.utils import save_file_sync
+from agent.streaming import iter_text, strip_fences_iter
+from agent.utils import save_chunks_sync
 
 
 async def writer_node(state: FactoryState) -> Dict[str, Any]:
     """File Writer Agent: Saves the generated code to the local filesystem. / 文件写入 Agent：将生成的代码保存到本地文件系统。."""
-    code = state.get("code") or ""
+    code = resolve_blob(state.get("code")) or ""
     
     # Use PM's suggested path or fallback to a default
     suggested_path = state.get("file_path") or "output/generated_code.txt"
@@ -31,11 +32,11 @@ async def writer_node(state: FactoryState) -> Dict[str, Any]:
     
     file_path = os.path.join(root_abs, clean_suggested)
     
-    # Cleaning code from markdown blocks
-    clean_code = re.sub(r"```[a-zA-Z]*\n?", "", code).replace("```", "").strip()
+    # Cleaning code from markdown blocks while it is written, chunk by chunk
+    clean_chunks = strip_fences_iter(iter_text(code))
     
     try:
-        await asyncio.to_thread(save_file_sync, file_path, clean_code)
+        await asyncio.to_thread(save_chunks_sync, file_path, clean_chunks)
         status = "file_saved"
         msg = f"Successfully saved code to {file_path}. / 成功将代码保存至 {file_path}。"
     except Exception as e:
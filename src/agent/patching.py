@@ -0,0 +1,105 @@
+"""Search/replace edit blocks for incremental code revisions."""
+
+import ast
+import difflib
+import re
+from typing import List, NamedTuple
+
+EDIT_FORMAT = (
+    "<<<<<<< SEARCH\n"
+    "exact lines copied from the current code\n"
+    "=======\n"
+    "replacement lines\n"
+    ">>>>>>> REPLACE"
+)
+
+_BLOCK = re.compile(r"^<{5,9} SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[^\n]*$", re.M | re.S)
+
+
+class PatchError(ValueError):
+    """Raised when edits cannot be parsed or applied cleanly."""
+
+
+class Edit(NamedTuple):
+    """One search/replace edit."""
+
+    search: str
+    replace: str
+
+
+def parse_edits(text: str) -> List[Edit]:
+    """Extract every SEARCH/REPLACE block from a model response."""
+    edits = [Edit(m.group(1), m.group(2)) for m in _BLOCK.finditer(text)]
+    if not edits:
+        raise PatchError("no SEARCH/REPLACE blocks found")
+    return edits
+
+
+def _locate(code: str, search: str) -> tuple[int, int]:
+    """Return the span of ``search`` in ``code``; tolerate trailing-whitespace differences."""
+    count = code.count(search)
+    if count == 1:
+        start = code.index(search)
+        return start, start + len(search)
+    if count > 1:
+        raise PatchError(f"SEARCH block matches {count} places:\n{search[:200]}")
+
+    # Retry line by line, ignoring trailing whitespace.
+    lines = code.splitlines(keepends=True)
+    wanted = [line.rstrip() for line in search.splitlines()]
+    if not wanted:
+        raise PatchError("empty SEARCH block")
+    matches = [
+        i for i in range(len(lines) - len(wanted) + 1)
+        if [line.rstrip() for line in lines[i : i + len(wanted)]] == wanted
+    ]
+    if len(matches) != 1:
+        raise PatchError(f"SEARCH block matches {len(matches)} places:\n{search[:200]}")
+    start = sum(len(line) for line in lines[: matches[0]])
+    end = start + sum(len(line) for line in lines[matches[0] : matches[0] + len(wanted)])
+    return start, end
+
+
+def apply_edits(code: str, edits: List[Edit]) -> str:
+    """Apply edits in order; raise PatchError if any SEARCH text is missing or ambiguous. / 依次应用编辑块。."""
+    for edit in edits:
+        if not edit.search.strip():
+            # An empty SEARCH appends to the end of the file.
+            code = code + ("" if code.endswith("\n") or not code else "\n") + edit.replace
+            continue
+        start, end = _locate(code, edit.search)
+        replace = edit.replace
+        if code[start:end].endswith("\n") and replace and not replace.endswith("\n"):
+            replace += "\n"
+        code = code[:start] + replace + code[end:]
+    return code
+
+
+def _strip_fences(code: str) -> str:
+    return re.sub(r"```[a-zA-Z]*\n?", "", code).replace("```", "")
+
+
+def validate_revision(old: str, new: str, file_path: str | None) -> None:
+    """Reject revisions that empty the file or break Python syntax that used to parse."""
+    if not new.strip():
+        raise PatchError("edits produced an empty file")
+    if not (file_path or "").endswith(".py"):
+        return
+    try:
+        ast.parse(_strip_fences(old))
+    except SyntaxError:
+        return
+    try:
+        ast.parse(_strip_fences(new))
+    except SyntaxError as e:
+        raise PatchError(f"edits broke Python syntax: {e}") from e
+
+
+def code_diff(old: str, new: str) -> tuple[str, float]:
+    """Return a unified diff of ``old`` to ``new`` and the fraction of lines that changed. / 返回统一差异及改动行比例。."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    changed = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal")
+    diff = "".join(difflib.unified_diff(old_lines, new_lines, "reviewed", "revised", n=3))
+    return diff, changed / max(len(old_lines), len(new_lines), 1)
@@ -0,0 +1,163 @@
+"""Persistent incremental index of the project directory tree."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+from agent.utils import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes so stale caches are ignored.
+INDEX_VERSION = 1
+
+
+class ProjectIndex:
+    """On-disk cache of directory listings keyed by directory mtime and inode. / 以目录 mtime 和 inode 为键的目录列表磁盘缓存。.
+
+    A directory's mtime changes whenever an entry is added, removed or renamed
+    inside it, so an unchanged (mtime, inode) pair means the cached listing is
+    still valid and the directory does not need to be listed again.
+    """
+
+    def __init__(self, root_dir: str, cache_path: str | None = None) -> None:
+        """Load the index for ``root_dir`` from ``cache_path`` if it exists."""
+        self.root_dir = os.path.abspath(root_dir)
+        if cache_path is None:
+            digest = hashlib.sha1(self.root_dir.encode("utf-8")).hexdigest()
+            cache_path = os.path.join(get_cache_dir("project_index"), f"{digest}.json")
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable project index %s", self.cache_path)
+            return
+        if data.get("version") == INDEX_VERSION and data.get("root") == self.root_dir:
+            self._entries = data.get("entries", {})
+
+    def save(self) -> None:
+        """Persist the index to disk if it changed since the last save. / 如果索引有变化则持久化到磁盘。."""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"version": INDEX_VERSION, "root": self.root_dir, "entries": self._entries}
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, separators=(",", ":"))
+                os.replace(tmp_path, self.cache_path)
+                self._dirty = False
+            except OSError:
+                logger.warning("Could not write project index %s", self.cache_path, exc_info=True)
+
+    def list_dir(self, rel_dir: str = "") -> Tuple[List[str], List[str]] | None:
+        """Return sorted ``(dirs, files)`` for a directory, re-listing it only if it changed. / 返回目录的子目录和文件，仅在目录变化时重新扫描。.
+
+        Returns None if the directory no longer exists or cannot be read.
+        """
+        abs_dir = os.path.join(self.root_dir, rel_dir) if rel_dir else self.root_dir
+        try:
+            st = os.stat(abs_dir)
+        except OSError:
+            with self._lock:
+                if self._entries.pop(rel_dir, None) is not None:
+                    self._dirty = True
+            return None
+
+        with self._lock:
+            entry = self._entries.get(rel_dir)
+            if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["ino"] == st.st_ino:
+                self.hits += 1
+                return entry["dirs"], entry["files"]
+            self.misses += 1
+
+        dirs: List[str] = []
+        files: List[str] = []
+        try:
+            with os.scandir(abs_dir) as it:
+                for item in it:
+                    try:
+                        is_dir = item.is_dir(follow_symlinks=False)
+                    except OSError:
+                        is_dir = False
+                    (dirs if is_dir else files).append(item.name)
+        except OSError:
+            return None
+        dirs.sort()
+        files.sort()
+
+        with self._lock:
+            self._entries[rel_dir] = {
+                "mtime_ns": st.st_mtime_ns,
+                "ino": st.st_ino,
+                "dirs": dirs,
+                "files": files,
+            }
+            self._dirty = True
+        return dirs, files
+
+    def invalidate(self, rel_dir: str | None = None) -> None:
+        """Drop cached listings for ``rel_dir`` and its subdirectories, or everything. / 丢弃指定目录及其子目录（或全部）的缓存。."""
+        with self._lock:
+            if rel_dir is None:
+                self._entries.clear()
+                try:
+                    os.remove(self.cache_path)
+                except FileNotFoundError:
+                    pass
+                self._dirty = False
+                return
+            rel_dir = os.path.normpath(rel_dir).lstrip(os.sep)
+            if rel_dir == ".":
+                rel_dir = ""
+            prefix = rel_dir + os.sep
+            stale = [k for k in self._entries if k == rel_dir or not rel_dir or k.startswith(prefix)]
+            for key in stale:
+                del self._entries[key]
+            self._dirty = self._dirty or bool(stale)
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache hit/miss counters and the number of indexed directories. / 返回缓存命中/未命中计数。."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "directories": len(self._entries)}
+
+
+_indexes: Dict[str, ProjectIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_project_index(root_dir: str) -> ProjectIndex:
+    """Return the shared index for ``root_dir``, loading it on first use. / 返回 root_dir 对应的共享索引。."""
+    root_dir = os.path.abspath(root_dir)
+    with _indexes_lock:
+        index = _indexes.get(root_dir)
+        if index is None:
+            index = _indexes[root_dir] = ProjectIndex(root_dir)
+        return index
+
+
+def invalidate_project_index(root_dir: str | None = None, rel_dir: str | None = None) -> None:
+    """Invalidate the index of one project (optionally one subtree) or of every loaded project. / 使项目索引失效。."""
+    with _indexes_lock:
+        if root_dir is None:
+            targets = list(_indexes.values())
+        else:
+            targets = [_indexes.get(os.path.abspath(root_dir)) or ProjectIndex(root_dir)]
+    for index in targets:
+        index.invalidate(rel_dir)
+        index.save()
@@ -0,0 +1,271 @@
+"""Gitignore-aware, parallel, size-capped walker that streams the project tree."""
+
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+from agent.project_index import ProjectIndex, get_project_index
+
+IGNORE_FILES = (".gitignore", ".ignore")
+
+DEFAULT_MAX_DEPTH = 12
+DEFAULT_MAX_DIR_ENTRIES = 200
+DEFAULT_MAX_CHARS = 200_000
+
+
+class _Rule(NamedTuple):
+    base: str
+    regex: "re.Pattern[str]"
+    negate: bool
+    dir_only: bool
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression body."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("(?:/.*)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1 : end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """Accumulated ``.gitignore``/``.ignore`` rules; the last matching rule wins. / 累积的忽略规则，最后匹配的规则生效。."""
+
+    def __init__(self, rules: Tuple[_Rule, ...] = ()) -> None:
+        """Create a rule set from already compiled rules."""
+        self.rules = rules
+
+    def extend(self, base: str, lines: Iterable[str]) -> "IgnoreRules":
+        """Return a new rule set with the patterns of an ignore file located in ``base``."""
+        base = base.replace(os.sep, "/")
+        new_rules = list(self.rules)
+        for raw in lines:
+            line = raw.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            line = line.lstrip("/")
+            body = _translate_glob(line)
+            regex = re.compile(f"^{body}$" if anchored else f"^(?:.*/)?{body}$")
+            new_rules.append(_Rule(base, regex, negate, dir_only))
+        return IgnoreRules(tuple(new_rules))
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """Check whether a root-relative path is ignored."""
+        rel_path = rel_path.replace(os.sep, "/")
+        ignored = False
+        for rule in self.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.base:
+                if not rel_path.startswith(rule.base + "/"):
+                    continue
+                candidate = rel_path[len(rule.base) + 1 :]
+            else:
+                candidate = rel_path
+            if rule.regex.match(candidate):
+                ignored = not rule.negate
+        return ignored
+
+
+_Listing = Union[Tuple[List[str], List[str], List[str]], None]
+
+
+def _read_dir(index: ProjectIndex, rel_dir: str) -> _Listing:
+    """List a directory through the index and read any ignore files it contains."""
+    listing = index.list_dir(rel_dir)
+    if listing is None:
+        return None
+    dirs, files = listing
+    ignore_lines: List[str] = []
+    for name in IGNORE_FILES:
+        if name in files:
+            path = os.path.join(index.root_dir, rel_dir, name)
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    ignore_lines.extend(f.readlines())
+            except OSError:
+                pass
+    return dirs, files, ignore_lines
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "")
+    return int(value) if value.strip() else default
+
+
+def iter_project_tree(
+    root_dir: str = ".",
+    exclude_dirs: Iterable[str] = (),
+    *,
+    max_depth: int | None = None,
+    max_dir_entries: int | None = None,
+    max_chars: int | None = None,
+    workers: int | None = None,
+    index: ProjectIndex | None = None,
+) -> Iterator[str]:
+    """Yield the lines of the project tree as directories are listed. / 在列出目录的同时逐行输出项目树。.
+
+    Directory listings are fetched concurrently on a thread pool (through the
+    persistent project index) while lines are emitted in depth-first order.
+    Paths matched by ``.gitignore``/``.ignore`` files are skipped, directories
+    with more than ``max_dir_entries`` entries are collapsed into an
+    "N files omitted" summary, and output stops once ``max_chars`` is reached.
+    """
+    max_depth = _env_int("PROJECT_MAX_DEPTH", DEFAULT_MAX_DEPTH) if max_depth is None else max_depth
+    max_dir_entries = _env_int("PROJECT_MAX_DIR_ENTRIES", DEFAULT_MAX_DIR_ENTRIES) if max_dir_entries is None else max_dir_entries
+    max_chars = _env_int("PROJECT_MAX_MAP_CHARS", DEFAULT_MAX_CHARS) if max_chars is None else max_chars
+    workers = _env_int("PROJECT_SCAN_WORKERS", min(32, (os.cpu_count() or 1) + 4)) if workers is None else workers
+    index = index or get_project_index(root_dir)
+    excluded = set(exclude_dirs) | {".git"}
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="project-scan")
+    try:
+        header = f"Project Root: {index.root_dir}"
+        emitted = len(header)
+        yield header
+
+        # Stack items are either a directory still to render or a literal
+        # summary line that must follow that directory's children.
+        stack: List[Union[Tuple[str, int, Future[_Listing], IgnoreRules], str]] = [
+            ("", 0, executor.submit(_read_dir, index, ""), IgnoreRules())
+        ]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                lines = [item]
+            else:
+                rel_dir, level, future, rules = item
+                result = future.result()
+                if result is None:
+                    continue
+                dirs, files, ignore_lines = result
+                if ignore_lines:
+                    rules = rules.extend(rel_dir, ignore_lines)
+
+                name = os.path.basename(rel_dir) if rel_dir else (os.path.basename(index.root_dir) or index.root_dir)
+                sub_indent = "  " * (level + 1)
+                lines = [f"{'  ' * level}{name}/"]
+
+                visible_files = [
+                    f for f in files
+                    if not f.startswith(".") and not rules.is_ignored(os.path.join(rel_dir, f), False)
+                ]
+                lines.extend(f"{sub_indent}{f}" for f in visible_files[:max_dir_entries])
+                if len(visible_files) > max_dir_entries:
+                    lines.append(f"{sub_indent}... {len(visible_files) - max_dir_entries} files omitted")
+
+                visible_dirs = [
+                    d for d in dirs
+                    if d not in excluded and not rules.is_ignored(os.path.join(rel_dir, d), True)
+                ]
+                if visible_dirs and level + 1 > max_depth:
+                    lines.append(f"{sub_indent}... {len(visible_dirs)} directories not expanded (max depth {max_depth})")
+                elif visible_dirs:
+                    if len(visible_dirs) > max_dir_entries:
+                        stack.append(f"{sub_indent}... {len(visible_dirs) - max_dir_entries} directories omitted")
+                    children = []
+                    for d in visible_dirs[:max_dir_entries]:
+                        child = os.path.join(rel_dir, d)
+                        children.append((child, level + 1, executor.submit(_read_dir, index, child), rules))
+                    stack.extend(reversed(children))
+
+            for line in lines:
+                emitted += len(line) + 1
+                if emitted > max_chars:
+                    yield f"... project map truncated at {max_chars} characters"
+                    return
+                yield line
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        index.save()
+
+
+def iter_project_files(
+    root_dir: str = ".",
+    exclude_dirs: Iterable[str] = (),
+    *,
+    max_depth: int | None = None,
+    max_dir_entries: int | None = None,
+    index: ProjectIndex | None = None,
+) -> Iterator[str]:
+    """Yield the root-relative paths of all non-ignored files, depth first. / 逐个输出未被忽略的文件相对路径。.
+
+    Uses the same index, ignore files, exclusions and depth and per-directory
+    caps as ``iter_project_tree``: directories deeper than ``max_depth`` are
+    not entered, and only the first ``max_dir_entries`` files and
+    subdirectories of each directory are visited. Only its ``max_chars``
+    cap, which is about the rendered map, does not apply.
+    """
+    max_depth = _env_int("PROJECT_MAX_DEPTH", DEFAULT_MAX_DEPTH) if max_depth is None else max_depth
+    max_dir_entries = _env_int("PROJECT_MAX_DIR_ENTRIES", DEFAULT_MAX_DIR_ENTRIES) if max_dir_entries is None else max_dir_entries
+    index = index or get_project_index(root_dir)
+    excluded = set(exclude_dirs) | {".git"}
+    stack: List[Tuple[str, int, IgnoreRules]] = [("", 0, IgnoreRules())]
+    try:
+        while stack:
+            rel_dir, level, rules = stack.pop()
+            result = _read_dir(index, rel_dir)
+            if result is None:
+                continue
+            dirs, files, ignore_lines = result
+            if ignore_lines:
+                rules = rules.extend(rel_dir, ignore_lines)
+            visible_files = [
+                f for f in files
+                if not f.startswith(".") and not rules.is_ignored(os.path.join(rel_dir, f), False)
+            ]
+            for f in visible_files[:max_dir_entries]:
+                yield os.path.join(rel_dir, f)
+            if level + 1 > max_depth:
+                continue
+            visible_dirs = [
+                d for d in dirs
+                if d not in excluded and not rules.is_ignored(os.path.join(rel_dir, d), True)
+            ]
+            stack.extend((os.path.join(rel_dir, d), level + 1, rules) for d in reversed(visible_dirs[:max_dir_entries]))
+    finally:
+        index.save()
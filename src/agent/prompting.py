@@ -0,0 +1,257 @@
+"""Provider-aware token estimates and priority-based prompt assembly."""
+
+import math
+import os
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from agent.instrumentation import record_prompt_sections, record_prompt_tokens
+
+# Section priorities; lower numbers are kept first when the prompt must shrink.
+PRIORITY_TASK = 0  # request, requirements, feedback, code under review, instructions
+PRIORITY_DESIGN = 1
+PRIORITY_GUIDELINES = 2
+PRIORITY_SNIPPETS = 3
+PRIORITY_MAP = 4
+
+# Shared start of every node's system message. Keeping it (and the project
+# context after it) byte-identical across nodes and iterations lets provider
+# prefix caches (Gemini, DeepSeek, Ollama KV reuse) serve it.
+FACTORY_SYSTEM_PROMPT = (
+    "You are one of the agents of an AI software factory (product manager, developer, QA). "
+    "The project context below is shared by all agents; your role and task are given in the user message. "
+    "You MUST follow any AI-related rules, guidelines or specialized 'skills' documented in the project context."
+)
+# Static project context, in the canonical order used by every node.
+STATIC_SECTIONS = ("guidelines", "design_data", "project_map")
+_STATIC_TITLES = {
+    "guidelines": "Project Guidelines/Rules (including AI Rules and Skills):",
+    "design_data": "Design Context (from MCP/Figma):",
+    "project_map": "Project Structure:",
+}
+
+DEFAULT_MAX_PROMPT_TOKENS = 32_000
+DEFAULT_OUTPUT_RESERVE = 8_192
+TRIM_MARKER = "[... trimmed to fit the context budget]"
+
+
+class ProviderProfile(NamedTuple):
+    """Context window and rough tokenizer ratios of a provider's default model."""
+
+    context_window: int
+    chars_per_token: float  # for ASCII text (code, English)
+    tokens_per_wide_char: float  # for CJK and other multi-byte characters
+
+
+PROVIDER_PROFILES: Dict[str, ProviderProfile] = {
+    "gemini": ProviderProfile(1_048_576, 4.0, 1.0),
+    "qwen": ProviderProfile(131_072, 3.5, 0.7),
+    "deepseek": ProviderProfile(65_536, 3.5, 0.6),
+    "ollama": ProviderProfile(8_192, 3.8, 1.0),
+}
+DEFAULT_PROFILE = ProviderProfile(32_768, 3.5, 1.0)
+
+
+def current_provider() -> str:
+    """Return the provider the next model call goes to, honouring an active ``use_model_variant``."""
+    from agent import factory_model
+
+    return factory_model.current_variant().provider
+
+
+def get_profile(provider: str | None = None) -> ProviderProfile:
+    """Return the profile for ``provider`` (default: the current one); ``OLLAMA_NUM_CTX`` sets Ollama's window."""
+    provider = provider or current_provider()
+    profile = PROVIDER_PROFILES.get(provider, DEFAULT_PROFILE)
+    if provider == "ollama" and os.getenv("OLLAMA_NUM_CTX"):
+        profile = profile._replace(context_window=int(os.environ["OLLAMA_NUM_CTX"]))
+    return profile
+
+
+def estimate_tokens(text: str, provider: str | None = None) -> int:
+    """Estimate the token count of ``text`` for a provider without loading a tokenizer. / 无需分词器估算 token 数。."""
+    if not text:
+        return 0
+    profile = get_profile(provider)
+    chars = len(text)
+    # CJK characters take 3 bytes in UTF-8, so every 2 extra bytes is one wide character.
+    wide = (len(text.encode("utf-8")) - chars) // 2
+    return math.ceil((chars - wide) / profile.chars_per_token + wide * profile.tokens_per_wide_char)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, provider: str | None = None) -> str:
+    """Return the longest head of ``text`` that is estimated at no more than ``max_tokens`` tokens."""
+    tokens = estimate_tokens(text, provider)
+    if tokens <= max_tokens:
+        return text
+    keep = int(len(text) * max(0, max_tokens) / tokens)
+    while keep > 0 and estimate_tokens(text[:keep], provider) > max_tokens:
+        keep -= max(1, keep // 20)
+    return text[:max(0, keep)]
+
+
+def prompt_budget(provider: str | None = None) -> int:
+    """Return the prompt token budget: the context window minus the output reserve, capped at ``PROMPT_MAX_TOKENS``.
+
+    The reserve is ``PROMPT_OUTPUT_RESERVE`` but at most a quarter of the
+    window, so small local models still get room for a prompt.
+    """
+    window = get_profile(provider).context_window
+    reserve = min(int(os.getenv("PROMPT_OUTPUT_RESERVE", str(DEFAULT_OUTPUT_RESERVE))), window // 4)
+    limit = window - reserve
+    max_tokens = int(os.getenv("PROMPT_MAX_TOKENS", str(DEFAULT_MAX_PROMPT_TOKENS)))
+    if max_tokens > 0:
+        limit = min(limit, max_tokens)
+    return max(0, limit)
+
+
+class Section(NamedTuple):
+    """One named part of a prompt."""
+
+    name: str
+    text: str | None
+    priority: int = PRIORITY_TASK
+    title: str = ""
+
+
+class AssembledSections(NamedTuple):
+    """Sections that made it into a prompt, each with its rendered text."""
+
+    parts: List[Tuple[Section, str]]
+    tokens: Dict[str, int]
+    trimmed: Dict[str, int]
+
+
+class AssembledPrompt(NamedTuple):
+    """The assembled prompt with the estimated tokens sent and trimmed per section."""
+
+    text: str
+    tokens: Dict[str, int]
+    trimmed: Dict[str, int]
+
+
+def _trim(text: str, tokens: int, allowed: int, provider: str | None) -> str:
+    """Keep the head of ``text`` within about ``allowed`` tokens, cutting at a line break where possible."""
+    allowed -= estimate_tokens(f"\n{TRIM_MARKER}", provider)
+    if allowed <= 0:
+        return TRIM_MARKER
+    keep = int(len(text) * allowed / tokens)
+    head = text[:keep]
+    newline = head.rfind("\n")
+    if newline > keep // 2:
+        head = head[:newline]
+    return f"{head}\n{TRIM_MARKER}"
+
+
+def _share(sizes: List[int], available: int) -> List[int]:
+    """Split ``available`` tokens between sections so small ones stay whole and large ones share the rest."""
+    allowed = [0] * len(sizes)
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for position, i in enumerate(order):
+        fair = available // (len(order) - position)
+        allowed[i] = min(sizes[i], fair)
+        available -= allowed[i]
+    return allowed
+
+
+def _fit(
+    sections: Sequence[Section],
+    provider: str | None,
+    budget: int | None,
+    reserved: str,
+) -> AssembledSections:
+    """Render the non-empty sections (trimmed to the budget) and record their token counts."""
+    sections = [s for s in sections if s.text and str(s.text).strip()]
+    texts = [str(s.text) for s in sections]
+    if budget is None:
+        budget = prompt_budget(provider)
+    budget -= estimate_tokens(reserved, provider)
+    # Titles and separators are never trimmed.
+    budget -= estimate_tokens("".join(f"{s.title}\n\n\n" for s in sections), provider)
+
+    sizes = [estimate_tokens(text, provider) for text in texts]
+    allowed = list(sizes)
+    remaining = max(0, budget)
+    for priority in sorted({s.priority for s in sections}):
+        level = [i for i, s in enumerate(sections) if s.priority == priority]
+        shares = _share([sizes[i] for i in level], remaining)
+        for i, share in zip(level, shares):
+            allowed[i] = share
+        remaining -= sum(shares)
+
+    fitted: List[Tuple[Section, str]] = []
+    tokens: Dict[str, int] = {}
+    trimmed: Dict[str, int] = {}
+    for section, text, size, allow in zip(sections, texts, sizes, allowed):
+        body = text if allow >= size else _trim(text, size, allow, provider)
+        if allow < size:
+            trimmed[section.name] = size - allow
+        tokens[section.name] = tokens.get(section.name, 0) + min(size, allow)
+        fitted.append((section, f"{section.title}\n{body}" if section.title else body))
+        record_prompt_sections(**{section.name: body})
+    record_prompt_tokens(tokens, trimmed)
+    return AssembledSections(fitted, tokens, trimmed)
+
+
+def assemble_prompt(
+    sections: Sequence[Section],
+    *,
+    provider: str | None = None,
+    budget: int | None = None,
+    reserved: str = "",
+) -> AssembledPrompt:
+    """Join sections in order, trimming the lowest-priority ones to fit the budget. / 按优先级裁剪并拼接提示词片段。.
+
+    Sections are kept by priority (task > design > guidelines > snippets >
+    map). Each priority level takes what it needs from what the higher levels
+    left; a level that does not fit shares the remainder, and its largest
+    sections are cut at a line break with a marker. ``reserved`` is text sent
+    alongside the prompt (e.g. the system message) that counts against the
+    budget. Empty sections (no design data, no snippets, ...) are left out.
+    The per-section token counts are added to the node's metrics.
+    """
+    fitted = _fit(sections, provider, budget, reserved)
+    return AssembledPrompt("\n\n".join(part for _, part in fitted.parts), fitted.tokens, fitted.trimmed)
+
+
+def project_context(
+    *,
+    guidelines: str | None = None,
+    design_data: str | None = None,
+    project_map: str | None = None,
+) -> List[Section]:
+    """Return the static project-context sections with their canonical titles and priorities."""
+    return [
+        Section("guidelines", guidelines, PRIORITY_GUIDELINES, _STATIC_TITLES["guidelines"]),
+        Section("design_data", design_data, PRIORITY_DESIGN, _STATIC_TITLES["design_data"]),
+        Section("project_map", project_map, PRIORITY_MAP, _STATIC_TITLES["project_map"]),
+    ]
+
+
+def build_messages(
+    role: str,
+    context: Sequence[Section],
+    task: Sequence[Section],
+    *,
+    provider: str | None = None,
+    budget: int | None = None,
+) -> List[BaseMessage]:
+    """Lay out a node's prompt as a shared, cacheable prefix followed by its own task. / 构建可缓存的共享前缀 + 节点任务的提示词。.
+
+    The system message is ``FACTORY_SYSTEM_PROMPT`` followed by the static
+    ``context`` sections in canonical order (see ``project_context``), so it
+    is identical for every node that sends the same context. The node's
+    ``role`` and its ``task`` sections (request, requirements, code, ...) go
+    in the user message. Trimming follows the section priorities of
+    ``assemble_prompt``; the prefix only changes when a static section has
+    to be trimmed.
+    """
+    context = sorted(context, key=lambda s: STATIC_SECTIONS.index(s.name))
+    fitted = _fit([*context, *task], provider, budget, f"{FACTORY_SYSTEM_PROMPT}\n\n{role}")
+    static = [part for section, part in fitted.parts if section.name in STATIC_SECTIONS]
+    dynamic = [part for section, part in fitted.parts if section.name not in STATIC_SECTIONS]
+    return [
+        SystemMessage(content="\n\n".join([FACTORY_SYSTEM_PROMPT, *static])),
+        HumanMessage(content="\n\n".join([role, *dynamic])),
+    ]
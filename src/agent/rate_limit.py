@@ -0,0 +1,127 @@
+"""Per-provider request-rate and in-flight limits for model calls."""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from types import TracebackType
+from typing import Any, Deque, Dict
+
+DEFAULT_MAX_IN_FLIGHT = 16
+
+
+class ProviderLimiter:
+    """Async limiter enforcing a requests-per-second rate and a max number of in-flight calls. / 限制每秒请求数和并发请求数的异步限流器。.
+
+    Callers over the limit wait in FIFO order instead of failing, so bursts
+    are smoothed into the provider's quota. ``queue_depth`` reports how many
+    callers are currently waiting.
+    """
+
+    def __init__(self, provider: str, rps: float | None = None, max_in_flight: int | None = None) -> None:
+        """Create a limiter; ``None`` disables the corresponding limit."""
+        self.provider = provider
+        self.rps = rps if rps and rps > 0 else None
+        self.max_in_flight = max_in_flight if max_in_flight and max_in_flight > 0 else None
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.completed = 0
+        self._waiters: Deque[asyncio.Future[None]] = deque()
+        self._next_slot = 0.0
+
+    async def acquire(self) -> None:
+        """Wait for an in-flight slot and the next rate slot."""
+        self.queue_depth += 1
+        try:
+            if self.max_in_flight is None or (self.in_flight < self.max_in_flight and not self._waiters):
+                self.in_flight += 1
+            else:
+                waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    # release() hands its slot directly to us, so in_flight is
+                    # already accounted for once the future resolves.
+                    await waiter
+                except asyncio.CancelledError:
+                    if waiter.done() and not waiter.cancelled():
+                        self.release()
+                    else:
+                        self._waiters.remove(waiter)
+                    raise
+
+            if self.rps is not None:
+                now = time.monotonic()
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + 1.0 / self.rps
+                if slot > now:
+                    try:
+                        await asyncio.sleep(slot - now)
+                    except asyncio.CancelledError:
+                        self.release()
+                        raise
+        finally:
+            self.queue_depth -= 1
+
+    def release(self) -> None:
+        """Free an in-flight slot, handing it to the oldest waiter if any."""
+        self.completed += 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def __aenter__(self) -> "ProviderLimiter":
+        """Acquire the limiter."""
+        await self.acquire()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Release the limiter."""
+        self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current limiter state."""
+        return {
+            "rps": self.rps,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+        }
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _env_number(provider: str, name: str) -> str:
+    return os.getenv(f"{name}_{provider.upper()}") or os.getenv(name) or ""
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    """Return the shared limiter for ``provider``, configured from ``MODEL_RPS[_<PROVIDER>]`` and ``MODEL_MAX_IN_FLIGHT[_<PROVIDER>]``. / 返回提供者的共享限流器。."""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            rps = _env_number(provider, "MODEL_RPS")
+            max_in_flight = _env_number(provider, "MODEL_MAX_IN_FLIGHT")
+            limiter = _limiters[provider] = ProviderLimiter(
+                provider,
+                rps=float(rps) if rps else None,
+                max_in_flight=int(max_in_flight) if max_in_flight else DEFAULT_MAX_IN_FLIGHT,
+            )
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the state (including queue depth) of every provider limiter."""
+    with _limiters_lock:
+        return {provider: limiter.stats() for provider, limiter in _limiters.items()}
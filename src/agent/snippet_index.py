@@ -0,0 +1,359 @@
+"""Persistent, incrementally updated inverted index of source-code snippets."""
+
+import ast
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from agent.map_ranking import BM25_B, BM25_K1, path_tokens
+from agent.project_walker import iter_project_files
+from agent.prompting import estimate_tokens
+from agent.utils import get_cache_dir, get_exclude_dirs
+
+logger = logging.getLogger(__name__)
+
+# Bump when the chunking or on-disk layout changes so stale caches are ignored.
+INDEX_VERSION = 1
+
+SOURCE_EXTENSIONS = frozenset({
+    ".py", ".js", ".jsx", ".mjs", ".ts", ".tsx", ".vue", ".svelte", ".go", ".java", ".kt", ".rs",
+    ".rb", ".php", ".cs", ".swift", ".c", ".h", ".cc", ".cpp", ".hpp", ".scala", ".dart",
+})
+MAX_CHUNK_LINES = 80
+DEFAULT_MAX_FILE_BYTES = 256 * 1024
+DEFAULT_TOP_K = 6
+DEFAULT_MAX_TOKENS = 1500
+STOPWORDS = frozenset(
+    "an and are as be by for from in is it of on or should that the this to with must will when which use".split()
+)
+
+_DECLARATION = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:(?:public|private|protected|static|abstract|pub)\s+)*"
+    r"(?:function\*?|class|interface|type|enum|const|let|var|def|func|fn|struct|impl|trait|module)\s+([A-Za-z_$][\w$]*)"
+)
+
+# (start line, end line, name); lines are 1-based and inclusive.
+_Span = Tuple[int, int, str]
+_ChunkId = Tuple[str, int]
+
+
+class Snippet(NamedTuple):
+    """A ranked chunk of a source file."""
+
+    path: str
+    start: int
+    end: int
+    name: str
+    score: float
+
+
+def _split_long(spans: List[_Span]) -> List[_Span]:
+    out: List[_Span] = []
+    for start, end, name in spans:
+        for s in range(start, end + 1, MAX_CHUNK_LINES):
+            out.append((s, min(end, s + MAX_CHUNK_LINES - 1), name))
+    return out
+
+
+def _fill_gaps(spans: List[_Span], line_count: int) -> List[_Span]:
+    """Add ``<module>`` spans for the top-level code between declarations."""
+    out: List[_Span] = []
+    line = 1
+    for start, end, name in sorted(spans):
+        if start > line:
+            out.append((line, start - 1, "<module>"))
+        out.append((start, end, name))
+        line = max(line, end + 1)
+    if line <= line_count:
+        out.append((line, line_count, "<module>"))
+    return out
+
+
+def _python_spans(text: str, line_count: int) -> List[_Span]:
+    tree = ast.parse(text)
+    spans: List[_Span] = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        end = node.end_lineno or node.lineno
+        methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        if isinstance(node, ast.ClassDef) and end - start >= MAX_CHUNK_LINES and methods:
+            # Large classes are split into the class header and one chunk per method.
+            first = min([methods[0].lineno] + [d.lineno for d in methods[0].decorator_list])
+            spans.append((start, first - 1, node.name))
+            for method in methods:
+                m_start = min([method.lineno] + [d.lineno for d in method.decorator_list])
+                spans.append((max(m_start, first), method.end_lineno or method.lineno, f"{node.name}.{method.name}"))
+        else:
+            spans.append((start, end, node.name))
+    return _fill_gaps(spans, line_count)
+
+
+def _declaration_spans(lines: List[str]) -> List[_Span]:
+    spans: List[_Span] = []
+    for i, line in enumerate(lines, 1):
+        match = _DECLARATION.match(line)
+        if match:
+            if spans:
+                spans[-1] = (spans[-1][0], i - 1, spans[-1][2])
+            spans.append((i, len(lines), match.group(1)))
+    return _fill_gaps(spans, len(lines))
+
+
+def chunk_source(path: str, text: str) -> List[_Span]:
+    """Split a source file into function/class chunks (``ast`` for Python, top-level declarations otherwise). / 按函数或类切分源文件。."""
+    lines = text.splitlines()
+    if not lines:
+        return []
+    spans: List[_Span] | None = None
+    if path.endswith(".py"):
+        try:
+            spans = _python_spans(text, len(lines))
+        except (SyntaxError, ValueError):
+            spans = None
+    if spans is None:
+        spans = _declaration_spans(lines)
+    chunks = []
+    for start, end, name in _split_long(spans):
+        if any(lines[i].strip() for i in range(start - 1, end)):
+            chunks.append((start, end, name))
+    return chunks
+
+
+class SnippetIndex:
+    """Inverted index from code tokens to function/class chunks of a project. / 项目代码片段的倒排索引。.
+
+    Each file's chunks and term frequencies are persisted with the file's
+    (mtime, size), so ``update`` only re-reads files that changed since the
+    last run. Postings are kept in memory and patched per file, and
+    ``search`` scores only the chunks that contain a query term (BM25).
+    """
+
+    def __init__(self, root_dir: str, cache_path: str | None = None) -> None:
+        """Load the index for ``root_dir`` from ``cache_path`` if it exists."""
+        self.root_dir = os.path.abspath(root_dir)
+        if cache_path is None:
+            digest = hashlib.sha1(self.root_dir.encode("utf-8")).hexdigest()
+            cache_path = os.path.join(get_cache_dir("snippet_index"), f"{digest}.json")
+        self.cache_path = cache_path
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[_ChunkId, int]] = {}
+        self._lengths: Dict[_ChunkId, int] = {}
+        self._total_length = 0
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable snippet index %s", self.cache_path)
+            return
+        if data.get("version") == INDEX_VERSION and data.get("root") == self.root_dir:
+            for rel_path, entry in data.get("files", {}).items():
+                self._add(rel_path, entry)
+
+    def save(self) -> None:
+        """Persist the index to disk if it changed since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"version": INDEX_VERSION, "root": self.root_dir, "files": self._files}
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, separators=(",", ":"))
+                os.replace(tmp_path, self.cache_path)
+                self._dirty = False
+            except OSError:
+                logger.warning("Could not write snippet index %s", self.cache_path, exc_info=True)
+
+    def _add(self, rel_path: str, entry: Dict[str, Any]) -> None:
+        self._files[rel_path] = entry
+        for i, (_, _, _, terms) in enumerate(entry["chunks"]):
+            chunk_id = (rel_path, i)
+            length = sum(terms.values())
+            self._lengths[chunk_id] = length
+            self._total_length += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[chunk_id] = tf
+
+    def _remove(self, rel_path: str) -> None:
+        entry = self._files.pop(rel_path, None)
+        if entry is None:
+            return
+        for i, (_, _, _, terms) in enumerate(entry["chunks"]):
+            chunk_id = (rel_path, i)
+            self._total_length -= self._lengths.pop(chunk_id, 0)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def _index_file(self, rel_path: str, st: os.stat_result) -> Dict[str, Any]:
+        with open(os.path.join(self.root_dir, rel_path), encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        lines = text.splitlines()
+        file_terms = path_tokens(rel_path)
+        chunks = []
+        for start, end, name in chunk_source(rel_path, text):
+            terms = Counter(path_tokens("\n".join(lines[start - 1 : end])))
+            terms.update(file_terms)
+            terms.update(path_tokens(name))
+            chunks.append([start, end, name, dict(terms)])
+        return {"mtime": st.st_mtime_ns, "size": st.st_size, "chunks": chunks}
+
+    def update(self) -> int:
+        """Re-index source files that were added or changed and drop deleted ones; return the number re-indexed."""
+        max_bytes = int(os.getenv("SNIPPET_MAX_FILE_BYTES", str(DEFAULT_MAX_FILE_BYTES)))
+        changed = 0
+        with self._lock:
+            seen = set()
+            for rel_path in iter_project_files(self.root_dir, get_exclude_dirs()):
+                if os.path.splitext(rel_path)[1].lower() not in SOURCE_EXTENSIONS:
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.root_dir, rel_path))
+                except OSError:
+                    continue
+                if st.st_size > max_bytes:
+                    continue
+                seen.add(rel_path)
+                entry = self._files.get(rel_path)
+                if entry is not None and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+                    continue
+                try:
+                    new_entry = self._index_file(rel_path, st)
+                except OSError:
+                    seen.discard(rel_path)
+                    continue
+                self._remove(rel_path)
+                self._add(rel_path, new_entry)
+                changed += 1
+            for rel_path in [p for p in self._files if p not in seen]:
+                self._remove(rel_path)
+                changed += 1
+            self._dirty = self._dirty or bool(changed)
+        self.save()
+        return changed
+
+    def clear(self) -> None:
+        """Drop every indexed file from memory; the saved index is left as is."""
+        with self._lock:
+            self._files.clear()
+            self._postings.clear()
+            self._lengths.clear()
+            self._total_length = 0
+            self._dirty = False
+
+    def search(self, query: str, k: int = DEFAULT_TOP_K) -> List[Snippet]:
+        """Return the ``k`` chunks that best match ``query`` (BM25 over code tokens)."""
+        terms = {t for t in path_tokens(query) if t not in STOPWORDS}
+        with self._lock:
+            n = len(self._lengths)
+            if not n or not terms:
+                return []
+            avgdl = self._total_length / n or 1.0
+            scores: Dict[_ChunkId, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[chunk_id] / avgdl)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+            results = []
+            for (rel_path, i), score in best:
+                start, end, name, _ = self._files[rel_path]["chunks"][i]
+                results.append(Snippet(rel_path, start, end, name, score))
+            return results
+
+    def render(self, snippets: List[Snippet], max_tokens: int = DEFAULT_MAX_TOKENS) -> str:
+        """Format snippets with their location, skipping any that would exceed ``max_tokens``."""
+        parts: List[str] = []
+        used = 0
+        for snippet in snippets:
+            try:
+                with open(os.path.join(self.root_dir, snippet.path), encoding="utf-8", errors="replace") as f:
+                    lines = f.read().splitlines()[snippet.start - 1 : snippet.end]
+            except OSError:
+                continue
+            part = f"--- {snippet.path}:{snippet.start}-{snippet.end} ({snippet.name}) ---\n" + "\n".join(lines)
+            cost = estimate_tokens(part)
+            if used + cost > max_tokens:
+                continue
+            parts.append(part)
+            used += cost
+        return "\n\n".join(parts)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of indexed files, chunks and terms."""
+        with self._lock:
+            return {"files": len(self._files), "chunks": len(self._lengths), "terms": len(self._postings)}
+
+
+_indexes: Dict[str, SnippetIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def snippets_enabled() -> bool:
+    """Check ``SNIPPETS`` (on by default)."""
+    return os.getenv("SNIPPETS", "true").lower() not in ("false", "0", "no", "off")
+
+
+def get_snippet_index(root_dir: str) -> SnippetIndex:
+    """Return the shared snippet index for ``root_dir``, loading it on first use. / 返回共享的代码片段索引。."""
+    root_dir = os.path.abspath(root_dir)
+    with _indexes_lock:
+        index = _indexes.get(root_dir)
+        if index is None:
+            index = _indexes[root_dir] = SnippetIndex(root_dir)
+        return index
+
+
+def refresh_snippet_index(root_dir: str | None) -> int:
+    """Bring the index for ``root_dir`` up to date; return the number of files re-indexed.
+
+    Snippets are optional context, so a failed update is logged and the
+    index is emptied (nothing is retrieved) instead of failing the run; the
+    next update indexes the project from scratch.
+    """
+    if not root_dir or not snippets_enabled():
+        return 0
+    try:
+        index = get_snippet_index(root_dir)
+    except Exception:
+        logger.warning("Could not load the snippet index for %s", root_dir, exc_info=True)
+        return 0
+    try:
+        return index.update()
+    except Exception:
+        logger.warning("Could not update the snippet index for %s; continuing without snippets", root_dir, exc_info=True)
+        index.clear()
+        return 0
+
+
+def retrieve_snippets(root_dir: str | None, query: str, *, k: int | None = None, max_tokens: int | None = None) -> str:
+    """Return the most relevant existing code for ``query`` as prompt text, or "" when there is none. / 检索与查询最相关的现有代码。."""
+    if not root_dir or not query or not snippets_enabled():
+        return ""
+    k = k if k is not None else int(os.getenv("SNIPPET_TOP_K", str(DEFAULT_TOP_K)))
+    max_tokens = max_tokens if max_tokens is not None else int(os.getenv("SNIPPET_MAX_TOKENS", str(DEFAULT_MAX_TOKENS)))
+    index = get_snippet_index(root_dir)
+    return index.render(index.search(query, k), max_tokens)
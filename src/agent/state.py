@@ -1,18 +1,21 @@
 """State definition for the software factory agent."""
 
-import operator
 from typing import Annotated, List, Union
 
 from langchain_core.messages import AnyMessage
 from typing_extensions import TypedDict
 
+from agent.message_reducer import compact_messages
+
 
 class FactoryState(TypedDict):
     """The state of the software factory. / 软件工厂的状态。."""
 
-    # Conversation history / 对话历史
-    messages: Annotated[List[AnyMessage], operator.add]
-    # Artifacts / 中间产物
+    # Conversation history, compacted to a bounded window / 对话历史（压缩为有界窗口）
+    messages: Annotated[List[AnyMessage], compact_messages]
+    # Artifacts; the outputs requirements and code stay plain text, large context fields
+    # (project_map, project_context, design_data) are blob references (see agent.blob_store)
+    # 中间产物（输出保持文本，大型上下文字段以 blob 引用存储）
     requirements: Union[str, None]
     code: Union[str, None]
     feedback: Union[str, None]
@@ -20,6 +23,7 @@ class FactoryState(TypedDict):
     project_map: Union[str, None] # Context of the existing project structure / 现有项目结构的上下文
     project_root: Union[str, None] # Root directory to analyze / 要分析的根目录
     project_context: Union[str, None] # Content of AI instructions/guidelines / AI 指导/规范文件的内容
+    last_reviewed_code: Union[str, None] # Code QA last reviewed, for delta re-reviews / QA 上次评审的代码（用于增量复审）
     design_data: Union[str, None] # Data retrieved from design tools (e.g. Figma) via MCP / 通过 MCP 从设计工具（如 Figma）检索的数据
     # Process control / 过程控制
     iteration_count: int
@@ -0,0 +1,73 @@
+"""Incremental helpers for text that arrives in chunks (model token streams, large files)."""
+
+import re
+from typing import Iterable, Iterator
+
+# Same pattern the writer used on the whole text: an opening or closing
+# markdown fence with its optional language tag and newline.
+_FENCE = re.compile(r"```[a-zA-Z]*\n?")
+# A trailing run of backticks (plus tag letters) may still grow into a fence.
+_OPEN_TAIL = re.compile(r"`+[a-zA-Z]*$")
+DEFAULT_CHUNK_CHARS = 64 * 1024
+
+
+class FenceStripper:
+    """Removes markdown code fences from streamed text chunk by chunk. / 逐块去除流式文本中的 Markdown 代码围栏。.
+
+    Feeding chunks and calling ``finish`` yields the same text as stripping
+    the fences (and surrounding whitespace) from the joined text at once. A
+    possible fence at the end of a chunk, and trailing whitespace, are held
+    back until the next chunk shows whether they are kept.
+    """
+
+    def __init__(self) -> None:
+        """Start with nothing pending."""
+        self._pending = ""
+        self._whitespace = ""
+        self._started = False
+
+    def _emit(self, text: str) -> str:
+        text = self._whitespace + text
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        body = text.rstrip()
+        self._whitespace = text[len(body):]
+        return body
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk and return the clean text that is now certain."""
+        self._pending += chunk
+        tail = _OPEN_TAIL.search(self._pending)
+        cut = tail.start() if tail else len(self._pending)
+        ready, self._pending = self._pending[:cut], self._pending[cut:]
+        return self._emit(_FENCE.sub("", ready).replace("```", ""))
+
+    def finish(self) -> str:
+        """Return the rest of the clean text; trailing whitespace is dropped."""
+        rest = self._emit(_FENCE.sub("", self._pending).replace("```", ""))
+        self._pending = self._whitespace = ""
+        return rest
+
+
+def iter_text(text: str, size: int = DEFAULT_CHUNK_CHARS) -> Iterator[str]:
+    """Split ``text`` into chunks of at most ``size`` characters."""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def strip_fences_iter(chunks: Iterable[str]) -> Iterator[str]:
+    """Yield the clean, non-empty pieces of ``chunks`` with markdown fences removed."""
+    stripper = FenceStripper()
+    for chunk in chunks:
+        piece = stripper.feed(chunk)
+        if piece:
+            yield piece
+    rest = stripper.finish()
+    if rest:
+        yield rest
+
+
+def strip_fences(text: str) -> str:
+    """Remove markdown code fences and surrounding whitespace from a complete text."""
+    return "".join(strip_fences_iter([text]))
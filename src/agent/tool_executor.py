@@ -0,0 +1,92 @@
+"""Bounded-concurrency execution of model tool calls."""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.tools import BaseTool
+
+from agent.design_cache import DesignCache
+from agent.instrumentation import record_tool_call
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_CONCURRENCY = 4
+
+
+def tool_result_text(result: Any) -> str:
+    """Flatten a tool result (string or list of content blocks) into text."""
+    if isinstance(result, str):
+        return result
+    if isinstance(result, list):
+        return "\n".join(
+            str(block["text"]) if isinstance(block, dict) and "text" in block else str(block) for block in result
+        )
+    return str(result)
+
+
+def get_tool_concurrency() -> int:
+    """Read ``TOOL_MAX_CONCURRENCY`` (default 4)."""
+    return max(1, int(os.getenv("TOOL_MAX_CONCURRENCY") or DEFAULT_TOOL_CONCURRENCY))
+
+
+async def execute_tool_calls(
+    tool_calls: Sequence[ToolCall],
+    tools: Sequence[BaseTool],
+    *,
+    max_concurrency: int | None = None,
+    timeout: float | None = None,
+    cache: DesignCache | None = None,
+    design_key: str = "",
+    postprocess: Callable[[str, ToolCall], str] | None = None,
+) -> List[ToolMessage]:
+    """Run the tool calls of one model response concurrently. / 并发执行一次模型响应中的工具调用。.
+
+    At most ``max_concurrency`` calls run at once and each is cut off after
+    ``timeout`` seconds. Failures, timeouts and unknown tools become error
+    ToolMessages so the model can react to them. Messages are returned in
+    the order of ``tool_calls``. With a ``cache``, successful results are
+    stored under ``design_key`` and repeated calls skip the tool entirely.
+    ``postprocess`` rewrites each (raw or cached) result before it is handed
+    back to the model.
+    """
+    by_name: Dict[str, BaseTool] = {tool.name: tool for tool in tools}
+    semaphore = asyncio.Semaphore(max_concurrency or get_tool_concurrency())
+
+    async def run(tool_call: ToolCall) -> ToolMessage:
+        name = tool_call["name"]
+        tool = by_name.get(name)
+        if tool is None:
+            return ToolMessage(content=f"Tool {name} not found.", tool_call_id=tool_call["id"])
+        if cache is not None:
+            cached = await cache.aget_tool_result(design_key, name, tool_call["args"])
+            if cached is not None:
+                content = await asyncio.to_thread(postprocess, cached, tool_call) if postprocess else cached
+                return ToolMessage(content=content, tool_call_id=tool_call["id"])
+
+        async with semaphore:
+            start = time.perf_counter()
+            ok = False
+            try:
+                result: Any = await asyncio.wait_for(tool.ainvoke(tool_call["args"]), timeout=timeout)
+                ok = True
+                content = tool_result_text(result)
+                if cache is not None:
+                    await cache.aput_tool_result(design_key, name, tool_call["args"], content)
+                if postprocess is not None:
+                    # Large JSON results take a while to prune; keep the loop free.
+                    content = await asyncio.to_thread(postprocess, content, tool_call)
+            except TimeoutError:
+                content = "Error executing tool: timed out"
+            except Exception as e:
+                content = f"Error executing tool: {str(e)}"
+            finally:
+                latency = time.perf_counter() - start
+                record_tool_call(name, latency=latency, ok=ok)
+                logger.info("Tool %s finished in %.0f ms (ok=%s)", name, 1000 * latency, ok)
+        return ToolMessage(content=content, tool_call_id=tool_call["id"])
+
+    return list(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
@@ -1,7 +1,7 @@
 """Utility functions for the software factory agent."""
 
 import os
-from typing import List
+from typing import Iterable, List
 
 from langchain_core.messages import AnyMessage
 
@@ -15,34 +15,44 @@ def get_last_message_content(messages: List[AnyMessage]) -> str:
         return last_msg.get("content", "")
     return getattr(last_msg, "content", str(last_msg))
 
+def get_first_message_content(messages: List[AnyMessage]) -> str:
+    """Extract the original request, i.e. the first message in the history. / 提取历史记录中的第一条消息（原始请求）。."""
+    return get_last_message_content(messages[:1])
+
+def get_cache_dir(name: str) -> str:
+    """Return (and create) a named cache directory under AGENT_CACHE_DIR. / 返回（并创建）AGENT_CACHE_DIR 下的命名缓存目录。."""
+    base = os.getenv("AGENT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "agent")
+    path = os.path.join(base, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
 def get_project_structure(root_dir: str = ".", exclude_dirs: List[str] | None = None) -> str:
-    """Scan the directory to create a text-based tree structure. / 扫描目录以创建基于文本的 tree 结构。."""
+    """Scan the directory to create a text-based tree structure. / 扫描目录以创建基于文本的 tree 结构。.
+
+    The tree is streamed by the gitignore-aware walker, which lists directories
+    in parallel through the persistent project index (only directories that
+    changed since the previous run are listed again) and applies the
+    PROJECT_MAX_DEPTH / PROJECT_MAX_DIR_ENTRIES / PROJECT_MAX_MAP_CHARS caps.
+    """
+    from agent.project_walker import iter_project_tree
+
     if exclude_dirs is None:
-        env_excludes = os.getenv("PROJECT_EXCLUDES", "")
-        if env_excludes:
-            exclude_dirs = [d.strip() for d in env_excludes.split(",")]
-        else:
-            exclude_dirs = [".git", "__pycache__", ".venv", "node_modules", ".agent", "agent.egg-info", "static", ".langgraph_api"]
+        exclude_dirs = get_exclude_dirs()
     
-    root_dir = os.path.abspath(root_dir)
-    tree = [f"Project Root: {root_dir}"]
-    for root, dirs, files in os.walk(root_dir):
-        dirs[:] = [d for d in dirs if d not in exclude_dirs]
-        level = root.replace(root_dir, '').count(os.sep)
-        indent = '  ' * level
-        tree.append(f"{indent}{os.path.basename(root) or root}/")
-        sub_indent = '  ' * (level + 1)
-        for f in files:
-            if not f.startswith('.'):
-                tree.append(f"{sub_indent}{f}")
-    
-    return "\n".join(tree)
+    return "\n".join(iter_project_tree(root_dir, exclude_dirs))
 
-def read_project_guidelines(root_dir: str) -> str:
-    """Find and read key documentation/guideline files, including AI-specific rules and skills. / 查找并读取关键文档/规范文件，包括 AI 特定的规则和技能文档。."""
+def get_exclude_dirs() -> List[str]:
+    """Return the directory names skipped when scanning a project (``PROJECT_EXCLUDES`` or the defaults)."""
+    env_excludes = os.getenv("PROJECT_EXCLUDES", "")
+    if env_excludes:
+        return [d.strip() for d in env_excludes.split(",")]
+    return [".git", "__pycache__", ".venv", "node_modules", ".agent", "agent.egg-info", "static", ".langgraph_api"]
+
+NO_GUIDELINES = "No project-specific guidelines found. / 未发现特定于项目的指导规范。"
+
+def find_guideline_files(root_dir: str) -> List[str]:
+    """List the Markdown guideline files (README, ``ai*`` rules, ``.agent/**``) in a stable order. / 按稳定顺序列出 Markdown 规范文件。."""
     root_dir = os.path.abspath(root_dir)
-    context = []
-    
     standard_files = [
         "README.md", 
         "CONTRIBUTING.md", 
@@ -50,47 +60,52 @@ def read_project_guidelines(root_dir: str) -> str:
     ]
     
     to_process = []
-    try:
-        items = os.listdir(root_dir)
-        for item in items:
-            item_path = os.path.join(root_dir, item)
-            item_lower = item.lower()
-            if item in standard_files:
-                to_process.append(item_path)
-            elif item_lower.startswith("ai"):
-                to_process.append(item_path)
-            elif item == ".agent":
-                to_process.append(item_path)
-    except Exception as e:
-        return f"Error scanning project root: {str(e)}"
+    for item in sorted(os.listdir(root_dir)):
+        item_lower = item.lower()
+        if item in standard_files or item_lower.startswith("ai") or item == ".agent":
+            to_process.append(os.path.join(root_dir, item))
 
-    def read_md_files_recursively(path):
+    found: List[str] = []
+    for path in to_process:
         if os.path.isfile(path):
             if path.lower().endswith(".md"):
-                try:
-                    with open(path, encoding="utf-8") as f:
-                        rel_path = os.path.relpath(path, root_dir)
-                        content = f.read()
-                        context.append(f"--- CONTENT OF {rel_path} ---\n{content}")
-                except Exception as e:
-                    context.append(f"Error reading {path}: {str(e)}")
+                found.append(path)
         elif os.path.isdir(path):
             for root, dirs, files in os.walk(path):
+                dirs.sort()
                 if any(x in root for x in [".git", "node_modules", "venv", "__pycache__"]):
                     continue
-                for f in files:
-                    if f.lower().endswith(".md"):
-                        file_full_path = os.path.join(root, f)
-                        read_md_files_recursively(file_full_path)
+                found.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".md"))
+    return found
 
-    for path in to_process:
-        read_md_files_recursively(path)
+def read_project_guidelines(root_dir: str) -> str:
+    """Find and read key documentation/guideline files, including AI-specific rules and skills. / 查找并读取关键文档/规范文件，包括 AI 特定的规则和技能文档。."""
+    root_dir = os.path.abspath(root_dir)
+    try:
+        paths = find_guideline_files(root_dir)
+    except Exception as e:
+        return f"Error scanning project root: {str(e)}"
+
+    context = []
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as f:
+                rel_path = os.path.relpath(path, root_dir)
+                content = f.read()
+                context.append(f"--- CONTENT OF {rel_path} ---\n{content}")
+        except Exception as e:
+            context.append(f"Error reading {path}: {str(e)}")
                     
-    return "\n\n".join(context) if context else "No project-specific guidelines found. / 未发现特定于项目的指导规范。"
+    return "\n\n".join(context) if context else NO_GUIDELINES
 
 def save_file_sync(file_path: str, clean_code: str):
     """Write the generated code to the local filesystem. / 将生成的代码保存到本地文件系统。."""
+    save_chunks_sync(file_path, [clean_code])
+
+def save_chunks_sync(file_path: str, chunks: Iterable[str]) -> None:
+    """Write code to the local filesystem chunk by chunk, as it is produced. / 边生成边分块写入代码文件。."""
     abs_path = os.path.abspath(file_path)
     os.makedirs(os.path.dirname(abs_path), exist_ok=True)
     with open(abs_path, "w", encoding="utf-8") as f:
-        f.write(clean_code)
+        for chunk in chunks:
+            f.write(chunk)
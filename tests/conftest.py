@@ -1,6 +1,30 @@
 import pytest
 
+from agent import (
+    blob_store,
+    design_cache,
+    guidelines,
+    llm_cache,
+    project_index,
+    snippet_index,
+)
+
 
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch):
+    """Keep every on-disk cache in a per-test directory instead of ~/.cache/agent."""
+    cache_dir = tmp_path_factory.mktemp("agent-cache")
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(cache_dir))
+    # Shared stores and indexes remember the directory they were opened in.
+    monkeypatch.setattr(blob_store, "_blob_store", None)
+    monkeypatch.setattr(llm_cache, "_response_cache", None)
+    monkeypatch.setattr(design_cache, "_design_cache", None)
+    monkeypatch.setattr(guidelines, "guideline_cache", guidelines.GuidelineCache(str(cache_dir / "guidelines")))
+    monkeypatch.setattr(project_index, "_indexes", {})
+    monkeypatch.setattr(snippet_index, "_indexes", {})
+    return cache_dir
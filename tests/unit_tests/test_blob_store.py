@@ -0,0 +1,49 @@
+import pytest
+
+from agent.blob_store import BlobNotFoundError, BlobStore, is_blob_ref
+
+
+def test_large_text_is_stored_once_and_resolved(tmp_path) -> None:
+    store = BlobStore(str(tmp_path), min_bytes=16)
+    text = "project map line\n" * 100
+    ref = store.put(text)
+    assert is_blob_ref(ref) and len(ref) < 80
+    assert store.put(text) == ref
+    assert store.stats()["dedup_hits"] == 1
+    assert store.get(ref) == text
+    # A fresh process (new store) resolves the reference from disk and dedups against it.
+    other = BlobStore(str(tmp_path), min_bytes=16)
+    assert other.get(ref) == text
+    assert other.put(text) == ref and other.stats()["dedup_hits"] == 1
+
+
+def test_small_text_and_plain_values_stay_inline() -> None:
+    store = BlobStore(min_bytes=1024)
+    assert store.put("short") == "short"
+    assert store.get("not a reference") == "not a reference"
+
+
+def test_memory_copy_is_bounded(tmp_path) -> None:
+    store = BlobStore(str(tmp_path), min_bytes=1, memory_bytes=250)
+    refs = [store.put(str(i) * 100) for i in range(5)]
+    assert store.stats()["memory_bytes"] <= 250
+    assert [store.get(ref) for ref in refs] == [str(i) * 100 for i in range(5)]
+
+
+def test_memory_only_store_spills_instead_of_losing_blobs() -> None:
+    store = BlobStore(min_bytes=1, memory_bytes=250)
+    refs = [store.put(str(i) * 100) for i in range(5)]
+    assert store.stats()["memory_bytes"] <= 250 and store.stats()["spilled"] == 3
+    assert [store.get(ref) for ref in refs] == [str(i) * 100 for i in range(5)]
+
+
+def test_collect_deletes_unreferenced_blobs(tmp_path) -> None:
+    store = BlobStore(str(tmp_path), min_bytes=1)
+    live, dead = store.put("a" * 100), store.put("b" * 100)
+    assert store.collect([live], min_age=60) == 0  # still within the grace period
+    assert store.collect([live], min_age=0) == 1
+    assert store.get(live) == "a" * 100
+    with pytest.raises(BlobNotFoundError, match="garbage-collected"):
+        BlobStore(str(tmp_path)).get(dead)
+    with pytest.raises(KeyError):
+        store.get(dead)
@@ -0,0 +1,89 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent import blob_store
+from agent.blob_store import BlobNotFoundError, BlobStore, resolve_blob
+from agent.checkpointing import factory_runner
+from agent.nodes import developer, pm, qa
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def fake_models(monkeypatch: pytest.MonkeyPatch) -> dict:
+    calls = {"pm": 0, "developer": 0, "qa": 0}
+
+    async def fake_pm(messages, *, node, **kwargs):
+        calls["pm"] += 1
+        return AIMessage(content="Print hello.\nFILE_PATH: hello.py")
+
+    async def flaky_developer(messages, *, node, **kwargs):
+        calls["developer"] += 1
+        if calls["developer"] == 1:
+            raise RuntimeError("provider error")
+        return AIMessage(content="print('hello')")
+
+    async def fake_qa(messages, *, node, **kwargs):
+        calls["qa"] += 1
+        return AIMessage(content="APPROVED")
+
+    monkeypatch.setattr(pm, "ainvoke_model", fake_pm)
+    monkeypatch.setattr(developer, "ainvoke_model", flaky_developer)
+    monkeypatch.setattr(qa, "ainvoke_model", fake_qa)
+    return calls
+
+
+async def test_resume_reruns_only_the_failed_step(fake_models: dict, tmp_path) -> None:
+    project = tmp_path / "project"
+    project.mkdir()
+    inputs = {"messages": [HumanMessage(content="hello script")], "iteration_count": 0, "project_root": str(project)}
+
+    async with factory_runner(str(tmp_path / "ckpt.sqlite3")) as runner:
+        with pytest.raises(RuntimeError):
+            await runner.run(inputs, thread_id="t1")
+        assert (await runner.status("t1"))["next"] == ["developer_node"]
+
+        final = await runner.resume("t1")
+        assert final["status"] == "file_saved"
+        assert fake_models == {"pm": 1, "developer": 2, "qa": 1}
+        assert (project / "hello.py").read_text() == "print('hello')"
+
+        # Finished threads resume to their final state without running anything.
+        assert (await runner.resume("t1"))["status"] == "file_saved"
+        with pytest.raises(KeyError):
+            await runner.resume("unknown")
+
+
+async def test_prune_keeps_latest_checkpoints(fake_models: dict, tmp_path) -> None:
+    project = tmp_path / "project"
+    project.mkdir()
+    async with factory_runner(str(tmp_path / "ckpt.sqlite3"), keep_last=2, keep_threads=1) as runner:
+        fake_models["developer"] = 1  # no failure
+        for thread in ("a", "b"):
+            inputs = {"messages": [HumanMessage(content="x")], "iteration_count": 0, "project_root": str(project)}
+            await runner.run(inputs, thread_id=thread)
+        rows = await (await runner.saver.conn.execute("SELECT thread_id, COUNT(*) FROM checkpoints GROUP BY thread_id")).fetchall()
+        assert [tuple(r) for r in rows] == [("b", 2)]
+        assert (await runner.resume("b"))["status"] == "file_saved"
+
+
+async def test_prune_collects_blobs_of_dropped_checkpoints(
+    fake_models: dict, tmp_path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    store = BlobStore(str(tmp_path / "blobs"), min_bytes=1)
+    monkeypatch.setattr(blob_store, "_blob_store", store)
+    monkeypatch.setenv("BLOB_GC_GRACE", "0")
+    fake_models["developer"] = 1  # no failure
+    async with factory_runner(str(tmp_path / "ckpt.sqlite3"), keep_last=2, keep_threads=1) as runner:
+        final = {}
+        for thread in ("a", "b"):
+            # Each thread analyzes its own project, so their project maps differ.
+            project = tmp_path / thread
+            project.mkdir()
+            inputs = {"messages": [HumanMessage(content=thread)], "iteration_count": 0, "project_root": str(project)}
+            final[thread] = await runner.run(inputs, thread)
+        assert final["b"]["code"] == "print('hello')"  # outputs stay plain text
+        assert store.stats()["collected"] > 0
+        with pytest.raises(BlobNotFoundError):
+            store.get(final["a"]["project_map"])
+        assert resolve_blob(final["b"]["project_map"]).startswith("Project Root:")
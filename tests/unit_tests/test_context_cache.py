@@ -0,0 +1,112 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+from agent import context_cache, factory_model
+from agent.instrumentation import instrument_node, metrics, record_llm_call
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(context_cache, "registry", context_cache.CachedContentRegistry())
+    monkeypatch.setenv("CONTEXT_CACHE_MIN_TOKENS", "10")
+
+
+async def test_gemini_prefix_is_cached_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    created = []
+
+    def fake_create(model_name: str, text: str, ttl: int) -> str:
+        created.append(model_name)
+        return f"cachedContents/{len(created)}"
+
+    monkeypatch.setattr(context_cache, "_create_gemini_cache", fake_create)
+    prefix = "shared project context " * 20
+    handles = await asyncio.gather(
+        *(context_cache.get_cached_content("gemini", "gemini-2.0-flash", prefix) for _ in range(5))
+    )
+    assert handles == ["cachedContents/1"] * 5 and created == ["gemini-2.0-flash"]
+
+    # Short prefixes, other providers and disabled caching get no handle.
+    assert await context_cache.get_cached_content("gemini", "gemini-2.0-flash", "short") is None
+    assert await context_cache.get_cached_content("deepseek", "deepseek-chat", prefix) is None
+    monkeypatch.setenv("CONTEXT_CACHE", "false")
+    assert await context_cache.get_cached_content("gemini", "gemini-2.0-flash", prefix) is None
+
+
+async def test_failures_are_remembered(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    def failing_create(model_name: str, text: str, ttl: int) -> str:
+        calls.append(1)
+        raise RuntimeError("quota")
+
+    monkeypatch.setattr(context_cache, "_create_gemini_cache", failing_create)
+    prefix = "shared project context " * 20
+    assert await context_cache.get_cached_content("gemini", "m", prefix) is None
+    assert await context_cache.get_cached_content("gemini", "m", prefix) is None
+    assert calls == [1]
+
+    context_cache.register_cached_content("gemini", "m", prefix, "cachedContents/manual")
+    assert await context_cache.get_cached_content("gemini", "m", prefix) == "cachedContents/manual"
+
+
+async def test_cache_read_tokens_are_reported_per_call() -> None:
+    metrics.reset()
+
+    async def node(state):
+        for cache_read in (0, 900):
+            response = AIMessage(
+                content="ok",
+                usage_metadata={
+                    "input_tokens": 1000,
+                    "output_tokens": 10,
+                    "total_tokens": 1010,
+                    "input_token_details": {"cache_read": cache_read},
+                },
+            )
+            record_llm_call(response, latency=0.1, ttft=0.05)
+        return {}
+
+    await instrument_node("developer_node", node)({})
+    record = metrics.records[-1]
+    assert record["cache_read_tokens"] == 900
+    assert [call["cache_read_tokens"] for call in record["calls"]] == [0, 900]
+    assert 'factory_llm_tokens_total{node="developer_node",kind="cache_read"} 900' in metrics.render_prometheus()
+
+
+class RecordingModel(BaseChatModel):
+    model: str = "gemini-test"
+    seen: List[Any] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.seen.append((messages, kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+
+async def test_ainvoke_model_sends_the_cached_prefix_by_handle(monkeypatch: pytest.MonkeyPatch) -> None:
+    llm = RecordingModel()
+    monkeypatch.setattr(factory_model, "model", llm)
+    monkeypatch.setattr(factory_model, "DEFAULT_MODEL", "gemini")
+    monkeypatch.setattr(context_cache, "_create_gemini_cache", lambda model_name, text, ttl: "cachedContents/7")
+    prefix = SystemMessage(content="shared project context " * 20)
+
+    await factory_model.ainvoke_model([prefix, HumanMessage(content="task")], node="pm_node", use_cache=False)
+    messages, kwargs = llm.seen[-1]
+    assert kwargs["cached_content"] == "cachedContents/7"
+    assert [m.content for m in messages] == ["task"]
+
+    # Short system prompts are sent inline.
+    await factory_model.ainvoke_model([SystemMessage(content="short"), HumanMessage(content="task")], node="pm_node", use_cache=False)
+    messages, kwargs = llm.seen[-1]
+    assert "cached_content" not in kwargs and len(messages) == 2
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+from langchain_core.tools import tool
+
+from agent import design_cache as design_cache_module
+from agent.design_cache import DesignCache, normalize_design_url
+from agent.disk_cache import DiskCache
+from agent.tool_executor import execute_tool_calls
+
+pytestmark = pytest.mark.anyio
+
+
+def test_figma_urls_normalize_to_file_key_and_node_id() -> None:
+    a = normalize_design_url("https://www.figma.com/design/AbC123/My-Page?node-id=1-2&t=xyz")
+    b = normalize_design_url("figma.com/file/AbC123/Renamed?node-id=1%3A2")
+    assert a == b
+    assert (a.file_key, a.node_id) == ("AbC123", "1:2")
+    assert normalize_design_url("https://Example.com/a/?b=1&t=2").url == "example.com/a?b=1"
+
+
+async def test_design_key_follows_the_file_version(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    versions = {"AbC123": "1"}
+
+    async def fake_version(file_key: str) -> str:
+        return versions[file_key]
+
+    monkeypatch.setattr(design_cache_module, "fetch_figma_version", fake_version)
+    cache = DesignCache(DiskCache(str(tmp_path / "d.sqlite3")))
+    cache.version_ttl = 0
+    url = "https://www.figma.com/design/AbC123/x?node-id=1-2"
+    key = await cache.design_key([url])
+    await cache.aput_summary(key, "blue buttons")
+    assert await cache.aget_summary(await cache.design_key([url + "&t=1"])) == "blue buttons"
+
+    versions["AbC123"] = "2"
+    assert await cache.aget_summary(await cache.design_key([url])) is None
+
+
+async def test_tool_results_are_served_from_the_cache(tmp_path) -> None:
+    calls = []
+
+    @tool
+    async def get_file(file_key: str) -> str:
+        """Fetch a Figma file."""
+        calls.append(file_key)
+        return f"nodes of {file_key}"
+
+    cache = DesignCache(DiskCache(str(tmp_path / "d.sqlite3")))
+    tool_calls = [{"name": "get_file", "args": {"file_key": "k"}, "id": "1", "type": "tool_call"}]
+    for _ in range(2):
+        messages = await execute_tool_calls(tool_calls, [get_file], cache=cache, design_key="design")
+        assert messages[0].content == "nodes of k"
+    assert calls == ["k"]
+
+
+async def test_database_access_runs_off_the_loop(tmp_path) -> None:
+    store = DiskCache(str(tmp_path / "d.sqlite3"), memory_entries=1)
+    cache = DesignCache(store)
+    threads = []
+    get, set_ = store.get, store.set
+    store.get = lambda key: threads.append(threading.get_ident()) or get(key)  # type: ignore[method-assign]
+    store.set = lambda key, value: threads.append(threading.get_ident()) or set_(key, value)  # type: ignore[method-assign]
+
+    await cache.aput_tool_result("design", "get_file", {"file_key": "a"}, "nodes of a")
+    await cache.aput_summary("design", "blue buttons")  # pushes the tool result out of memory
+    assert await cache.aget_tool_result("design", "get_file", {"file_key": "a"}) == "nodes of a"
+    assert len(threads) == 3 and threading.get_ident() not in threads
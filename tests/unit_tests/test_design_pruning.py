@@ -0,0 +1,54 @@
+import json
+
+from agent.design_pruning import prune_design, prune_tool_result
+from agent.prompting import estimate_tokens
+
+
+def _frame(node_id: str, children: list, **extra: object) -> dict:
+    return {"id": node_id, "name": f"Frame {node_id}", "type": "FRAME", "children": children, **extra}
+
+
+DOCUMENT = {
+    "name": "App",
+    "lastModified": "2024-01-01T00:00:00Z",
+    "document": _frame("0:1", [
+        _frame("1:2", [
+            {"id": "1:3", "type": "TEXT", "characters": "Sign in", "style": {"fontSize": 14.0004},
+             "relativeTransform": [[1, 0, 0], [0, 1, 0]], "exportSettings": []},
+            {"id": "1:4", "type": "VECTOR", "fillGeometry": [{"path": "M0 0" * 500}],
+             "children": [{"id": "1:5", "type": "VECTOR"}]},
+            {"id": "1:6", "type": "RECTANGLE", "visible": False},
+        ], layoutMode="VERTICAL", itemSpacing=8, pluginData={"x": "y" * 1000}),
+        _frame("2:1", [{"id": "2:2", "type": "TEXT", "characters": "Other page"}]),
+    ]),
+}
+
+
+def test_prune_design_keeps_layout_text_and_drops_geometry_and_hidden_layers() -> None:
+    pruned = prune_design(DOCUMENT)
+    frame = pruned["document"]["children"][0]
+    assert frame["layoutMode"] == "VERTICAL" and "pluginData" not in frame
+    text, vector = frame["children"]
+    assert text == {"id": "1:3", "type": "TEXT", "characters": "Sign in", "style": {"fontSize": 14.0}}
+    assert vector == {"id": "1:4", "type": "VECTOR"}
+    assert pruned["lastModified"] == DOCUMENT["lastModified"]
+
+
+def test_prune_tool_result_focuses_on_the_requested_node_and_reports_sizes() -> None:
+    raw = json.dumps(DOCUMENT)
+    pruned, report = prune_tool_result(raw, ["1-2"], max_tokens=10_000)
+    data = json.loads(pruned)
+    assert data["id"] == "1:2"
+    assert "Other page" not in pruned
+    assert report.parsed and report.before_bytes == len(raw) and report.after_bytes == len(pruned)
+    assert report.after_bytes < report.before_bytes / 5
+
+
+def test_prune_tool_result_cuts_to_the_token_budget() -> None:
+    wide = _frame("0:1", [_frame(f"{i}:0", [_frame(f"{i}:{j}", []) for j in range(50)]) for i in range(50)])
+    pruned, report = prune_tool_result(json.dumps(wide), max_tokens=300)
+    assert estimate_tokens(pruned) <= 300
+    assert report.after_tokens < report.before_tokens
+
+    text, _ = prune_tool_result("plain text " * 1000, max_tokens=50)
+    assert text.endswith("...[truncated]") and estimate_tokens(text) <= 60
@@ -0,0 +1,102 @@
+import asyncio
+from typing import Any, Dict
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent import factory_model
+from agent.factory_model import ModelVariant
+from agent.graph import build_graph
+from agent.instrumentation import instrument_node, record_llm_call
+from agent.nodes import fanout
+
+pytestmark = pytest.mark.anyio
+
+
+def test_variants_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(factory_model, "DEFAULT_MODEL", "gemini")
+    assert fanout.get_fanout_variants(3) == [
+        ModelVariant("gemini", 0.0), ModelVariant("gemini", 0.3), ModelVariant("gemini", 0.6)
+    ]
+    monkeypatch.setenv("FANOUT_VARIANTS", "gemini:0, deepseek:0.4")
+    assert fanout.get_fanout_variants(3) == [ModelVariant("gemini", 0.0), ModelVariant("deepseek", 0.4)]
+
+
+def test_graph_wiring_follows_the_width() -> None:
+    assert {"developer_node", "qa_node"} <= set(build_graph(fanout_width=1).nodes)
+    nodes = set(build_graph(fanout_width=3).nodes)
+    assert "fanout_node" in nodes and "developer_node" not in nodes
+
+
+def _fake_nodes(monkeypatch: pytest.MonkeyPatch, latency: Dict[float, float], approved: set, cancelled: list) -> None:
+    async def developer_node(state: Any) -> Dict[str, Any]:
+        variant = factory_model._variant.get()
+        try:
+            await asyncio.sleep(latency[variant.temperature])
+        except asyncio.CancelledError:
+            cancelled.append(variant.temperature)
+            raise
+        response = AIMessage(content="code", usage_metadata={"input_tokens": 100, "output_tokens": 50, "total_tokens": 150})
+        record_llm_call(response, latency=0.01, ttft=0.01)
+        return {"code": f"code@{variant.temperature}", "messages": [response], "iteration_count": 1, "status": "code_written"}
+
+    async def qa_node(state: Any) -> Dict[str, Any]:
+        ok = state["code"] in approved
+        return {
+            "feedback": "Approved." if ok else f"fix {state['code']}",
+            "messages": [HumanMessage(content="QA")],
+            "last_reviewed_code": state["code"],
+            "status": "approved" if ok else "revision",
+        }
+
+    monkeypatch.setattr(fanout, "developer_node", developer_node)
+    monkeypatch.setattr(fanout, "qa_node", qa_node)
+    monkeypatch.setattr(factory_model, "DEFAULT_MODEL", "gemini")
+    monkeypatch.setenv("FANOUT_WIDTH", "3")
+
+
+async def test_first_approved_candidate_wins(monkeypatch: pytest.MonkeyPatch) -> None:
+    cancelled: list = []
+    _fake_nodes(monkeypatch, {0.0: 0.0, 0.3: 0.02, 0.6: 1.0}, {"code@0.3", "code@0.6"}, cancelled)
+    result = await fanout.fanout_node({"iteration_count": 0})  # type: ignore[typeddict-item]
+    assert result["code"] == "code@0.3" and result["status"] == "approved"
+    assert len(result["messages"]) == 2
+    await asyncio.sleep(0)
+    assert cancelled == [0.6]
+
+
+async def test_token_cap_stops_the_round(monkeypatch: pytest.MonkeyPatch) -> None:
+    cancelled: list = []
+    _fake_nodes(monkeypatch, {0.0: 0.0, 0.3: 1.0, 0.6: 1.0}, set(), cancelled)
+    monkeypatch.setenv("FANOUT_MAX_TOKENS", "100")
+    result = await instrument_node("fanout_node", fanout.fanout_node)({"iteration_count": 0})
+    assert result["status"] == "revision" and result["feedback"] == "fix code@0.0"
+    assert sorted(cancelled) == [0.3, 0.6]
+
+
+async def test_token_cap_is_checked_when_a_candidate_fails(monkeypatch: pytest.MonkeyPatch) -> None:
+    cancelled: list = []
+    _fake_nodes(monkeypatch, {0.0: 0.0, 0.3: 1.0, 0.6: 1.0}, set(), cancelled)
+    monkeypatch.setenv("FANOUT_MAX_TOKENS", "100")
+
+    async def failing_qa(state: Any) -> Dict[str, Any]:
+        raise RuntimeError("qa error")
+
+    monkeypatch.setattr(fanout, "qa_node", failing_qa)
+    with pytest.raises(RuntimeError, match="qa error"):
+        await instrument_node("fanout_node", fanout.fanout_node)({"iteration_count": 0})
+    assert sorted(cancelled) == [0.3, 0.6]
+
+
+async def test_variant_routes_model_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    requested = []
+
+    def fake_get_model(provider: str, temperature: float = 0) -> Any:
+        requested.append((provider, temperature))
+        return GenericFakeChatModel(messages=iter([AIMessage(content="ok")]))
+
+    monkeypatch.setattr(factory_model, "get_model", fake_get_model)
+    with factory_model.use_model_variant(ModelVariant("deepseek", 0.4)):
+        response = await factory_model.ainvoke_model([HumanMessage(content="hi")], node="developer_node", use_cache=False)
+    assert response.content == "ok" and set(requested) == {("deepseek", 0.4)}
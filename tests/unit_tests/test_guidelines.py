@@ -0,0 +1,42 @@
+from agent.guidelines import GuidelineCache, compact_guidelines
+
+
+def test_compact_guidelines_dedupes_sections_and_whitespace() -> None:
+    raw = (
+        "--- CONTENT OF README.md ---\n"
+        "# Style\n\nUse   snake_case.   \n\n\n\nNo globals.\n\n"
+        "## Example\n```python\nx  =  1\n```\n"
+        "--- CONTENT OF ai_rules.md ---\n"
+        "# Style\nUse snake_case.\n\nNo   globals.\n"
+        "# Tests\nAlways add tests.\n"
+    )
+    assert compact_guidelines(raw) == (
+        "--- CONTENT OF README.md ---\n\n"
+        "# Style\n\nUse snake_case.\n\nNo globals.\n\n## Example\n```python\nx  =  1\n```\n\n"
+        "--- CONTENT OF ai_rules.md ---\n\n"
+        "# Tests\nAlways add tests."
+    )
+
+
+def test_guideline_cache_keys_on_file_content(tmp_path) -> None:
+    root = tmp_path / "proj"
+    (root / ".agent" / "skills").mkdir(parents=True)
+    (root / "README.md").write_text("# Readme\nhello")
+    (root / ".agent" / "skills" / "react.md").write_text("# React\nuse hooks")
+    (root / "notes.md").write_text("ignored")
+
+    cache = GuidelineCache(cache_dir=str(tmp_path / "cache"))
+    first = cache.get(str(root))
+    assert "--- CONTENT OF .agent/skills/react.md ---" in first.raw
+    assert "ignored" not in first.raw
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # A new cache instance is served from disk.
+    other = GuidelineCache(cache_dir=str(tmp_path / "cache"))
+    assert other.get(str(root)) == first
+    assert (other.hits, other.misses) == (1, 0)
+
+    (root / "README.md").write_text("# Readme\nchanged")
+    changed = cache.get(str(root))
+    assert changed.key != first.key
+    assert "changed" in changed.compact
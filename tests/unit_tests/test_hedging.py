@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from agent.hedging import NodePolicy, hedge_stats, run_hedged
+
+pytestmark = pytest.mark.anyio
+
+
+def _fake(latencies: dict, cancelled: list, failing: set = frozenset()):
+    async def call(provider: str) -> str:
+        try:
+            await asyncio.sleep(latencies[provider])
+        except asyncio.CancelledError:
+            cancelled.append(provider)
+            raise
+        if provider in failing:
+            raise RuntimeError(f"{provider} down")
+        return provider
+
+    return call
+
+
+async def test_fast_primary_is_not_hedged() -> None:
+    hedge_stats.reset()
+    policy = NodePolicy(deadline=1, hedge_after=0.05, hedge_provider="ollama")
+    result, winner = await run_hedged("n", _fake({"gemini": 0.0, "ollama": 0.0}, []), "gemini", policy)
+    assert (result, winner) == ("gemini", "gemini")
+    assert hedge_stats.snapshot()["n"]["hedged"] == 0
+
+
+async def test_slow_primary_is_hedged_and_cancelled() -> None:
+    hedge_stats.reset()
+    cancelled: list = []
+    policy = NodePolicy(deadline=1, hedge_after=0.01, hedge_provider="ollama")
+    _, winner = await run_hedged("n", _fake({"gemini": 0.5, "ollama": 0.01}, cancelled), "gemini", policy)
+    assert winner == "ollama"
+    await asyncio.sleep(0)  # let the cancelled loser unwind
+    assert cancelled == ["gemini"]
+    stats = hedge_stats.snapshot()["n"]
+    assert stats["hedge_rate"] == 1.0
+    assert stats["wins"] == {"ollama": 1}
+
+
+async def test_failed_primary_fails_over_immediately() -> None:
+    policy = NodePolicy(deadline=None, hedge_after=10, hedge_provider="ollama")
+    call = _fake({"gemini": 0.0, "ollama": 0.0}, [], failing={"gemini"})
+    _, winner = await asyncio.wait_for(run_hedged("n", call, "gemini", policy), 1)
+    assert winner == "ollama"
+
+
+async def test_deadline_exceeded_raises_timeout() -> None:
+    hedge_stats.reset()
+    cancelled: list = []
+    policy = NodePolicy(deadline=0.02, hedge_after=None, hedge_provider=None)
+    with pytest.raises(TimeoutError):
+        await run_hedged("n", _fake({"gemini": 1}, cancelled), "gemini", policy)
+    await asyncio.sleep(0)
+    assert cancelled == ["gemini"]
+    assert hedge_stats.snapshot()["n"]["deadline_exceeded"] == 1
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent.instrumentation import (
+    MetricsRegistry,
+    flush_exports,
+    instrument_node,
+    metrics,
+    record_llm_call,
+    record_prompt_sections,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_instrument_node_records_sections_tokens_and_state(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    metrics.reset()
+    monkeypatch.setenv("METRICS_EXPORT", "jsonl,prometheus")
+    monkeypatch.setenv("METRICS_DIR", str(tmp_path))
+
+    async def node(state: dict) -> dict:
+        record_prompt_sections(project_map="abc", guidelines="é")
+        response = AIMessage(content="x", usage_metadata={"input_tokens": 10, "output_tokens": 4, "total_tokens": 14})
+        record_llm_call(response, latency=0.5, ttft=0.1)
+        return {"status": "done"}
+
+    wrapped = instrument_node("demo_node", node)
+    assert await wrapped({"project_map": "abc"}) == {"status": "done"}
+
+    record = metrics.records[-1]
+    assert record["node"] == "demo_node"
+    assert record["sections"] == {"project_map": 3, "guidelines": 2}
+    assert (record["prompt_tokens"], record["completion_tokens"]) == (10, 4)
+    assert record["ttft_ms"] == pytest.approx(100)
+    assert record["state_bytes"] > 0
+    assert record["status"] == "done"
+
+    text = metrics.render_prometheus()
+    assert 'factory_llm_tokens_total{node="demo_node",kind="prompt"} 10' in text
+    assert 'factory_prompt_section_bytes_total{node="demo_node",section="project_map"} 3' in text
+
+    flush_exports(timeout=5)
+    exported = json.loads((tmp_path / "node_metrics.jsonl").read_text().splitlines()[-1])
+    assert exported["node"] == "demo_node" and exported["update_bytes"] > 0
+    assert "factory_state_bytes" in (tmp_path / "factory.prom").read_text()
+
+
+async def test_state_is_not_serialized_without_export(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("METRICS_EXPORT", raising=False)
+
+    async def node(state: dict) -> dict:
+        return {"status": "done"}
+
+    await instrument_node("quiet_node", node)({"project_map": "abc"})
+    record = metrics.records[-1]
+    assert record["state_bytes"] is None and record["update_bytes"] is None
+
+
+def test_recording_outside_a_node_is_a_no_op() -> None:
+    record_prompt_sections(project_map="abc")
+    registry = MetricsRegistry()
+    assert registry.summary() == {}
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_openai import ChatOpenAI
+
+from agent.disk_cache import DiskCache
+from agent.llm_cache import (
+    ResponseCache,
+    cache_allowed,
+    get_response_cache,
+    make_cache_key,
+)
+
+
+def test_disk_cache_ttl_and_size_eviction(tmp_path) -> None:
+    cache = DiskCache(str(tmp_path / "c.sqlite3"), ttl=60, max_bytes=10, memory_entries=1)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    assert cache.get("a") == "12345"  # served from SQLite, "b" is in memory
+    cache.set("c", "12345")  # over 10 bytes: least recently accessed ("b") goes
+    assert cache.get("b") is None
+    assert cache.get("c") == "12345"
+
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.get("c") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_disk_cache_persists_across_instances(tmp_path) -> None:
+    path = str(tmp_path / "c.sqlite3")
+    DiskCache(path).set("k", "v")
+    reopened = DiskCache(path)
+    assert reopened.get("k") == "v"
+    assert reopened.stats()["disk_bytes"] == 1
+
+
+def test_response_cache_key_and_roundtrip(tmp_path) -> None:
+    cold = ChatOpenAI(model="m", temperature=0, api_key="x")
+    warm = ChatOpenAI(model="m", temperature=0.7, api_key="x")
+    messages = [HumanMessage(content="hi")]
+    key = make_cache_key("qwen", cold, messages)
+    assert key == make_cache_key("qwen", cold, [HumanMessage(content="hi")])
+    assert key != make_cache_key("qwen", warm, messages)
+    assert key != make_cache_key("deepseek", cold, messages)
+    assert key != make_cache_key("qwen", cold, [HumanMessage(content="hello")])
+
+    cache = ResponseCache(DiskCache(str(tmp_path / "r.sqlite3")))
+    assert cache.get(key) is None
+    cache.put(key, AIMessage(content="cached", usage_metadata={"input_tokens": 1, "output_tokens": 2, "total_tokens": 3}))
+    hit = cache.get(key)
+    assert isinstance(hit, AIMessage)
+    assert hit.content == "cached"
+
+
+def test_cache_policy(monkeypatch) -> None:
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    monkeypatch.delenv("LLM_CACHE_BYPASS_NODES", raising=False)
+    assert get_response_cache() is None  # opt-in
+    assert cache_allowed("qa_node", 0) and cache_allowed("pm_node", None)
+    assert not cache_allowed("developer_node", 0)
+    assert not cache_allowed("qa_node", 0.4)
+    monkeypatch.setenv("LLM_CACHE_BYPASS_NODES", "")
+    assert cache_allowed("developer_node", 0)
+
+    model = ChatOpenAI(model="m", temperature=0, api_key="x")
+    messages = [HumanMessage(content="hi")]
+    assert make_cache_key("qwen", model, messages, temperature=0.3) != make_cache_key("qwen", model, messages)
+
+
+def test_memory_hits_keep_entries_hot(tmp_path) -> None:
+    cache = DiskCache(str(tmp_path / "c.sqlite3"), max_bytes=10, memory_entries=2)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    assert cache.peek("a") == "12345"  # memory hit: "a" is now more recent than "b"
+    cache.set("c", "12345")  # over 10 bytes: the least recently used row is "b", not "a"
+    assert cache.get("a") == "12345"
+    assert cache.get("b") is None
+
+
+@pytest.mark.anyio
+async def test_async_access_runs_off_the_loop(tmp_path) -> None:
+    cache = ResponseCache(DiskCache(str(tmp_path / "r.sqlite3"), memory_entries=1))
+    await cache.aput("k1", AIMessage(content="one"))
+    await cache.aput("k2", AIMessage(content="two"))  # pushes "k1" out of memory
+    hit = await cache.aget("k1")
+    assert hit is not None and hit.content == "one"
+    assert await cache.aget("missing") is None
@@ -0,0 +1,48 @@
+from agent.map_ranking import bm25_rank, parse_tree, path_tokens, rank_project_map
+from agent.prompting import estimate_tokens
+from agent.utils import get_project_structure
+
+
+def _make_project(root, modules: int = 60) -> None:
+    for i in range(modules):
+        pkg = root / "src" / f"module{i}"
+        pkg.mkdir(parents=True)
+        for name in ("models.py", "views.py", "helpers.py"):
+            (pkg / name).write_text("")
+    (root / "src" / "billing").mkdir()
+    (root / "src" / "billing" / "invoiceService.ts").write_text("")
+    (root / "README.md").write_text("")
+
+
+def test_path_tokens_and_bm25() -> None:
+    assert path_tokens("src/billing/invoiceService.ts") == ["src", "billing", "invoice", "service", "ts"]
+    ranked = bm25_rank(
+        {"a/invoice.py": ["invoice", "py"], "a/user.py": ["user", "py"], "b/": ["b"]},
+        path_tokens("Fix the invoice total"),
+    )
+    assert ranked[0][0] == "a/invoice.py" and len(ranked) == 1
+
+
+def test_parse_tree_round_trip(tmp_path) -> None:
+    _make_project(tmp_path, modules=2)
+    header, root = parse_tree(get_project_structure(str(tmp_path)))
+    assert header[0].startswith("Project Root:")
+    assert root is not None and root.total_files == 8
+    assert [d.path for d in root.dirs[0].dirs] == ["src/billing/", "src/module0/", "src/module1/"]
+
+
+def test_rank_project_map_keeps_relevant_paths_within_budget(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("PROJECT_MAX_MAP_CHARS", "1000000")
+    _make_project(tmp_path)
+    full = get_project_structure(str(tmp_path))
+    assert estimate_tokens(full) > 300
+
+    ranked = rank_project_map(full, "Add a discount field to the invoice service", max_tokens=300)
+    assert estimate_tokens(ranked) <= 300
+    assert "    billing/\n      invoiceService.ts" in ranked
+    assert "module0/ (3 files)" in ranked
+    assert "more directories" in ranked
+
+    # Maps that already fit are left alone.
+    assert rank_project_map(full, "anything", max_tokens=0) == full
+    assert rank_project_map(full, "anything", max_tokens=10**6) == full
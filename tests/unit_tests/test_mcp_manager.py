@@ -0,0 +1,241 @@
+import asyncio
+import sys
+import time
+
+import anyio
+import pytest
+from mcp import StdioServerParameters
+
+from agent.mcp_manager import MCPManager, MCPServer, RequestNotSentError
+
+pytestmark = pytest.mark.anyio
+
+ECHO_SERVER = (
+    "import asyncio, os, sys\n"
+    "from mcp.server.fastmcp import FastMCP\n"
+    "with open(sys.argv[1], 'a') as f:\n"
+    "    f.write(f'{os.getpid()}\\n')\n"
+    "app = FastMCP('echo')\n"
+    "@app.tool()\n"
+    "async def echo(text: str, delay: float = 0) -> str:\n"
+    "    await asyncio.sleep(delay)\n"
+    "    return text\n"
+    "@app.tool()\n"
+    "def crash() -> str:\n"
+    "    os._exit(1)\n"
+    "app.run()\n"
+)
+
+
+@pytest.fixture
+def servers(monkeypatch: pytest.MonkeyPatch, tmp_path) -> str:
+    pids = tmp_path / "pids"
+    script = tmp_path / "echo_server.py"
+    script.write_text(ECHO_SERVER)
+    hang = tmp_path / "hang.py"
+    hang.write_text("import time\ntime.sleep(30)\n")
+    monkeypatch.setenv("MCP_SERVERS", "echo,hang,broken")
+    monkeypatch.setenv("MCP_SERVER_ECHO_CMD", f"{sys.executable} {script} {pids}")
+    monkeypatch.setenv("MCP_SERVER_ECHO_MATCH", "echo.example.com")
+    monkeypatch.setenv("MCP_SERVER_HANG_CMD", f"{sys.executable} {hang}")
+    monkeypatch.setenv("MCP_SERVER_HANG_TIMEOUT", "0.5")
+    monkeypatch.setenv("MCP_SERVER_BROKEN_CMD", "/nonexistent/mcp-server")
+    monkeypatch.setenv("MCP_STARTUP_TIMEOUT", "20")
+    monkeypatch.setenv("MCP_POOL_SIZE", "2")
+    return str(pids)
+
+
+def _text(result: object) -> object:
+    # Newer adapters return content blocks instead of a plain string.
+    return result[0]["text"] if isinstance(result, list) else result
+
+
+def _started(pids: str) -> int:
+    with open(pids) as f:
+        return len(f.read().split())
+
+
+async def test_only_matching_servers_start(servers: str) -> None:
+    manager = MCPManager()
+    try:
+        tools = await manager.get_tools_for(["https://echo.example.com/page"])
+        assert sorted(t.name for t in tools) == ["crash", "echo"]
+        status = manager.server_status()
+        assert status["echo"]["state"] == "ready"
+        assert status["echo"]["startup_ms"] > 0
+        assert status["hang"]["state"] == status["broken"]["state"] == "stopped"
+    finally:
+        await manager.close_tools()
+
+
+async def test_failed_and_hanging_servers_do_not_block_others(servers: str) -> None:
+    manager = MCPManager()
+    try:
+        start = time.perf_counter()
+        await manager.initialize_tools()
+        elapsed = time.perf_counter() - start
+        status = manager.server_status()
+        assert status["echo"]["state"] == "ready"
+        assert status["hang"]["state"] == "timeout"
+        assert status["broken"]["state"] == "failed"
+        assert status["broken"]["error"]
+        assert sorted(t.name for t in manager.get_tools()) == ["crash", "echo"]
+        # Servers start concurrently, so the hang costs one timeout, not a sum.
+        assert elapsed < 15
+    finally:
+        await manager.close_tools()
+
+
+async def test_concurrent_runs_share_one_pool(servers: str) -> None:
+    manager = MCPManager()
+    try:
+        results = await asyncio.gather(*(manager.get_tools_for(["echo.example.com"]) for _ in range(5)))
+        assert _started(servers) == 2
+        echo = next(t for t in results[0] if t.name == "echo")
+        replies = await asyncio.gather(*(echo.ainvoke({"text": str(i), "delay": 0.1}) for i in range(6)))
+        assert [_text(r) for r in replies] == [str(i) for i in range(6)]
+        assert manager.server_status()["echo"]["calls"] == 6
+    finally:
+        await manager.close_tools()
+
+
+async def test_crashed_sessions_are_replaced(servers: str) -> None:
+    manager = MCPManager()
+    try:
+        tools = {t.name: t for t in await manager.get_tools_for(["echo.example.com"])}
+        with pytest.raises(Exception):
+            await asyncio.wait_for(tools["crash"].ainvoke({}), timeout=5)
+        await asyncio.sleep(0.5)
+        assert _text(await tools["echo"].ainvoke({"text": "back"})) == "back"
+        # The call used the surviving session; the replacement connects in the background.
+        for _ in range(100):
+            if manager.server_status()["echo"]["healthy_sessions"] == 2:
+                break
+            await asyncio.sleep(0.1)
+        assert manager.server_status()["echo"]["reconnects"] >= 1
+        assert manager.server_status()["echo"]["healthy_sessions"] == 2
+    finally:
+        await manager.close_tools()
+
+
+async def test_close_drains_in_flight_calls(servers: str) -> None:
+    manager = MCPManager()
+    tools = {t.name: t for t in await manager.get_tools_for(["echo.example.com"])}
+    call = asyncio.ensure_future(tools["echo"].ainvoke({"text": "done", "delay": 0.3}))
+    await asyncio.sleep(0.1)
+    await manager.close_tools(drain_timeout=5)
+    assert call.done() and _text(call.result()) == "done"
+    assert manager.server_status()["echo"]["state"] == "stopped"
+
+
+class FakeSession:
+    def __init__(self, errors: list) -> None:
+        self.errors = errors
+        self.calls = 0
+
+    async def call_tool(self, name: str, arguments: object = None) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class FakeConnection:
+    def __init__(self, ok: bool, errors: list | None = None) -> None:
+        self.alive = ok
+        self.in_flight = 0
+        self.timed_out = False
+        self.error = None if ok else "connection refused"
+        self.mcp_tools: list = []
+        self.session = FakeSession(errors if errors is not None else [])
+
+    async def stop(self) -> None:
+        self.alive = False
+
+
+def _fake_server(monkeypatch: pytest.MonkeyPatch, outcomes: list, connect_delay: float = 0) -> MCPServer:
+    server = MCPServer("fake", StdioServerParameters(command="true"), match=["fake"], timeout=1, pool_size=2)
+    server.reconnect_backoff = 0
+    errors: list = []
+    server.errors = errors  # type: ignore[attr-defined]
+
+    async def connect() -> FakeConnection:
+        if server.state == "ready":
+            await asyncio.sleep(connect_delay)
+        return FakeConnection(outcomes.pop(0) if outcomes else True, errors)
+
+    monkeypatch.setattr(server, "_connect", connect)
+    return server
+
+
+async def test_failed_reconnect_is_retried_and_refills_the_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    outcomes: list = []
+    server = _fake_server(monkeypatch, outcomes)
+    await server.start()
+    for connection in server._connections:
+        connection.alive = False
+
+    # Every session is dead and the first reconnect fails; the retry refills the pool.
+    outcomes += [False, False]
+    await server._lease()
+    assert server.status()["healthy_sessions"] == 2 and server.reconnects == 4
+
+
+async def test_empty_pool_recovers_on_the_next_call(monkeypatch: pytest.MonkeyPatch) -> None:
+    outcomes: list = []
+    server = _fake_server(monkeypatch, outcomes)
+    await server.start()
+    for connection in server._connections:
+        connection.alive = False
+
+    outcomes += [False] * 6
+    with pytest.raises(RuntimeError, match="no healthy sessions"):
+        await server._lease()
+    assert server.status()["sessions"] == 0
+    await server._lease()
+    assert server.status()["healthy_sessions"] == 2
+
+
+async def test_failed_start_is_retried_after_the_cooldown(monkeypatch: pytest.MonkeyPatch) -> None:
+    outcomes = [False, False]
+    server = _fake_server(monkeypatch, outcomes)
+    await server.start()
+    assert server.state == "failed" and server.failed_starts == 1
+
+    await server.start()  # still cooling down: no new attempt
+    assert server.state == "failed"
+    server._retry_at = 0
+    await server.start()
+    assert server.state == "ready" and server.failed_starts == 0
+
+
+async def test_lease_uses_a_live_session_while_the_pool_refills(monkeypatch: pytest.MonkeyPatch) -> None:
+    server = _fake_server(monkeypatch, [], connect_delay=0.5)
+    await server.start()
+    dead, live = server._connections
+    dead.alive = False
+
+    start = time.perf_counter()
+    leases = await asyncio.gather(*(server._lease() for _ in range(5)))
+    assert time.perf_counter() - start < 0.2
+    assert all(lease is live for lease in leases)
+    refill = server._refill_task
+    assert refill is not None and not refill.done()
+    await refill
+    assert server.status()["healthy_sessions"] == 2 and server.reconnects == 1
+    await server.stop()
+
+
+async def test_only_unsent_requests_are_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    server = _fake_server(monkeypatch, [])
+    await server.start()
+    server.errors.append(RequestNotSentError())  # type: ignore[attr-defined]
+    assert await server.call_tool("echo", {}) == "ok"
+
+    # Once the request may have been written, the tool must not run twice.
+    server.errors.append(anyio.ClosedResourceError())  # type: ignore[attr-defined]
+    calls = sum(c.session.calls for c in server._connections)
+    with pytest.raises(anyio.ClosedResourceError):
+        await server.call_tool("echo", {})
+    assert sum(c.session.calls for c in server._connections) == calls + 1
+    await server.stop()
@@ -0,0 +1,39 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.message_reducer import DRAFT_NAME, compact_messages
+
+
+def _draft(i: int, size: int = 1000) -> AIMessage:
+    return AIMessage(content=f"draft {i} " + "x" * size, name=DRAFT_NAME)
+
+
+def test_superseded_drafts_become_references() -> None:
+    messages = compact_messages([HumanMessage(content="build it")], [_draft(1)])
+    messages = compact_messages(messages, [AIMessage(content="REJECTED: bug")])
+    messages = compact_messages(messages, [_draft(2)])
+    assert messages[0].content == "build it"
+    assert messages[1].content.startswith("[superseded code draft: 1008 bytes")
+    assert messages[-1].content.startswith("draft 2")
+
+
+def test_window_keeps_the_request_and_stays_flat(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("STATE_MAX_MESSAGES", "4")
+    messages = [HumanMessage(content="build it")]
+    for i in range(50):
+        messages = compact_messages(messages, [_draft(i), AIMessage(content=f"REJECTED {i}")])
+        assert len(messages) <= 6
+    assert messages[0].content == "build it"
+    assert messages[1].content == "[96 earlier messages compacted]"
+    assert messages[-1].content == "REJECTED 49"
+    assert sum(1 for m in messages if m.content.startswith("draft")) == 1
+
+
+def test_byte_cap_truncates_then_drops_old_messages(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("STATE_MAX_MESSAGE_BYTES", "3000")
+    messages = [{"role": "user", "content": "build it"}]
+    for i in range(10):
+        messages = compact_messages(messages, [AIMessage(content=f"{i} " + "y" * 2000)])
+    assert messages[0]["content"] == "build it"
+    assert sum(len(str(m["content"] if isinstance(m, dict) else m.content)) for m in messages) <= 3000
+    assert messages[-1].content == "9 " + "y" * 2000
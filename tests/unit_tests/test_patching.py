@@ -0,0 +1,102 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent.nodes import developer, qa
+from agent.patching import (
+    Edit,
+    PatchError,
+    apply_edits,
+    code_diff,
+    parse_edits,
+    validate_revision,
+)
+
+CODE = "def add(a, b):\n    return a - b\n\n\ndef sub(a, b):\n    return a - b\n"
+
+
+def test_parse_and_apply_edits() -> None:
+    text = (
+        "Fix:\n<<<<<<< SEARCH\ndef add(a, b):\n    return a - b\n=======\n"
+        "def add(a, b):\n    return a + b\n>>>>>>> REPLACE\n"
+    )
+    edits = parse_edits(text)
+    assert edits == [Edit("def add(a, b):\n    return a - b\n", "def add(a, b):\n    return a + b\n")]
+    assert apply_edits(CODE, edits) == CODE.replace("a - b", "a + b", 1)
+
+
+def test_trailing_whitespace_is_tolerated() -> None:
+    code = "x = 1   \ny = 2\n"
+    assert apply_edits(code, [Edit("x = 1\ny = 2\n", "x = 3\ny = 2\n")]) == "x = 3\ny = 2\n"
+
+
+def test_missing_or_ambiguous_search_raises() -> None:
+    with pytest.raises(PatchError):
+        parse_edits("no blocks here")
+    with pytest.raises(PatchError):
+        apply_edits(CODE, [Edit("    return a - b\n", "    return 0\n")])
+    with pytest.raises(PatchError):
+        apply_edits(CODE, [Edit("def mul(a, b):\n", "")])
+
+
+def test_validate_rejects_broken_python() -> None:
+    validate_revision(CODE, CODE + "x = 1\n", "calc.py")
+    with pytest.raises(PatchError):
+        validate_revision(CODE, CODE + "def (:\n", "calc.py")
+    validate_revision(CODE, "def (:\n", "notes.txt")
+
+
+@pytest.mark.anyio
+async def test_developer_falls_back_to_full_rewrite(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("DEVELOPER_EDIT_MIN_BYTES", "0")
+    replies = [
+        AIMessage(content="<<<<<<< SEARCH\nnot in the file\n=======\nx\n>>>>>>> REPLACE"),
+        AIMessage(content="def add(a, b):\n    return a + b\n"),
+    ]
+    prompts = []
+
+    async def fake_model(messages, *, node, **kwargs):
+        prompts.append(messages[-1].content)
+        return replies.pop(0)
+
+    monkeypatch.setattr(developer, "ainvoke_model", fake_model)
+    state = {"code": CODE, "feedback": "add subtracts", "file_path": "calc.py", "iteration_count": 1}
+
+    result = await developer.developer_node(state)  # type: ignore[arg-type]
+    assert "search/replace" in prompts[0] and "Return ONLY the code content" in prompts[1]
+    assert result["code"] == "def add(a, b):\n    return a + b\n"
+    assert result["iteration_count"] == 2
+
+
+def test_code_diff_ratio() -> None:
+    new = CODE.replace("a - b", "a + b", 1)
+    diff, ratio = code_diff(CODE, new)
+    assert "-    return a - b\n+    return a + b\n" in diff
+    assert ratio == pytest.approx(1 / 6)
+    assert code_diff(CODE, CODE) == ("", 0.0)
+
+
+@pytest.mark.anyio
+async def test_qa_rereviews_only_the_delta(monkeypatch: pytest.MonkeyPatch) -> None:
+    prompts = []
+
+    async def fake_model(messages, *, node, **kwargs):
+        prompts.append("\n\n".join(m.content for m in messages))
+        return AIMessage(content="APPROVED")
+
+    monkeypatch.setattr(qa, "ainvoke_model", fake_model)
+    revised = CODE.replace("a - b", "a + b", 1)
+    state = {
+        "requirements": "add and sub",
+        "project_context": "GUIDELINES",
+        "code": revised,
+        "last_reviewed_code": CODE,
+        "feedback": "add subtracts",
+    }
+    result = await qa.qa_node(state)  # type: ignore[arg-type]
+    assert "add subtracts" in prompts[0] and "+    return a + b" in prompts[0]
+    assert "GUIDELINES" not in prompts[0]
+    assert result["status"] == "approved" and result["last_reviewed_code"] == revised
+
+    # A large rewrite gets a full review.
+    await qa.qa_node({**state, "code": "print('rewritten')\n"})  # type: ignore[arg-type]
+    assert "GUIDELINES" in prompts[1]
@@ -0,0 +1,132 @@
+import os
+
+from agent.project_index import ProjectIndex
+from agent.project_walker import IgnoreRules, iter_project_files, iter_project_tree
+
+
+def _make_tree(root) -> None:
+    (root / "src" / "pkg").mkdir(parents=True)
+    (root / "node_modules").mkdir()
+    (root / "README.md").write_text("readme")
+    (root / "src" / "main.py").write_text("print()")
+    (root / "src" / "pkg" / "mod.py").write_text("x = 1")
+    (root / "node_modules" / "dep.js").write_text("")
+
+
+def _scan(index: ProjectIndex, **kwargs) -> str:
+    return "\n".join(iter_project_tree(index.root_dir, ["node_modules"], index=index, **kwargs))
+
+
+def test_scan_renders_tree_and_caches_listings(tmp_path) -> None:
+    root = tmp_path / "proj"
+    root.mkdir()
+    _make_tree(root)
+    cache_path = str(tmp_path / "index.json")
+
+    index = ProjectIndex(str(root), cache_path=cache_path)
+    tree = _scan(index)
+    assert tree.splitlines() == [
+        f"Project Root: {root}",
+        "proj/",
+        "  README.md",
+        "  src/",
+        "    main.py",
+        "    pkg/",
+        "      mod.py",
+    ]
+    assert index.stats()["misses"] == 3
+    assert os.path.exists(cache_path)
+
+    # A fresh instance loads the persisted index and re-lists nothing.
+    reloaded = ProjectIndex(str(root), cache_path=cache_path)
+    assert _scan(reloaded) == tree
+    assert reloaded.stats()["hits"] == 3
+    assert reloaded.stats()["misses"] == 0
+
+
+def test_scan_relists_only_changed_directories(tmp_path) -> None:
+    root = tmp_path / "proj"
+    root.mkdir()
+    _make_tree(root)
+    index = ProjectIndex(str(root), cache_path=str(tmp_path / "index.json"))
+    _scan(index)
+
+    (root / "src" / "pkg" / "new.py").write_text("")
+    os.utime(root / "src" / "pkg", ns=(0, 10**18))
+    before = index.stats()
+    tree = _scan(index)
+    after = index.stats()
+
+    assert "      new.py" in tree.splitlines()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 2
+
+
+def test_invalidate_subtree_and_all(tmp_path) -> None:
+    root = tmp_path / "proj"
+    root.mkdir()
+    _make_tree(root)
+    cache_path = tmp_path / "index.json"
+    index = ProjectIndex(str(root), cache_path=str(cache_path))
+    list(iter_project_tree(str(root), index=index))
+
+    index.invalidate("src")
+    assert index.stats()["directories"] == 2  # root and node_modules remain
+
+    index.invalidate()
+    assert index.stats()["directories"] == 0
+    assert not cache_path.exists()
+
+
+def test_gitignore_rules() -> None:
+    rules = IgnoreRules().extend("", ["# comment", "*.log", "build/", "/dist", "!keep.log"])
+    rules = rules.extend("src", ["generated/**"])
+    assert rules.is_ignored("a/b/debug.log", False)
+    assert not rules.is_ignored("keep.log", False)
+    assert rules.is_ignored("pkg/build", True)
+    assert not rules.is_ignored("pkg/build", False)
+    assert rules.is_ignored("dist", True)
+    assert not rules.is_ignored("pkg/dist", True)
+    assert rules.is_ignored("src/generated/x.py", False)
+    assert not rules.is_ignored("generated/x.py", False)
+
+
+def test_walker_honours_ignore_files_and_caps(tmp_path) -> None:
+    root = tmp_path / "proj"
+    root.mkdir()
+    _make_tree(root)
+    (root / ".gitignore").write_text("*.md\n")
+    (root / "src" / ".ignore").write_text("pkg/\n")
+    (root / "many").mkdir()
+    for i in range(5):
+        (root / "many" / f"f{i}.txt").write_text("")
+    index = ProjectIndex(str(root), cache_path=str(tmp_path / "index.json"))
+
+    lines = _scan(index, max_dir_entries=2).splitlines()
+    assert "  README.md" not in lines
+    assert "    pkg/" not in lines
+    assert "    ... 3 files omitted" in lines
+
+    shallow = _scan(index, max_depth=0).splitlines()
+    assert shallow[-1] == "  ... 2 directories not expanded (max depth 0)"
+
+    truncated = _scan(index, max_chars=len(f"Project Root: {root}") + 10).splitlines()
+    assert truncated[-1].startswith("... project map truncated")
+
+
+def test_file_walker_applies_the_depth_and_entry_caps(tmp_path) -> None:
+    root = tmp_path / "proj"
+    root.mkdir()
+    _make_tree(root)
+    (root / "many").mkdir()
+    for i in range(5):
+        (root / "many" / f"f{i}.txt").write_text("")
+    index = ProjectIndex(str(root), cache_path=str(tmp_path / "index.json"))
+
+    def walk(**kwargs) -> list:
+        return list(iter_project_files(str(root), ["node_modules"], index=index, **kwargs))
+
+    assert os.path.join("src", "pkg", "mod.py") in walk()
+    assert walk(max_depth=0) == ["README.md"]
+    assert os.path.join("src", "pkg", "mod.py") not in walk(max_depth=1)
+    assert len([p for p in walk(max_dir_entries=2) if p.startswith("many")]) == 2
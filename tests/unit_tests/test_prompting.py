@@ -0,0 +1,107 @@
+import pytest
+
+from agent import factory_model
+from agent.factory_model import ModelVariant, use_model_variant
+from agent.instrumentation import instrument_node, metrics
+from agent.prompting import (
+    FACTORY_SYSTEM_PROMPT,
+    PRIORITY_DESIGN,
+    PRIORITY_GUIDELINES,
+    PRIORITY_MAP,
+    TRIM_MARKER,
+    Section,
+    assemble_prompt,
+    build_messages,
+    estimate_tokens,
+    project_context,
+    prompt_budget,
+    truncate_to_tokens,
+)
+
+
+def test_estimate_tokens_per_provider() -> None:
+    assert estimate_tokens("a" * 400, "gemini") == 100
+    assert estimate_tokens("a" * 350, "deepseek") == 100
+    assert estimate_tokens("设计稿" * 10, "deepseek") == 18
+    assert estimate_tokens("", "qwen") == 0
+
+
+def test_truncate_to_tokens() -> None:
+    assert truncate_to_tokens("short", 10, "gemini") == "short"
+    head = truncate_to_tokens("设计稿 design " * 100, 50, "deepseek")
+    assert estimate_tokens(head, "deepseek") <= 50 < estimate_tokens(head + "设计稿 design ", "deepseek")
+
+
+def test_prompt_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PROMPT_MAX_TOKENS", "0")
+    monkeypatch.setenv("OLLAMA_NUM_CTX", "4096")
+    assert prompt_budget("ollama") == 3072  # the reserve is capped at a quarter of the window
+    monkeypatch.setenv("PROMPT_OUTPUT_RESERVE", "500")
+    assert prompt_budget("ollama") == 3596
+    monkeypatch.setenv("PROMPT_MAX_TOKENS", "2000")
+    assert prompt_budget("gemini") == 2000
+
+
+def test_lower_priority_sections_are_trimmed_first() -> None:
+    sections = [
+        Section("project_map", "dir/\n" * 400, PRIORITY_MAP, "Map:"),
+        Section("guidelines", "rule\n" * 200, PRIORITY_GUIDELINES, "Rules:"),
+        Section("design_data", "", PRIORITY_DESIGN, "Design:"),
+        Section("requirements", "must do X\n" * 20, title="Requirements:"),
+        Section("instructions", "Return ONLY code."),
+    ]
+    prompt = assemble_prompt(sections, provider="gemini", budget=400)
+
+    assert "Design:" not in prompt.text
+    assert "must do X\n" * 20 in prompt.text and prompt.text.endswith("Return ONLY code.")
+    assert "rule\n" * 200 in prompt.text
+    assert prompt.trimmed.keys() == {"project_map"}
+    assert prompt.text.index("Map:") < prompt.text.index(TRIM_MARKER) < prompt.text.index("Rules:")
+    assert estimate_tokens(prompt.text, "gemini") <= 400
+
+
+@pytest.mark.anyio
+async def test_section_tokens_are_recorded() -> None:
+    metrics.reset()
+
+    async def node(state):
+        assemble_prompt([Section("requirements", "x" * 40), Section("project_map", "y" * 4000, PRIORITY_MAP)], provider="gemini", budget=50)
+        return {}
+
+    await instrument_node("pm_node", node)({})
+    record = metrics.records[-1]
+    assert record["section_tokens"] == {"requirements": 10, "project_map": 38}
+    assert record["trimmed_tokens"] == {"project_map": 962}
+    assert 'factory_prompt_trimmed_tokens_total{node="pm_node",section="project_map"} 962' in metrics.render_prometheus()
+
+
+def test_build_messages_shares_the_static_prefix() -> None:
+    context = project_context(guidelines="Use tabs.", design_data="Blue button.", project_map="src/\n  app.py")
+    pm = build_messages("You are a PM.", context, [Section("request", "Add a button")], provider="gemini")
+    dev = build_messages(
+        "You are a developer.",
+        list(reversed(context)),
+        [Section("requirements", "A blue button"), Section("feedback", "Wrong color")],
+        provider="gemini",
+    )
+    assert pm[0].content == dev[0].content
+    assert pm[0].content.startswith(FACTORY_SYSTEM_PROMPT)
+    system = pm[0].content
+    assert system.index("Use tabs.") < system.index("Blue button.") < system.index("src/")
+    assert dev[1].content.startswith("You are a developer.") and "Wrong color" in dev[1].content
+
+    # QA sends only the guidelines, which still form a prefix of the others.
+    qa = build_messages("You are QA.", project_context(guidelines="Use tabs."), [], provider="gemini")
+    assert system.startswith(qa[0].content)
+
+
+def test_budget_follows_the_active_model_variant(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(factory_model, "DEFAULT_MODEL", "gemini")
+    monkeypatch.setenv("PROMPT_MAX_TOKENS", "0")
+    monkeypatch.setenv("OLLAMA_NUM_CTX", "4096")
+    assert prompt_budget() == prompt_budget("gemini")
+    with use_model_variant(ModelVariant("ollama", 0.3)):
+        assert prompt_budget() == 3072
+        assert estimate_tokens("a" * 380) == 100
+        messages = build_messages("You are a developer.", project_context(project_map="x\n" * 20_000), [])
+    assert estimate_tokens(str(messages[0].content), "ollama") <= 3072
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+from agent.model_config import get_model
+from agent.rate_limit import ProviderLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_limiter_caps_in_flight_and_queues() -> None:
+    limiter = ProviderLimiter("test", max_in_flight=2)
+    active = 0
+    peak = 0
+    depths = []
+
+    async def call() -> None:
+        nonlocal active, peak
+        async with limiter:
+            active += 1
+            peak = max(peak, active)
+            depths.append(limiter.queue_depth)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+    assert max(depths) > 0
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["completed"] == 6
+
+
+async def test_limiter_spaces_requests_by_rate() -> None:
+    limiter = ProviderLimiter("test", rps=50)
+    start = time.monotonic()
+
+    async def call() -> None:
+        async with limiter:
+            pass
+
+    await asyncio.gather(*(call() for _ in range(5)))
+    assert time.monotonic() - start >= 4 / 50 * 0.9
+
+
+async def test_cancelled_waiter_does_not_leak_slot() -> None:
+    limiter = ProviderLimiter("test", max_in_flight=1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    limiter.release()
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def test_model_registry_reuses_clients(monkeypatch) -> None:
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "x")
+    assert get_model("deepseek") is get_model("deepseek", 0)
+    assert get_model("deepseek", 0.5) is not get_model("deepseek")
@@ -0,0 +1,101 @@
+import os
+
+from agent import snippet_index
+from agent.snippet_index import (
+    SnippetIndex,
+    chunk_source,
+    refresh_snippet_index,
+    retrieve_snippets,
+)
+
+PY_SOURCE = '''import os
+
+LIMIT = 3
+
+
+def parse_invoice(text):
+    return text.split(",")
+
+
+@cached
+def total_price(items):
+    return sum(items)
+'''
+
+TS_SOURCE = """import React from 'react';
+
+export function InvoiceTable(props) {
+  return null;
+}
+
+export const formatCurrency = (value) => value.toFixed(2);
+"""
+
+
+def test_chunk_source_by_function() -> None:
+    assert chunk_source("billing.py", PY_SOURCE) == [
+        (1, 5, "<module>"),
+        (6, 7, "parse_invoice"),
+        (10, 12, "total_price"),
+    ]
+    assert [name for _, _, name in chunk_source("table.tsx", TS_SOURCE)] == ["<module>", "InvoiceTable", "formatCurrency"]
+
+
+def test_index_updates_incrementally_and_persists(tmp_path) -> None:
+    root = tmp_path / "proj"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "billing.py").write_text(PY_SOURCE)
+    (root / "src" / "table.tsx").write_text(TS_SOURCE)
+    (root / "README.md").write_text("not code")
+    cache_path = str(tmp_path / "snippets.json")
+
+    index = SnippetIndex(str(root), cache_path=cache_path)
+    assert index.update() == 2
+    assert index.update() == 0
+    hits = index.search("Render the invoice table with currency formatting", k=2)
+    assert [(s.path, s.name) for s in hits] == [
+        (os.path.join("src", "table.tsx"), "formatCurrency"),
+        (os.path.join("src", "table.tsx"), "InvoiceTable"),
+    ]
+    assert "export function InvoiceTable(props) {" in index.render(hits)
+
+    # A fresh instance reuses the persisted entries; only the changed file is re-read.
+    (root / "src" / "billing.py").write_text(PY_SOURCE + "\n\ndef refund_invoice(invoice):\n    pass\n")
+    reloaded = SnippetIndex(str(root), cache_path=cache_path)
+    assert reloaded.stats()["files"] == 2
+    assert reloaded.update() == 1
+    assert reloaded.search("refund", k=1)[0].name == "refund_invoice"
+
+    (root / "src" / "table.tsx").unlink()
+    assert reloaded.update() == 1
+    assert all(s.path.endswith(".py") for s in reloaded.search("InvoiceTable"))
+
+
+def test_retrieve_snippets_respects_budget(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    root = tmp_path / "proj"
+    root.mkdir()
+    (root / "billing.py").write_text(PY_SOURCE)
+
+    refresh_snippet_index(str(root))
+    assert "def total_price(items):" in retrieve_snippets(str(root), "total price of items")
+    assert retrieve_snippets(str(root), "total price of items", max_tokens=5) == ""
+    monkeypatch.setenv("SNIPPETS", "false")
+    assert retrieve_snippets(str(root), "total price of items") == ""
+
+
+def test_failed_refresh_leaves_an_empty_index(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path / "cache"))
+    root = tmp_path / "proj"
+    root.mkdir()
+    (root / "billing.py").write_text(PY_SOURCE)
+    refresh_snippet_index(str(root))
+    assert retrieve_snippets(str(root), "total price of items")
+
+    def broken_walk(*args, **kwargs):
+        raise PermissionError("denied")
+        yield
+
+    monkeypatch.setattr(snippet_index, "iter_project_files", broken_walk)
+    assert refresh_snippet_index(str(root)) == 0
+    assert retrieve_snippets(str(root), "total price of items") == ""
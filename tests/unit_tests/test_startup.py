@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time import KEY_VARS, _probe_script
+
+
+def test_graph_imports_without_keys_or_provider_sdks() -> None:
+    env = {k: v for k, v in os.environ.items() if k not in KEY_VARS}
+    proc = subprocess.run(
+        [sys.executable, "-c", _probe_script("agent.graph")],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(__file__),
+        check=False,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "[]"
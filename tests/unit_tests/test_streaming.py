@@ -0,0 +1,123 @@
+import asyncio
+import re
+from typing import Any, Dict
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.graph import END, START, StateGraph
+from typing_extensions import TypedDict
+
+from agent import factory_model
+from agent.instrumentation import instrument_node, metrics
+from agent.nodes.writer import writer_node
+from agent.streaming import FenceStripper, strip_fences, strip_fences_iter
+
+SAMPLES = [
+    "```python\nprint('hi')\n```\n",
+    "  Here you go:\n```ts\nconst a = `x`;\n```\nDone.  \n",
+    "x = 1\n\n\n",
+    "````\ncode\n``",
+    "",
+]
+
+
+def _batch(text: str) -> str:
+    return re.sub(r"```[a-zA-Z]*\n?", "", text).replace("```", "").strip()
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_fence_stripping_matches_batch_for_every_split(text: str) -> None:
+    expected = _batch(text)
+    assert strip_fences(text) == expected
+    for size in (1, 2, 3, 5):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert "".join(strip_fences_iter(chunks)) == expected
+
+
+def test_fence_stripper_holds_back_a_possible_fence() -> None:
+    stripper = FenceStripper()
+    assert stripper.feed("print(1)\n``") == "print(1)"
+    assert stripper.feed("`py") == ""
+    assert stripper.feed("thon\nx") == "\nx"
+    assert stripper.finish() == ""
+
+
+@pytest.mark.anyio
+async def test_writer_strips_fences(tmp_path: Any) -> None:
+    state = {"code": "```python\nprint('hi')\n```", "file_path": "app/hello.py", "project_root": str(tmp_path)}
+    result = await writer_node(state)  # type: ignore[arg-type]
+    assert result["status"] == "file_saved"
+    assert (tmp_path / "app" / "hello.py").read_text(encoding="utf-8") == "print('hi')"
+
+
+class State(TypedDict):
+    answer: str
+
+
+class StreamingModel(BaseChatModel):
+    tokens: list = ["def add(a, b):", " return", " a + b"]
+    delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self.tokens)))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for i, token in enumerate(self.tokens):
+            await asyncio.sleep(self.delay)
+            usage = {"input_tokens": 10, "output_tokens": 8, "total_tokens": 18} if i == len(self.tokens) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+@pytest.mark.anyio
+async def test_model_tokens_reach_the_messages_stream(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(factory_model, "model", StreamingModel())
+    metrics.reset()
+
+    async def developer_node(state: State) -> Dict[str, Any]:
+        response = await factory_model.ainvoke_model([HumanMessage(content="add")], node="developer_node", use_cache=False)
+        return {"answer": response.content}
+
+    builder = StateGraph(State)
+    builder.add_node("developer_node", instrument_node("developer_node", developer_node))
+    builder.add_edge(START, "developer_node")
+    builder.add_edge("developer_node", END)
+
+    tokens = []
+    async for chunk, metadata in builder.compile().astream({"answer": ""}, stream_mode="messages"):
+        assert metadata["langgraph_node"] == "developer_node"
+        tokens.append(chunk.content)
+
+    assert [t for t in tokens if t] == StreamingModel().tokens
+    record = metrics.records[-1]
+    assert record["completion_tokens"] == 8 and record["ttft_ms"] is not None
+    assert record["calls"][0]["ttft_ms"] <= record["calls"][0]["ms"]
+    assert record["generated_tokens"] == 8 and record["generation_ms"] > 0
+
+
+@pytest.mark.anyio
+async def test_hedge_answers_do_not_interleave_with_the_primary_stream(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(factory_model, "model", StreamingModel(tokens=["slow", " primary"], delay=0.3))
+    monkeypatch.setattr(factory_model, "get_model", lambda provider, temperature=0: StreamingModel(tokens=["fast", " hedge"]))
+    monkeypatch.setenv("HEDGE_AFTER_SECONDS", "0.05")
+    monkeypatch.setenv("HEDGE_PROVIDER", "backup")
+
+    async def developer_node(state: State) -> Dict[str, Any]:
+        response = await factory_model.ainvoke_model([HumanMessage(content="add")], node="developer_node", use_cache=False)
+        return {"answer": response.content}
+
+    builder = StateGraph(State)
+    builder.add_node("developer_node", developer_node)
+    builder.add_edge(START, "developer_node")
+    builder.add_edge("developer_node", END)
+
+    chunks = [chunk.content async for chunk, _ in builder.compile().astream({"answer": ""}, stream_mode="messages")]
+    assert [c for c in chunks if c] == ["fast hedge"]
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from langchain_core.tools import tool
+
+from agent.instrumentation import instrument_node, metrics
+from agent.tool_executor import execute_tool_calls
+
+pytestmark = pytest.mark.anyio
+
+running = 0
+peak = 0
+
+
+@tool
+async def fetch_page(page: int) -> str:
+    """Fetch one design page."""
+    global running, peak
+    running += 1
+    peak = max(peak, running)
+    try:
+        await asyncio.sleep(0.05 if page else 1)
+    finally:
+        running -= 1
+    return f"page {page}"
+
+
+def _calls(*pages: int) -> list:
+    return [{"name": "fetch_page", "args": {"page": p}, "id": f"c{p}", "type": "tool_call"} for p in pages]
+
+
+async def test_calls_run_concurrently_up_to_the_limit() -> None:
+    global peak
+    peak = 0
+    messages = await execute_tool_calls(_calls(1, 2, 3, 4, 5), [fetch_page], max_concurrency=2)
+    assert [m.content for m in messages] == [f"page {p}" for p in range(1, 6)]
+    assert [m.tool_call_id for m in messages] == [f"c{p}" for p in range(1, 6)]
+    assert peak == 2
+
+
+async def test_timeouts_and_unknown_tools_become_error_messages() -> None:
+    metrics.reset()
+
+    async def node(state: dict) -> dict:
+        calls = _calls(0, 1) + [{"name": "missing", "args": {}, "id": "m", "type": "tool_call"}]
+        messages = await execute_tool_calls(calls, [fetch_page], timeout=0.3)
+        return {"contents": [m.content for m in messages]}
+
+    update = await instrument_node("mcp_node", node)({})
+    assert update["contents"] == ["Error executing tool: timed out", "page 1", "Tool missing not found."]
+    assert metrics.records[-1]["tools"]["fetch_page"]["calls"] == 2
+    assert metrics.records[-1]["tools"]["fetch_page"]["errors"] == 1
+    assert 'factory_tool_errors_total{node="mcp_node",tool="fetch_page"} 1' in metrics.render_prometheus()